@@ -2,22 +2,38 @@
 FastAPI app factory for creating and configuring a FastAPI app.
 """
 
-from fastapi import FastAPI
+import time
+
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from redis.exceptions import RedisError
 
-from app.core import crud, models
-from app.core.database import SessionLocal, engine
+from app.config import settings
+from app.core import crud, metrics, models, profiling
+from app.core.cache import NearestAirportCache
+from app.core.database import SessionLocal, database, engine
+from app.core.executor import ComputeBusyError
+from app.core.reload import DatasetReloader
+from app.core.services import NearestAirportEngine, build_engine
+from app.core.snapshot import load_engine, write_snapshot
+from app.extensions import compute_executor, local_cache, rd
 
 from .v1 import v1_router
 
 
 def create_app():
     """
-    Create FastAPI app
+    Create FastAPI app. The time taken from here until startup has finished is recorded as
+    app.state.startup_seconds, and reported by GET /api/v1.0/.
     """
-    models.Base.metadata.create_all(bind=engine)  # create db tables
+    start = time.perf_counter()
+    if settings.airport_snapshot_dir is None:
+        models.Base.metadata.create_all(bind=engine)  # create db tables
 
-    app = FastAPI(title="nearest-airport")
+    # Routes returning models or dicts are encoded with orjson - the airport routes build their own bodies
+    #   (see serialization.py)
+    app = FastAPI(title="nearest-airport", default_response_class=ORJSONResponse)
 
     app.add_middleware(
         CORSMiddleware,
@@ -26,17 +42,134 @@ def create_app():
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.add_middleware(profiling.ProfilingMiddleware)
+    metrics.observe_pools(database, rd)
 
     app.include_router(v1_router, prefix="/api")
 
+    @app.exception_handler(ComputeBusyError)
+    def compute_busy(request: Request, error: ComputeBusyError):
+        """
+        Shed load once the compute executor's queue is full (see executor.py)
+        """
+        return ORJSONResponse(
+            {"detail": str(error)},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
+
+    app.state.dataset_reloader = DatasetReloader(
+        app.state, local_cache, load=_load_engine, publish=_publish_engine
+    )
+
+    @app.on_event("startup")
+    async def startup_sync_dataset_version():
+        """
+        Read the dataset version before the airport data, so that the engine is built from data at least as
+        new as the version (see reload.py). If Redis is unavailable, the first request reads it instead.
+        """
+        cache = NearestAirportCache(
+            rd,
+            local_cache,
+            ttl_seconds=settings.cache_ttl_seconds,
+            precision=settings.cache_coordinate_precision,
+            version_check_seconds=settings.cache_version_check_seconds,
+        )
+        try:
+            await cache.sync_dataset_version()
+        except RedisError:
+            pass
+
     @app.on_event("startup")
     def startup_populate_db():
         """
-        Check if airport table is populated. If not, execute query to insert UK airport data.
+        Check if airport table is populated. If not, execute query to insert UK airport data. The airport
+        table is then read once to build the in-memory nearest airport engine used by POST /airports/nearest.
+
+        If AIRPORT_SNAPSHOT_DIR is set, the engine is instead loaded from the current version of the prebuilt
+        snapshot, memory-mapped and shared with the other workers (see app.snapshot), and the airports table
+        is assumed to have been populated when the snapshot was built.
+
+        The engine's ball tree and lookup indexes are then built, so that the first k-nearest, within-radius
+        or ellipsoidal query does not pay for them, unless ENGINE_WARM_START is false.
         """
-        db = SessionLocal()
-        airport = db.query(models.Airport).first()
-        if not airport:
-            crud.insert_airport_data(db)
+        if settings.airport_snapshot_dir is None:
+            db = SessionLocal()
+            try:
+                airport = db.query(models.Airport).first()
+                if not airport:
+                    crud.insert_airport_data(db)
+            finally:
+                db.close()
+
+        engine = _load_engine()
+        if settings.engine_warm_start:
+            engine.warm()
+        app.state.nearest_airport_engine = engine
+
+    @app.on_event("startup")
+    async def startup_connect_database():
+        await database.connect()
+
+    @app.on_event("startup")
+    def startup_record_time():
+        app.state.startup_seconds = time.perf_counter() - start
+
+    @app.on_event("shutdown")
+    async def shutdown_disconnect():
+        await database.disconnect()
+        await rd.connection_pool.disconnect()
+        compute_executor.shutdown()
 
     return app
+
+
+def _load_engine() -> NearestAirportEngine:
+    """
+    Build the selected nearest airport engine from the current snapshot, if AIRPORT_SNAPSHOT_DIR is set, or
+    else the airports table
+    """
+    if settings.airport_snapshot_dir is not None:
+        return load_engine(
+            settings.airport_snapshot_dir,
+            settings.nearest_airport_engine,
+            **_engine_options(),
+        )
+    return _build_engine_from_db()
+
+
+def _publish_engine() -> NearestAirportEngine:
+    """
+    Build the selected nearest airport engine once the airports table has been updated, first publishing
+    it as a new snapshot version if AIRPORT_SNAPSHOT_DIR is set, for the other workers to load
+    """
+    if settings.airport_snapshot_dir is None:
+        return _build_engine_from_db()
+    write_snapshot(_build_engine_from_db(), settings.airport_snapshot_dir)
+    return _load_engine()
+
+
+def _build_engine_from_db() -> NearestAirportEngine:
+    db = SessionLocal()
+    try:
+        return build_engine(
+            crud.get_airport_store(db, float32=settings.airport_store_float32),
+            settings.nearest_airport_engine,
+            **_engine_options(),
+        )
+    finally:
+        db.close()
+
+
+def _engine_options() -> dict:
+    """
+    Return the settings passed on to the selected nearest airport engine
+    """
+    options = {
+        "ellipsoidal": settings.distance_model == "ellipsoidal",
+        "float32": settings.airport_store_float32,
+    }
+    if settings.nearest_airport_engine == "grid":
+        options["resolution_degrees"] = settings.nearest_airport_grid_resolution
+    return options
@@ -1,12 +1,81 @@
-from fastapi import APIRouter
+from typing import Literal
 
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+
+from app.core import metrics, profiling
+from app.core.services import NearestAirportEngine
+from app.extensions import compute_executor, get_nearest_airport_engine, local_cache
+
+from .admin import admin_router
 from .airports import airport_router
 
 v1_router = APIRouter(prefix="/v1.0")
 
 v1_router.include_router(airport_router)
+v1_router.include_router(admin_router)
 
 
 @v1_router.get("/")
-def index():
-    return {"API status": "healthy"}
+def index(request: Request):
+    return {
+        "API status": "healthy",
+        "startup_seconds": getattr(request.app.state, "startup_seconds", None),
+    }
+
+
+@v1_router.get("/cache")
+def cache_stats():
+    """
+    Return the size, hit and miss counts of this worker's in-process nearest airport cache
+    """
+    return local_cache.stats()
+
+
+@v1_router.get("/engine")
+def engine_stats(
+    engine: NearestAirportEngine = Depends(get_nearest_airport_engine),
+):
+    """
+    Return a summary of this worker's nearest airport engine, with the build time and memory use of the
+    lookup grid when the grid engine is selected, and of the compute executor running its queries
+    """
+    return {**engine.stats(), "executor": compute_executor.stats()}
+
+
+@v1_router.get("/metrics")
+def prometheus_metrics():
+    """
+    Return this worker's request latency, phase timing, cache and connection pool metrics in the Prometheus
+    text format (see metrics.py)
+    """
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+
+@v1_router.get("/profiles/{profile_id}")
+def download_profile(
+    profile_id: str, request: Request, format: Literal["text", "pstats"] = "text"
+):
+    """
+    Download a report written for a profiled request (see profiling.py) - a text summary, or the cProfile
+    stats for call tree and flame graph viewers. Requires the same secret header or query parameter as
+    profiling a request.
+    """
+    if not profiling.is_authorised(request.scope):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Downloading a profile requires the profiling secret",
+        )
+
+    path = profiling.report_path(profile_id, format)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Profile {profile_id} cannot be found",
+        )
+
+    if format == "pstats":
+        return FileResponse(
+            path, media_type="application/octet-stream", filename=f"{profile_id}.prof"
+        )
+    return FileResponse(path, media_type="text/plain")
@@ -0,0 +1,89 @@
+"""
+Admin routes for the admin router, requiring the app's SECRET_KEY as a bearer token. Routes include:
+    - POST /api/v1/admin/airports
+    - GET /api/v1/admin/airports/reload
+"""
+
+import tempfile
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.core import crud, schemas
+from app.core.reload import DatasetReloader
+from app.core.streaming import CSV_MEDIA_TYPE
+from app.extensions import get_dataset_reloader, get_db, require_secret_key
+
+from .airports import nearest_airport_cache
+
+admin_router = APIRouter(
+    prefix="/admin", tags=["admin"], dependencies=[Depends(require_secret_key)]
+)
+
+
+@admin_router.post(
+    "/airports",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=schemas.AirportUploadResponse,
+)
+async def upload_airports(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    reloader: DatasetReloader = Depends(get_dataset_reloader),
+):
+    """
+    Validate an airport data CSV sent as the request body (in the format loaded by app.ingest) and upsert
+    it into the airports table. If any airports changed, the nearest airport engine is then rebuilt in the
+    background and swapped in, and the dataset version bumped so that every other worker reloads too -
+    requests are served from the previous dataset until then. Poll GET /admin/airports/reload for progress.
+    """
+    media_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if media_type != CSV_MEDIA_TYPE:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Content type must be {CSV_MEDIA_TYPE}",
+        )
+
+    with tempfile.NamedTemporaryFile(suffix=".csv") as file:
+        async for data in request.stream():
+            file.write(data)
+        file.flush()
+
+        try:
+            await run_in_threadpool(
+                crud.validate_airport_data, file.name, settings.ingest_chunk_size, db
+            )
+        except ValueError as error:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(error)
+            )
+        try:
+            report = await run_in_threadpool(
+                crud.upsert_airport_data, db, file.name, settings.ingest_chunk_size
+            )
+        except IntegrityError:
+            # e.g. airports swapping names, which conflict part way through the upsert (rolled back)
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Airport data conflicts with the airports table",
+            )
+
+    reloading = report.rows_written > 0
+    if reloading:
+        background_tasks.add_task(reloader.publish, nearest_airport_cache(reloader))
+
+    return schemas.AirportUploadResponse(
+        success=True, report=report, reloading=reloading
+    )
+
+
+@admin_router.get("/airports/reload", response_model=schemas.DatasetReloadStatus)
+def dataset_reload_status(reloader: DatasetReloader = Depends(get_dataset_reloader)):
+    """
+    Return the status of this worker's dataset reloads
+    """
+    return reloader.stats()
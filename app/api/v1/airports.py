@@ -1,47 +1,214 @@
 """
 Airport routes for the airports router. Routes include:
     - GET /api/v1/airports
+    - GET /api/v1/airports?limit=<int>&cursor=<int>&fields=<string>&bbox=<string>
+    - GET /api/v1/airports/search?q=<string>&limit=<int>
     - GET /api/v1/airports/<id:int>
     - GET /api/v1/airports/icao/<icao_id:string>
     - POST /api/v1/airports/nearest
+    - POST /api/v1/airports/nearest/batch
+    - POST /api/v1/airports/nearest/k?k=<int>
+    - POST /api/v1/airports/within?radius_km=<float>&limit=<int>
+    - POST /api/v1/airports/nearest/stream
+    - POST /api/v1/airports/distances?format=<string>
 """
 
-import pickle
+import math
+from typing import Any, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import numpy as np
+from databases import Database
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from pydantic import ValidationError
+from redis.exceptions import RedisError
 
-from app.core import crud, schemas
-from app.core.services import find_nearest_airport
-from app.extensions import get_db, rd
+from app.config import settings
+from app.core import async_crud, metrics, schemas, serialization
+from app.core.cache import NearestAirportCache, etag_matches
+from app.core.reload import DatasetReloader
+from app.core.services import (
+    BATCH_CHUNK_ELEMENTS,
+    RADIUS_EARTH_KM,
+    NearestAirportEngine,
+)
+from app.core.store import AirportRecord
+from app.core.streaming import STREAM_MEDIA_TYPES, NearestAirportStreamResponse
+from app.extensions import (
+    airports_response_cache,
+    compute_executor,
+    get_database,
+    get_dataset_reloader,
+    get_nearest_airport_engine,
+    local_cache,
+    nearest_airport_flights,
+    rd,
+)
 
 airport_router = APIRouter(prefix="/airports", tags=["airports"])
 
 
-@airport_router.get("/", response_model=schemas.AirportsResponse)
-async def get_airports(db: Session = Depends(get_db)):
+def nearest_airport_cache(reloader: DatasetReloader) -> NearestAirportCache:
     """
-    Return a list of all airports currently stored in the 'airports' table
+    Return the nearest airport cache, passing dataset version changes on to the app's dataset reloader
     """
-    airports = crud.get_all_airports(db)
+    return NearestAirportCache(
+        rd,
+        local_cache,
+        ttl_seconds=settings.cache_ttl_seconds,
+        precision=settings.cache_coordinate_precision,
+        version_check_seconds=settings.cache_version_check_seconds,
+        stale_seconds=settings.cache_stale_seconds,
+        lock_seconds=settings.cache_lock_seconds,
+        flights=nearest_airport_flights,
+        reload=reloader.check,
+        ellipsoidal=settings.distance_model == "ellipsoidal",
+    )
 
-    if not airports:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Airport data has not loaded into database correctly",
-        )
 
-    return schemas.AirportsResponse(
-        success=True, airports=airports, airport_count=len(airports)
+async def sync_dataset_version(
+    reloader: DatasetReloader = Depends(get_dataset_reloader),
+) -> int:
+    """
+    Return the current dataset version (see NearestAirportCache.sync_dataset_version), starting a reload if
+    it has changed. If Redis is unavailable, the version last seen by this worker is returned instead.
+    """
+    try:
+        return await nearest_airport_cache(reloader).sync_dataset_version()
+    except RedisError:
+        return local_cache.dataset_version
+
+
+# Responses are built by serialization.py and returned as raw JSON, so the response models only document
+#   them - AirportsPageResponse must come first so next_cursor is documented
+@airport_router.get(
+    "/",
+    response_model=schemas.AirportsPageResponse | schemas.AirportsResponse,
+)
+async def get_airports(
+    limit: int | None = Query(None, ge=1, le=settings.airports_max_page_size),
+    cursor: int | None = Query(None),
+    fields: str | None = Query(None, regex=r"^\w+(,\w+)*$"),
+    bbox: str
+    | None = Query(
+        None, description="min_longitude,min_latitude,max_longitude,max_latitude"
+    ),
+    if_none_match: str | None = Header(None),
+    database: Database = Depends(get_database),
+    engine: NearestAirportEngine = Depends(get_nearest_airport_engine),
+    dataset_version: int = Depends(sync_dataset_version),
+):
+    """
+    Return a list of all airports currently stored in the 'airports' table. The response body is
+    serialised once per dataset version and served with a strong ETag - a request with a matching
+    If-None-Match header receives a 304 with no body.
+
+    If any of limit, cursor, fields or bbox are given, a page of airports is returned instead, served from
+    the in-memory airport index. Pages are ordered by id, with next_cursor passed as `cursor` to fetch the
+    next page, and can be projected to a comma separated list of `fields` and filtered to a bounding box.
+    """
+    if any(param is not None for param in (limit, cursor, fields, bbox)):
+        return _get_airports_page(engine, limit, cursor, fields, bbox)
+
+    async def build_airports_response() -> bytes:
+        with metrics.phase("db_fetch"):
+            airports = await async_crud.get_all_airports(database)
+
+        if not airports:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Airport data has not loaded into database correctly",
+            )
+
+        return serialization.airports_body(airports)
+
+    body, etag = await airports_response_cache.get(
+        dataset_version, build_airports_response
     )
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
 
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return serialization.JSONResponse(content=body, headers=headers)
+
+
+def _get_airports_page(
+    engine: NearestAirportEngine,
+    limit: int | None,
+    cursor: int | None,
+    fields: str | None,
+    bbox: str | None,
+) -> serialization.JSONResponse:
+    include = None
+    if fields is not None:
+        include = set(fields.split(","))
+        unknown_fields = include - set(schemas.Airport.__fields__)
+        if unknown_fields:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Unknown airport fields {sorted(unknown_fields)}",
+            )
+
+    bounding_box = None
+    if bbox is not None:
+        try:
+            bounding_box = schemas.BoundingBox.from_query(bbox).as_tuple()
+        except (ValueError, ValidationError):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="bbox must be min_longitude,min_latitude,max_longitude,max_latitude in degrees",
+            )
+
+    airports, next_cursor = engine.page(
+        cursor, limit or settings.airports_page_size, bounding_box
+    )
+    return serialization.airports_page_response(airports, include, next_cursor)
 
-@airport_router.get("/{airport_id}", response_model=schemas.AirportResponse)
-async def get_airport_by_id(airport_id: int, db: Session = Depends(get_db)):
+
+# Declared before GET /{airport_id}, which would otherwise match its path
+@airport_router.get(
+    "/search",
+    response_model=schemas.AirportsResponse,
+    dependencies=[Depends(sync_dataset_version)],
+)
+async def search_airports(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=settings.airport_search_max_results),
+    engine: NearestAirportEngine = Depends(get_nearest_airport_engine),
+):
+    """
+    Return up to `limit` airports with an ICAO code, or a word of their name, starting with `q` (case
+    insensitive) for type-ahead search. ICAO code matches are returned first, then name matches, each in
+    alphabetical order. Served from the in-memory airport index.
+    """
+    airports = engine.search(q, limit)
+    return serialization.airport_search_response(
+        list(map(engine.airport_json, airports))
+    )
+
+
+@airport_router.get(
+    "/{airport_id}",
+    response_model=schemas.AirportResponse,
+    dependencies=[Depends(sync_dataset_version)],
+)
+async def get_airport_by_id(
+    airport_id: int,
+    engine: NearestAirportEngine = Depends(get_nearest_airport_engine),
+):
     """
-    Return an airport for a given ID
+    Return an airport for a given ID, from the in-memory airport index
     """
-    airport = crud.get_airport_by_id(airport_id, db)
+    airport = engine.airport_by_id(airport_id)
 
     if not airport:
         raise HTTPException(
@@ -49,15 +216,22 @@ async def get_airport_by_id(airport_id: int, db: Session = Depends(get_db)):
             detail=f"Airport with id {airport_id} cannot be found",
         )
 
-    return schemas.AirportResponse(success=True, airport=airport)
+    return serialization.airport_response(engine.airport_json(airport))
 
 
-@airport_router.get("/icao/{icao}", response_model=schemas.AirportResponse)
-async def get_airport_by_icao(icao: str, db: Session = Depends(get_db)):
+@airport_router.get(
+    "/icao/{icao}",
+    response_model=schemas.AirportResponse,
+    dependencies=[Depends(sync_dataset_version)],
+)
+async def get_airport_by_icao(
+    icao: str,
+    engine: NearestAirportEngine = Depends(get_nearest_airport_engine),
+):
     """
-    Return an airport for a given ICAO aiport code
+    Return an airport for a given ICAO aiport code, from the in-memory airport index
     """
-    airport = crud.get_airport_by_icao(icao.upper(), db)
+    airport = engine.airport_by_icao(icao)
 
     if not airport:
         raise HTTPException(
@@ -65,42 +239,234 @@ async def get_airport_by_icao(icao: str, db: Session = Depends(get_db)):
             detail=f"Airport with ICAO code {icao.upper()} cannot be found",
         )
 
-    return schemas.AirportResponse(success=True, airport=airport)
+    return serialization.airport_response(engine.airport_json(airport))
 
 
 @airport_router.post("/nearest", response_model=schemas.NearestAirportResponse)
 async def nearest_airport(
-    coordinates: schemas.Coordinates, db: Session = Depends(get_db)
+    coordinates: schemas.Coordinates,
+    engine: NearestAirportEngine = Depends(get_nearest_airport_engine),
+    reloader: DatasetReloader = Depends(get_dataset_reloader),
 ):
     """
-    Return the nearest airport to a coordinate, defined in the post body
+    Return the nearest airport to a coordinate, defined in the post body. Concurrent cache misses for the
+    same point share a single calculation (see cache.py), run on the compute executor.
     """
+
     # Validation of input coordinates handled by pydantic (see Coordinates in schemas.py)
-    coordinates_hash = hash(tuple(coordinates))
-    if rd.get(coordinates_hash):
-        print("Cache hit!")
-        nearest_airport, distance_km = pickle.loads(rd.get(coordinates_hash))
-        return schemas.NearestAirportResponse(
-            success=True,
-            nearest_airport=nearest_airport,
-            distance_km=distance_km,
-            input_coordinates=coordinates,
+    async def compute_nearest_airport() -> AirportRecord:
+        with metrics.phase("distance"):
+            nearest = await compute_executor.run(engine, "nearest_airport", coordinates)
+        return nearest[0]
+
+    cache = nearest_airport_cache(reloader)
+    with metrics.phase("cache"):
+        result = await cache.get_or_compute(coordinates, compute_nearest_airport)
+    nearest_airport, distance_km, computed = result
+
+    airport_json = (
+        engine.airport_json(nearest_airport)
+        if computed
+        else serialization.encode_airport(nearest_airport)
+    )
+    return serialization.JSONResponse(
+        serialization.nearest_airport_result(airport_json, distance_km, coordinates)
+    )
+
+
+@airport_router.post(
+    "/nearest/batch", response_model=schemas.NearestAirportBatchResponse
+)
+async def nearest_airport_batch(
+    coordinates: list[Any] = Body(...),
+    engine: NearestAirportEngine = Depends(get_nearest_airport_engine),
+    reloader: DatasetReloader = Depends(get_dataset_reloader),
+):
+    """
+    Return the nearest airport to each coordinate in a list, defined in the post body. Results are returned
+    in input order, and invalid coordinates are reported per item rather than failing the whole batch.
+    """
+    if len(coordinates) > settings.nearest_airport_batch_limit:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch size cannot exceed {settings.nearest_airport_batch_limit} coordinates",
         )
 
-    # TODO: print statements have been implemented to save time and are for testing (test_redis.py) These
-    #   should be replaced with proper logging when deploying to production.
-    print("Calculating nearest airport!")
-    airports_df = crud.get_all_airports_df(db)
-    nearest_airport, distance_km = find_nearest_airport(airports_df, coordinates)
+    results: list[serialization.Encoded | None] = [None] * len(coordinates)
+    valid_coordinates: list[tuple[int, schemas.Coordinates]] = []
+    for index, item in enumerate(coordinates):
+        try:
+            valid_coordinates.append((index, schemas.Coordinates.parse_obj(item)))
+        except ValidationError as error:
+            results[index] = serialization.nearest_airport_error(
+                error.errors(), batch=True
+            )
 
-    five_minutes = 5 * 60
-    rd.set(
-        coordinates_hash, pickle.dumps((nearest_airport, distance_km)), ex=five_minutes
+    # Check the cache for every valid coordinate in a single round trip
+    cache = nearest_airport_cache(reloader)
+    with metrics.phase("cache"):
+        cached_results = await cache.get_many([item for _, item in valid_coordinates])
+
+    misses: list[tuple[int, schemas.Coordinates]] = []
+    for (index, item), cached_result in zip(valid_coordinates, cached_results):
+        if cached_result:
+            nearest_airport, distance_km = cached_result
+            results[index] = serialization.nearest_airport_result(
+                serialization.encode_airport(nearest_airport),
+                distance_km,
+                item,
+                batch=True,
+            )
+        else:
+            misses.append((index, item))
+
+    if misses:
+        # Calculate every cache miss in a single engine query, split into chunks across the compute executor
+        with metrics.phase("distance"):
+            airport_indices, distances_km = await compute_executor.run_chunked(
+                engine,
+                "nearest_airports",
+                (
+                    np.array([item.longitude_radians for _, item in misses]),
+                    np.array([item.latitude_radians for _, item in misses]),
+                ),
+            )
+        for (index, item), airport_index, distance_km in zip(
+            misses, airport_indices, distances_km
+        ):
+            results[index] = serialization.nearest_airport_result(
+                engine.airport_json_at(airport_index),
+                distance_km,
+                item,
+                batch=True,
+            )
+        await cache.set_many(
+            [
+                (item, engine.airports[airport_index])
+                for (_, item), airport_index in zip(misses, airport_indices)
+            ]
+        )
+
+    error_count = len(coordinates) - len(valid_coordinates)
+    return serialization.nearest_airport_batch_response(results, error_count)
+
+
+@airport_router.post("/nearest/k", response_model=schemas.NearbyAirportsResponse)
+async def k_nearest_airports(
+    coordinates: schemas.Coordinates,
+    k: int = Query(5, ge=1, le=settings.nearest_airport_max_results),
+    engine: NearestAirportEngine = Depends(get_nearest_airport_engine),
+):
+    """
+    Return the k nearest airports to a coordinate, defined in the post body, sorted by distance
+    """
+    with metrics.phase("distance"):
+        airports = await compute_executor.run(engine, "k_nearest", coordinates, k)
+
+    return serialization.nearby_airports_response(airports, coordinates)
+
+
+@airport_router.post("/within", response_model=schemas.NearbyAirportsResponse)
+async def airports_within_radius(
+    coordinates: schemas.Coordinates,
+    radius_km: float = Query(..., ge=0, le=math.pi * RADIUS_EARTH_KM),
+    limit: int = Query(
+        settings.nearest_airport_max_results,
+        ge=1,
+        le=settings.nearest_airport_max_results,
+    ),
+    engine: NearestAirportEngine = Depends(get_nearest_airport_engine),
+):
+    """
+    Return the airports within radius_km of a coordinate, defined in the post body, sorted by distance and
+    limited to the nearest `limit` airports
+    """
+    with metrics.phase("distance"):
+        airports = await compute_executor.run(
+            engine, "within_radius", coordinates, radius_km, limit
+        )
+
+    return serialization.nearby_airports_response(airports, coordinates)
+
+
+@airport_router.post("/nearest/stream", response_class=NearestAirportStreamResponse)
+async def nearest_airport_stream(
+    request: Request,
+    engine: NearestAirportEngine = Depends(get_nearest_airport_engine),
+):
+    """
+    Return the nearest airport to each coordinate in an NDJSON or CSV post body, streamed back as NDJSON.
+    The body is resolved in chunks of NEAREST_AIRPORT_STREAM_CHUNK_SIZE coordinates as it is received, and
+    the next chunk is only read once the previous results have been sent, so memory use stays flat for
+    any input size. Results are not cached.
+    """
+    media_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if media_type not in STREAM_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Content type must be one of {list(STREAM_MEDIA_TYPES)}",
+        )
+
+    return NearestAirportStreamResponse(
+        request,
+        engine,
+        compute_executor,
+        media_type,
+        settings.nearest_airport_stream_chunk_size,
     )
 
-    return schemas.NearestAirportResponse(
-        success=True,
-        nearest_airport=nearest_airport,
-        distance_km=distance_km,
-        input_coordinates=coordinates,
+
+@airport_router.post("/distances", response_model=schemas.DistanceMatrixResponse)
+async def distance_matrix(
+    points: schemas.DistanceMatrixRequest,
+    format: Literal["json", "binary"] = "json",
+    engine: NearestAirportEngine = Depends(get_nearest_airport_engine),
+):
+    """
+    Return the haversine distance in kilometres from every origin to every destination (or between every
+    pair of origins, if no destinations are given), defined in the post body as ICAO airport codes or
+    coordinates. Airports are looked up in the in-memory engine, and the whole matrix calculated in one
+    vectorised pass. Rows are origins and columns destinations - with format=binary, the matrix is returned
+    as little-endian float64 values in row-major order, with its shape in the X-Matrix-Shape header.
+    """
+    origins = points.origins
+    destinations = origins if points.destinations is None else points.destinations
+    if len(origins) * len(destinations) > settings.distance_matrix_max_elements:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Distance matrix cannot exceed {settings.distance_matrix_max_elements} elements",
+        )
+
+    unknown_icao: set[str] = set()
+
+    def resolve(point: str | schemas.Coordinates) -> int | schemas.Coordinates | None:
+        if isinstance(point, schemas.Coordinates):
+            return point
+        index = engine.icao_index(point)
+        if index is None:
+            unknown_icao.add(point.upper())
+        return index
+
+    origin_points = list(map(resolve, origins))
+    destination_points = (
+        origin_points if destinations is origins else list(map(resolve, destinations))
     )
+    if unknown_icao:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Airports with ICAO codes {sorted(unknown_icao)} cannot be found",
+        )
+
+    # Each chunk of origins is a block of BATCH_CHUNK_ELEMENTS distances, the engine's own chunk size
+    with metrics.phase("distance"):
+        matrix = await compute_executor.run_chunked(
+            engine,
+            "distance_matrix",
+            (origin_points,),
+            destination_points,
+            chunk_size=max(1, BATCH_CHUNK_ELEMENTS // len(destination_points)),
+        )
+
+    if format == "binary":
+        return serialization.distance_matrix_binary_response(matrix)
+    return serialization.distance_matrix_response(matrix)
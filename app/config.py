@@ -3,6 +3,10 @@ Configuration class for the app, with settings retrieved from environment variab
 file in the root directory.
 """
 
+import os
+import tempfile
+from typing import Literal
+
 from dotenv import load_dotenv
 from pydantic import BaseSettings, Field
 
@@ -14,6 +18,55 @@ class Settings(BaseSettings):
     secret_key: str = Field(..., env="SECRET_KEY")
     db_url: str = Field(..., env="DATABASE_URL")
     test_db_url: str = Field(..., env="TEST_DATABASE_URL")
+    nearest_airport_engine: Literal["brute_force", "balltree", "grid"] = Field(
+        "brute_force", env="NEAREST_AIRPORT_ENGINE"
+    )
+    nearest_airport_grid_resolution: float = Field(
+        0.1, env="NEAREST_AIRPORT_GRID_RESOLUTION"
+    )
+    distance_model: Literal["haversine", "ellipsoidal"] = Field(
+        "haversine", env="DISTANCE_MODEL"
+    )
+    airport_store_float32: bool = Field(False, env="AIRPORT_STORE_FLOAT32")
+    engine_warm_start: bool = Field(True, env="ENGINE_WARM_START")
+    airport_snapshot_dir: str | None = Field(None, env="AIRPORT_SNAPSHOT_DIR")
+    nearest_airport_max_results: int = Field(100, env="NEAREST_AIRPORT_MAX_RESULTS")
+    nearest_airport_batch_limit: int = Field(10_000, env="NEAREST_AIRPORT_BATCH_LIMIT")
+    nearest_airport_stream_chunk_size: int = Field(
+        10_000, env="NEAREST_AIRPORT_STREAM_CHUNK_SIZE"
+    )
+    distance_matrix_max_elements: int = Field(
+        1_000_000, env="DISTANCE_MATRIX_MAX_ELEMENTS"
+    )
+    compute_executor: Literal["inline", "thread", "process"] = Field(
+        "thread", env="COMPUTE_EXECUTOR"
+    )
+    compute_workers: int | None = Field(None, env="COMPUTE_WORKERS")
+    compute_max_pending: int = Field(1_000, env="COMPUTE_MAX_PENDING")
+    compute_chunk_size: int = Field(10_000, env="COMPUTE_CHUNK_SIZE")
+
+    ingest_chunk_size: int = Field(50_000, env="INGEST_CHUNK_SIZE")
+    airports_page_size: int = Field(100, env="AIRPORTS_PAGE_SIZE")
+    airports_max_page_size: int = Field(1_000, env="AIRPORTS_MAX_PAGE_SIZE")
+    airport_search_max_results: int = Field(50, env="AIRPORT_SEARCH_MAX_RESULTS")
+    cache_ttl_seconds: int = Field(5 * 60, env="CACHE_TTL_SECONDS")
+    cache_coordinate_precision: int = Field(4, env="CACHE_COORDINATE_PRECISION")
+    cache_version_check_seconds: float = Field(5, env="CACHE_VERSION_CHECK_SECONDS")
+    cache_stale_seconds: float = Field(0, env="CACHE_STALE_SECONDS")
+    cache_lock_seconds: float = Field(1, env="CACHE_LOCK_SECONDS")
+    local_cache_size: int = Field(10_000, env="LOCAL_CACHE_SIZE")
+    local_cache_ttl_seconds: float = Field(60, env="LOCAL_CACHE_TTL_SECONDS")
+
+    db_pool_min_size: int = Field(5, env="DB_POOL_MIN_SIZE")
+    db_pool_max_size: int = Field(20, env="DB_POOL_MAX_SIZE")
+    redis_max_connections: int = Field(50, env="REDIS_MAX_CONNECTIONS")
+
+    profile_header: str = Field("X-Profile", env="PROFILE_HEADER")
+    profile_dir: str = Field(
+        os.path.join(tempfile.gettempdir(), "nearest-airport-profiles"),
+        env="PROFILE_DIR",
+    )
+    profile_keep: int = Field(20, env="PROFILE_KEEP")
 
     class Config:
         env_file = ".env"
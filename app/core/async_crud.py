@@ -0,0 +1,16 @@
+"""
+Async CRUD functionality for interacting with the application's database from the API routes, mirroring
+crud.py. Queries run on the pooled async database (see database.py) so they never block the event loop.
+"""
+
+from databases import Database
+from sqlalchemy import select
+
+from app.core import models, schemas
+
+airports = models.Airport.__table__
+
+
+async def get_all_airports(database: Database) -> list[schemas.Airport]:
+    records = await database.fetch_all(select(airports).order_by(airports.c.id))
+    return [schemas.Airport(**record._mapping) for record in records]
@@ -0,0 +1,515 @@
+"""
+Two-tier cache for nearest airport results: a bounded in-process LRU cache with TTL expiry in front of
+Redis. Keys are built from the input coordinates quantised to a configurable number of decimal places, so
+that they are stable across processes and restarts and nearby points share an entry. Redis entries store
+the nearest airport in a compact, versioned JSON format - the distance is recalculated for the exact input
+coordinates on a hit, so quantisation never changes the reported distance.
+
+Keys also include the dataset version, an integer stored in Redis under DATASET_VERSION_KEY. Bumping it
+(see invalidate) makes every worker drop its in-process entries and ignore Redis entries written for the
+previous airport data. Workers re-read the version at most every `version_check_seconds`.
+
+Misses are coalesced, so that an expiring popular entry does not send every concurrent request to the
+engine at once (see NearestAirportCache.get_or_compute): concurrent requests for a key in one worker share a
+single computation (SingleFlight), and a short Redis lock per key makes requests in other workers wait for
+that result rather than computing their own. Redis entries can also outlive their TTL by `stale_seconds`,
+during which they are still served while one caller refreshes them in the background.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from math import radians
+from typing import NamedTuple, TypeVar
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.core.metrics import CACHE_REQUESTS
+from app.core.schemas import Airport, Coordinates
+from app.core.services import (
+    _calculate_haversine_distance,
+    _calculate_vincenty_distance,
+)
+
+CACHE_FORMAT_VERSION = 2
+CACHE_KEY_PREFIX = f"nearest-airport:v{CACHE_FORMAT_VERSION}"
+DATASET_VERSION_KEY = "nearest-airport:dataset-version"
+LOCK_POLL_SECONDS = 0.005
+
+T = TypeVar("T")
+
+
+class LocalCache:
+    """
+    Bounded, thread-safe LRU cache with TTL expiry, held in process memory. Records its own hit and miss
+    counts, and the dataset version its entries belong to.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.dataset_version = 0
+        self.version_checked_at = float("-inf")
+        self._entries: OrderedDict[str, tuple[float, Airport]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Airport | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, airport: Airport) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, airport)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "dataset_version": self.dataset_version,
+        }
+
+
+class CacheEntry(NamedTuple):
+    airport: Airport
+    fresh_until: float
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time in this process - callers for a key with a call already in
+    flight wait for it and share its result (or exception), rather than making their own. Calls run as
+    tasks, so a caller being cancelled does not cancel the call for the others.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def start(self, key: str, call: Callable[[], Awaitable[T]]) -> asyncio.Task:
+        """
+        Start a call for key, unless one is already in flight, and return its task
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(call())
+            task.add_done_callback(lambda task: self._done(key, task))
+        return task
+
+    async def run(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Return the result of the call in flight for key, starting one if there is none
+        """
+        return await asyncio.shield(self.start(key, call))
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        self._calls.pop(key, None)
+        if not task.cancelled():
+            # Retrieved here so that a failed call which nobody awaited is not reported as unhandled
+            task.exception()
+
+
+class NearestAirportCache:
+    """
+    Nearest airport cache, checking the in-process cache before Redis. Each Redis lookup is a single round
+    trip (GET, or MGET for the local misses in a batch), and each write sets the configured TTL, plus
+    `stale_seconds`. Hits, misses, stale hits and Redis errors are counted by tier (see metrics.py).
+
+    Misses in get_or_compute are coalesced through `flights`, shared by every request in a worker, and a
+    Redis lock held for up to `lock_seconds` (0 disables it). Dataset version changes are passed to
+    `reload`, if set (see sync_dataset_version). Distances are recalculated as WGS-84 geodesic distances if
+    `ellipsoidal` is set, matching an ellipsoidal engine, or else haversine distances.
+    """
+
+    def __init__(
+        self,
+        rd: Redis,
+        local: LocalCache,
+        ttl_seconds: int,
+        precision: int,
+        version_check_seconds: float,
+        stale_seconds: float = 0,
+        lock_seconds: float = 0,
+        flights: SingleFlight | None = None,
+        reload: Callable[[int], None] | None = None,
+        ellipsoidal: bool = False,
+    ):
+        self.rd = rd
+        self.local = local
+        self.ttl_seconds = ttl_seconds
+        self.precision = precision
+        self.version_check_seconds = version_check_seconds
+        self.stale_seconds = stale_seconds
+        self.lock_seconds = lock_seconds
+        self.flights = flights if flights is not None else SingleFlight()
+        self.reload = reload
+        self.ellipsoidal = ellipsoidal
+        self.distance_model = "ellipsoidal" if ellipsoidal else "haversine"
+
+    async def sync_dataset_version(self) -> int:
+        """
+        Return the current dataset version, re-reading it from Redis if it has not been checked in the
+        last `version_check_seconds`. The in-process cache is cleared when the version has changed.
+
+        If `reload` is set, a changed version (other than on the first check) is instead passed to it, and
+        the current version kept until the worker has reloaded its engine (see reload.py) - the first check
+        adopts the version as it is, as the engine was built from the current dataset at startup.
+        """
+        now = time.monotonic()
+        if now - self.local.version_checked_at >= self.version_check_seconds:
+            dataset_version = int(await _redis(self.rd.get(DATASET_VERSION_KEY)) or 0)
+            first_check = self.local.version_checked_at == float("-inf")
+            if dataset_version != self.local.dataset_version:
+                if self.reload is not None and not first_check:
+                    self.reload(dataset_version)
+                else:
+                    self.local.clear()
+                    self.local.dataset_version = dataset_version
+            self.local.version_checked_at = now
+        return self.local.dataset_version
+
+    def key(self, coordinates: Coordinates) -> str:
+        """
+        Return the canonical cache key for a pair of coordinates, quantised to self.precision decimal places.
+        Keys include the distance model, as the two models can disagree on the nearest airport.
+        """
+        longitude = round(coordinates.longitude_degrees, self.precision) + 0.0
+        latitude = round(coordinates.latitude_degrees, self.precision) + 0.0
+        return (
+            f"{CACHE_KEY_PREFIX}:{self.distance_model}:d{self.local.dataset_version}:"
+            f"{longitude:.{self.precision}f}:{latitude:.{self.precision}f}"
+        )
+
+    async def get(self, coordinates: Coordinates) -> tuple[Airport, float] | None:
+        """
+        Return the cached nearest airport, and its distance in kilometres, for a pair of coordinates. Stale
+        entries are treated as a miss.
+        """
+        await self.sync_dataset_version()
+        entry = await self._lookup(self.key(coordinates))
+        if entry is None or entry.fresh_until <= time.time():
+            return None
+        return entry.airport, _distance_km(entry.airport, coordinates, self.ellipsoidal)
+
+    async def get_or_compute(
+        self, coordinates: Coordinates, compute: Callable[[], Awaitable[Airport]]
+    ) -> tuple[Airport, float, bool]:
+        """
+        Return the nearest airport for a pair of coordinates, its distance in kilometres, and whether it was
+        computed rather than read from the cache. On a miss, the first caller for the cache key in this
+        worker computes the airport with `compute` and caches it, and concurrent callers share its result.
+        If another worker holds the key's Redis lock, its result is waited for (for up to lock_seconds)
+        instead. A stale entry is returned as it is, while a single caller refreshes it in the background.
+        """
+        await self.sync_dataset_version()
+        key = self.key(coordinates)
+        entry = await self._lookup(key)
+        if entry is not None:
+            if entry.fresh_until <= time.time():
+                self.flights.start(key, lambda: self._fill(key, compute, wait=False))
+            return (
+                entry.airport,
+                _distance_km(entry.airport, coordinates, self.ellipsoidal),
+                False,
+            )
+
+        result = await self.flights.run(
+            key, lambda: self._fill(key, compute, wait=True)
+        )
+        if result is None:
+            # Joined a background refresh which found another worker refreshing the entry
+            result = await self._fill(key, compute, wait=True)
+        airport, computed = result
+        return airport, _distance_km(airport, coordinates, self.ellipsoidal), computed
+
+    async def _lookup(self, key: str) -> CacheEntry | None:
+        """
+        Return the cache entry for a key, from the in-process cache or else Redis. Fresh entries read from
+        Redis are copied into the in-process cache, stale entries are not.
+        """
+        airport = self.local.get(key)
+        if airport is not None:
+            CACHE_REQUESTS.labels("local", "hit").inc()
+            return CacheEntry(airport, float("inf"))
+
+        CACHE_REQUESTS.labels("local", "miss").inc()
+        entry = decode_airport(await _redis(self.rd.get(key)))
+        if entry is None:
+            CACHE_REQUESTS.labels("redis", "miss").inc()
+        elif entry.fresh_until <= time.time():
+            CACHE_REQUESTS.labels("redis", "stale").inc()
+        else:
+            CACHE_REQUESTS.labels("redis", "hit").inc()
+            self.local.set(key, entry.airport)
+        return entry
+
+    async def _fill(
+        self, key: str, compute: Callable[[], Awaitable[Airport]], wait: bool
+    ) -> tuple[Airport, bool] | None:
+        """
+        Compute and cache the airport for a key, holding its Redis lock. If another worker holds the lock,
+        wait for its result when `wait` is set (computing it here if none arrives before the lock is
+        released or expires), or else return None.
+        """
+        locked = self.lock_seconds > 0 and await _redis(
+            self.rd.set(
+                _lock_key(key), 1, nx=True, px=max(1, int(self.lock_seconds * 1000))
+            )
+        )
+        if self.lock_seconds > 0 and not locked:
+            if not wait:
+                return None
+            entry = await self._wait_for(key)
+            if entry is not None:
+                self.local.set(key, entry.airport)
+                return entry.airport, False
+
+        try:
+            airport = await compute()
+            await self._store(key, airport)
+        finally:
+            if locked:
+                await _redis(self.rd.delete(_lock_key(key)))
+        return airport, True
+
+    async def _wait_for(self, key: str) -> CacheEntry | None:
+        """
+        Poll Redis for a fresh entry for a key while another worker holds its lock
+        """
+        deadline = time.monotonic() + self.lock_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_SECONDS)
+            value, lock = await _redis(self.rd.mget([key, _lock_key(key)]))
+            entry = decode_airport(value)
+            if entry is not None and entry.fresh_until > time.time():
+                return entry
+            if lock is None:
+                return None
+        return None
+
+    async def _store(self, key: str, airport: Airport) -> None:
+        self.local.set(key, airport)
+        await _redis(
+            self.rd.set(
+                key,
+                encode_airport(airport, time.time() + self.ttl_seconds),
+                ex=self.ttl_seconds + math.ceil(self.stale_seconds),
+            )
+        )
+
+    async def get_many(
+        self, coordinates: list[Coordinates]
+    ) -> list[tuple[Airport, float] | None]:
+        """
+        Return the cached nearest airport, and its distance in kilometres, for each of a list of coordinates
+        """
+        if not coordinates:
+            return []
+        await self.sync_dataset_version()
+        keys = [self.key(item) for item in coordinates]
+        airports = [self.local.get(key) for key in keys]
+
+        remote_keys = [key for key, airport in zip(keys, airports) if airport is None]
+        CACHE_REQUESTS.labels("local", "hit").inc(len(keys) - len(remote_keys))
+        CACHE_REQUESTS.labels("local", "miss").inc(len(remote_keys))
+        if remote_keys:
+            # Stale entries are recalculated with the batch's other misses
+            now = time.time()
+            remote_entries = iter(
+                map(decode_airport, await _redis(self.rd.mget(remote_keys)))
+            )
+            remote_hits = remote_stale = 0
+            for index, airport in enumerate(airports):
+                if airport is None:
+                    entry = next(remote_entries)
+                    if entry is None:
+                        continue
+                    if entry.fresh_until <= now:
+                        remote_stale += 1
+                        continue
+                    remote_hits += 1
+                    airports[index] = entry.airport
+                    self.local.set(keys[index], entry.airport)
+            CACHE_REQUESTS.labels("redis", "hit").inc(remote_hits)
+            CACHE_REQUESTS.labels("redis", "stale").inc(remote_stale)
+            CACHE_REQUESTS.labels("redis", "miss").inc(
+                len(remote_keys) - remote_hits - remote_stale
+            )
+
+        return [
+            None
+            if airport is None
+            else (airport, _distance_km(airport, item, self.ellipsoidal))
+            for item, airport in zip(coordinates, airports)
+        ]
+
+    async def set(self, coordinates: Coordinates, airport: Airport) -> None:
+        await self._store(self.key(coordinates), airport)
+
+    async def set_many(self, items: list[tuple[Coordinates, Airport]]) -> None:
+        """
+        Cache the nearest airport for each of a list of coordinates in a single pipelined round trip
+        """
+        if not items:
+            return
+        pipeline = self.rd.pipeline(transaction=False)
+        fresh_until = time.time() + self.ttl_seconds
+        for coordinates, airport in items:
+            key = self.key(coordinates)
+            self.local.set(key, airport)
+            pipeline.set(
+                key,
+                encode_airport(airport, fresh_until),
+                ex=self.ttl_seconds + math.ceil(self.stale_seconds),
+            )
+        await _redis(pipeline.execute())
+
+    async def invalidate(self) -> int:
+        """
+        Bump the dataset version, invalidating cached results in every worker, and return the new version
+        """
+        dataset_version = await _redis(self.rd.incr(DATASET_VERSION_KEY))
+        self.local.clear()
+        self.local.dataset_version = dataset_version
+        self.local.version_checked_at = time.monotonic()
+        return dataset_version
+
+
+class SerializedResponseCache:
+    """
+    Holds a serialised response body, and its strong ETag, for a single dataset version. The body is only
+    rebuilt, by one caller at a time, when the dataset version changes.
+    """
+
+    def __init__(self):
+        self.dataset_version: int | None = None
+        self.body: bytes | None = None
+        self.etag: str | None = None
+        self._lock = asyncio.Lock()
+
+    async def get(
+        self, dataset_version: int, build: Callable[[], Awaitable[bytes]]
+    ) -> tuple[bytes, str]:
+        """
+        Return the serialised body and ETag for dataset_version, building the body with `build` if it has
+        not been built for that version yet
+        """
+        if self.body is None or self.dataset_version != dataset_version:
+            async with self._lock:
+                if self.body is None or self.dataset_version != dataset_version:
+                    body = await build()
+                    self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+                    self.body = body
+                    self.dataset_version = dataset_version
+        return self.body, self.etag
+
+    def clear(self) -> None:
+        self.dataset_version = self.body = self.etag = None
+
+
+async def _redis(command: Awaitable[T]) -> T:
+    """
+    Await a Redis command, counting (and re-raising) any Redis error
+    """
+    try:
+        return await command
+    except RedisError:
+        CACHE_REQUESTS.labels("redis", "error").inc()
+        raise
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Return whether an If-None-Match header matches a strong ETag
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def encode_airport(airport: Airport, fresh_until: float) -> bytes:
+    """
+    Encode a cached airport, fresh until the fresh_until timestamp (seconds since the epoch)
+    """
+    return json.dumps(
+        [
+            CACHE_FORMAT_VERSION,
+            round(fresh_until, 3),
+            airport.id,
+            airport.name,
+            airport.icao,
+            airport.latitude,
+            airport.longitude,
+        ],
+        separators=(",", ":"),
+    ).encode()
+
+
+def decode_airport(value: bytes | None) -> CacheEntry | None:
+    """
+    Decode a cached airport, treating missing, malformed or out of date entries as a cache miss
+    """
+    if not value:
+        return None
+    try:
+        version, fresh_until, id, name, icao, latitude, longitude = json.loads(value)
+    except (TypeError, ValueError):
+        return None
+    if version != CACHE_FORMAT_VERSION:
+        return None
+    return CacheEntry(
+        Airport(id=id, name=name, icao=icao, latitude=latitude, longitude=longitude),
+        fresh_until,
+    )
+
+
+def _lock_key(key: str) -> str:
+    return f"{key}:lock"
+
+
+def _distance_km(
+    airport: Airport, coordinates: Coordinates, ellipsoidal: bool = False
+) -> float:
+    calculate_distance = (
+        _calculate_vincenty_distance if ellipsoidal else _calculate_haversine_distance
+    )
+    return float(
+        calculate_distance(
+            coordinates.longitude_radians,
+            coordinates.latitude_radians,
+            radians(airport.longitude),
+            radians(airport.latitude),
+        )
+    )
@@ -2,20 +2,43 @@
 CRUD functionality for interacting with the application's database.
 """
 
+import io
 import pathlib
+import time
+from collections.abc import Iterator
+from typing import TYPE_CHECKING
 
-import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.core import models
+from app.core import models, schemas
+from app.core.store import AIRPORT_FIELDS, AirportStore
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+AIRPORT_DATA_FILEPATH = (
+    f"{pathlib.Path(__file__).parent.resolve()}/data/uk_airport_coords.csv"
+)
+AIRPORT_COLUMNS = ["name", "icao", "latitude", "longitude"]
 
 
 def get_all_airports(db: Session) -> list[models.Airport]:
     return db.query(models.Airport).all()
 
 
-def get_all_airports_df(db: Session) -> pd.DataFrame:
-    return pd.read_sql_table("airports", db.get_bind())
+def get_airport_store(db: Session, float32: bool = False) -> AirportStore:
+    """
+    Read the airports table, in id order, straight into the columns of an AirportStore (see store.py)
+    """
+    rows = db.execute(
+        select(*(getattr(models.Airport, field) for field in AIRPORT_FIELDS)).order_by(
+            models.Airport.id
+        )
+    ).all()
+    columns = list(zip(*rows)) or [()] * len(AIRPORT_FIELDS)
+    return AirportStore(*columns, float32=float32)
 
 
 def get_airport_by_id(id: int, db: Session) -> models.Airport | None:
@@ -27,19 +50,169 @@ def get_airport_by_icao(icao: str, db: Session) -> models.Airport | None:
 
 
 def insert_airport_data(db: Session) -> None:
-    filepath = f"{pathlib.Path(__file__).parent.resolve()}/data/uk_airport_coords.csv"
-    df = _retrieve_airport_data_from_file(filepath)
-    df.to_sql(
-        "airports", db.get_bind(), if_exists="append", method="multi", index=False
+    upsert_airport_data(db, AIRPORT_DATA_FILEPATH)
+
+
+def validate_airport_data(
+    filepath: str, chunksize: int = 50_000, db: Session | None = None
+) -> int:
+    """
+    Check that an airport data file can be loaded by upsert_airport_data, and return its number of rows.
+    Raises a ValueError describing the first problem found: an unreadable file, missing columns, a row
+    with a missing value or coordinates that are not numbers in range, or an airport name used by another
+    ICAO code - in the file or, given a db session, by an airport already in the table which the file does
+    not update (airport names are unique).
+    """
+    import pandas as pd
+
+    rows = 0
+    airport_names: dict[
+        str, tuple[str, int]
+    ] = {}  # ICAO code to name and line, the last row wins
+    try:
+        for chunk in _retrieve_airport_data_from_file(filepath, chunksize):
+            missing_columns = set(AIRPORT_COLUMNS) - set(chunk.columns)
+            if missing_columns:
+                raise ValueError(f"Missing columns {sorted(missing_columns)}")
+
+            latitude = pd.to_numeric(chunk["latitude"], errors="coerce")
+            longitude = pd.to_numeric(chunk["longitude"], errors="coerce")
+            invalid = (
+                chunk[AIRPORT_COLUMNS].isna().any(axis=1)
+                | ~latitude.between(-90, 90)
+                | ~longitude.between(-180, 180)
+            )
+            if invalid.any():
+                # Line numbers count the header, from 1
+                raise ValueError(
+                    f"Invalid airport on line {chunk.index[invalid][0] + 2}"
+                )
+            for line, name, icao in zip(chunk.index + 2, chunk["name"], chunk["icao"]):
+                airport_names[str(icao)] = (str(name), int(line))
+            rows += len(chunk)
+    except (
+        pd.errors.ParserError,
+        pd.errors.EmptyDataError,
+        UnicodeDecodeError,
+    ) as error:
+        raise ValueError(f"Cannot read airport data: {error}") from error
+
+    if not rows:
+        raise ValueError("Airport data file has no rows")
+    _check_unique_names(airport_names, db)
+    return rows
+
+
+def _check_unique_names(
+    airport_names: dict[str, tuple[str, int]], db: Session | None
+) -> None:
+    name_lines: dict[str, int] = {}
+    for name, line in sorted(airport_names.values(), key=lambda entry: entry[1]):
+        if name in name_lines:
+            raise ValueError(f"Duplicate airport name on line {line}")
+        name_lines[name] = line
+
+    if db is None:
+        return
+    for name, icao in db.execute(select(models.Airport.name, models.Airport.icao)):
+        if icao not in airport_names and name in name_lines:
+            raise ValueError(f"Duplicate airport name on line {name_lines[name]}")
+
+
+def upsert_airport_data(
+    db: Session, filepath: str, chunksize: int = 50_000
+) -> schemas.IngestionReport:
+    """
+    Load an airport data file into the airports table, reading it in chunks and upserting by ICAO code so
+    that only new or changed airports are written. Chunks are bulk loaded with COPY (through a staging
+    table) on Postgres and executemany on SQLite. The upsert is committed as a single transaction, and
+    rolled back if it breaks a constraint of the table, raising an IntegrityError.
+    """
+    start = time.perf_counter()
+    rows_read = rows_written = 0
+    upsert_chunk = (
+        _upsert_chunk_postgres
+        if db.get_bind().dialect.name == "postgresql"
+        else _upsert_chunk_sqlite
     )
 
+    connection = db.connection().connection
+    cursor = connection.cursor()
+    try:
+        try:
+            for chunk in _retrieve_airport_data_from_file(filepath, chunksize):
+                chunk = chunk[AIRPORT_COLUMNS].drop_duplicates("icao", keep="last")
+                rows_read += len(chunk)
+                rows_written += upsert_chunk(cursor, chunk)
+        finally:
+            cursor.close()
+    except db.get_bind().dialect.dbapi.IntegrityError as error:
+        # Raised by the DBAPI cursor, so wrapped as SQLAlchemy would
+        db.rollback()
+        raise IntegrityError("upsert airports", None, error) from error
+    db.commit()
 
-def _retrieve_airport_data_from_file(airport_data_filepath: str) -> pd.DataFrame:
-    return pd.read_csv(airport_data_filepath).rename(
-        columns={
-            "NAME": "name",
-            "ICAO": "icao",
-            "Longitude": "longitude",
-            "Latitude": "latitude",
-        }
+    return schemas.IngestionReport(
+        rows_read=rows_read,
+        rows_written=rows_written,
+        seconds=time.perf_counter() - start,
     )
+
+
+def _upsert_chunk_postgres(cursor, chunk: "pd.DataFrame") -> int:
+    cursor.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS airports_staging "
+        "(name varchar, icao varchar, latitude float, longitude float) ON COMMIT DROP"
+    )
+    buffer = io.StringIO()
+    chunk.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(
+        "COPY airports_staging (name, icao, latitude, longitude) FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+    cursor.execute(
+        "INSERT INTO airports (name, icao, latitude, longitude) "
+        "SELECT name, icao, latitude, longitude FROM airports_staging "
+        "ON CONFLICT (icao) DO UPDATE SET "
+        "name = EXCLUDED.name, latitude = EXCLUDED.latitude, longitude = EXCLUDED.longitude "
+        "WHERE (airports.name, airports.latitude, airports.longitude) "
+        "IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.latitude, EXCLUDED.longitude)"
+    )
+    rows_written = cursor.rowcount
+    cursor.execute("TRUNCATE airports_staging")
+    return rows_written
+
+
+def _upsert_chunk_sqlite(cursor, chunk: "pd.DataFrame") -> int:
+    cursor.executemany(
+        "INSERT INTO airports (name, icao, latitude, longitude) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (icao) DO UPDATE SET "
+        "name = excluded.name, latitude = excluded.latitude, longitude = excluded.longitude "
+        "WHERE airports.name IS NOT excluded.name "
+        "OR airports.latitude IS NOT excluded.latitude "
+        "OR airports.longitude IS NOT excluded.longitude",
+        chunk.itertuples(index=False, name=None),
+    )
+    return cursor.rowcount
+
+
+def _retrieve_airport_data_from_file(
+    airport_data_filepath: str, chunksize: int
+) -> Iterator["pd.DataFrame"]:
+    """
+    Yield chunks of an airport data file, with columns renamed to match the airports table. Accepts both
+    the bundled CSV headers (NAME, ICAO, Latitude, Longitude) and the table's own.
+    """
+    import pandas as pd
+
+    with pd.read_csv(airport_data_filepath, chunksize=chunksize) as chunks:
+        for chunk in chunks:
+            yield chunk.rename(
+                columns={
+                    "NAME": "name",
+                    "ICAO": "icao",
+                    "Longitude": "longitude",
+                    "Latitude": "latitude",
+                }
+            )
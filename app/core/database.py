@@ -1,8 +1,12 @@
 """
 Initialise the application's database. Development environment connects to a Postgres server, while
 a testing environment will create a local SQLite database in the tests/data directory.
+
+Both a synchronous SQLAlchemy engine (used at startup and for data loading) and a pooled async database
+(used by the API routes, see async_crud.py) are created for the same database.
 """
 
+from databases import Database
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -13,8 +17,14 @@ if settings.environment == "testing":
     engine = create_engine(
         settings.test_db_url, connect_args={"check_same_thread": False}
     )
+    database = Database(settings.test_db_url)
 else:
     engine = create_engine(settings.db_url)
+    database = Database(
+        settings.db_url,
+        min_size=settings.db_pool_min_size,
+        max_size=settings.db_pool_max_size,
+    )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -0,0 +1,181 @@
+"""
+Executor for the nearest airport engine's CPU-bound queries, so that they run off the event loop and a slow
+query never stalls the other requests handled by a worker. The executor is selected with the
+COMPUTE_EXECUTOR setting:
+    - thread (the default): a pool of COMPUTE_WORKERS threads. The engines' NumPy kernels and ball tree
+      queries release the GIL for most of their run time, so threads calculate in parallel.
+    - process: a pool of COMPUTE_WORKERS processes, each forked with a copy of the engine, for queries which
+      hold the GIL. The pool is replaced once a dataset reload swaps in a new engine.
+    - inline: queries run on the event loop, as before.
+
+Batches are split into chunks of COMPUTE_CHUNK_SIZE points, calculated concurrently across the pool. At most
+COMPUTE_MAX_PENDING chunks can be queued or running at once - beyond that, new queries are rejected with a
+ComputeBusyError (a 503 response), rather than queueing without bound.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+from collections.abc import Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Literal
+
+import numpy as np
+
+from app.core.services import NearestAirportEngine
+
+ExecutorKind = Literal["inline", "thread", "process"]
+
+# The engine held by a process pool worker, inherited from the parent when forked
+_process_engine: NearestAirportEngine | None = None
+
+
+class ComputeBusyError(Exception):
+    """
+    Raised when a query would exceed the executor's limit of pending chunks
+    """
+
+
+class ComputeExecutor:
+    """
+    Runs engine queries on a thread or process pool (see module docstring). Queries are named by engine
+    method, so that a process pool can call them on its workers' copy of the engine.
+    """
+
+    def __init__(
+        self,
+        kind: ExecutorKind = "thread",
+        workers: int | None = None,
+        max_pending: int = 1_000,
+        chunk_size: int = 10_000,
+    ):
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self.pending = 0
+        self._pool: Executor | None = None
+        self._pool_engine: NearestAirportEngine | None = None
+
+    async def run(self, engine: NearestAirportEngine, method: str, *args) -> Any:
+        """
+        Return the result of engine.<method>(*args), calculated on the executor
+        """
+        if self.kind == "inline":
+            return getattr(engine, method)(*args)
+
+        self._reserve(1)
+        try:
+            return await self._submit(engine, method, args)
+        finally:
+            self.pending -= 1
+
+    async def run_chunked(
+        self,
+        engine: NearestAirportEngine,
+        method: str,
+        chunked: Sequence[Sequence],
+        *args,
+        chunk_size: int | None = None,
+    ) -> Any:
+        """
+        Return the result of engine.<method>(*chunked, *args) for a batch query, where `chunked` are equal
+        length sequences of per-point arguments (e.g. longitudes and latitudes). The points are split into
+        chunks of chunk_size (by default COMPUTE_CHUNK_SIZE), calculated concurrently, and the results -
+        arrays, or tuples of arrays, in point order - concatenated.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        count = len(chunked[0])
+        if self.kind == "inline" or count <= chunk_size:
+            return await self.run(engine, method, *chunked, *args)
+
+        starts = range(0, count, chunk_size)
+        self._reserve(len(starts))
+        try:
+            results = await asyncio.gather(
+                *(
+                    self._submit(
+                        engine,
+                        method,
+                        (
+                            *(items[start : start + chunk_size] for items in chunked),
+                            *args,
+                        ),
+                    )
+                    for start in starts
+                )
+            )
+        finally:
+            self.pending -= len(starts)
+
+        if isinstance(results[0], tuple):
+            return tuple(np.concatenate(parts) for parts in zip(*results))
+        return np.concatenate(results)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return the executor's settings and the number of pending chunks, reported by GET /engine
+        """
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "chunk_size": self.chunk_size,
+        }
+
+    def shutdown(self, cancel_futures: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=cancel_futures)
+            self._pool = self._pool_engine = None
+
+    def _reserve(self, count: int) -> None:
+        if self.pending + count > self.max_pending:
+            raise ComputeBusyError(
+                f"Too many nearest airport queries pending ({self.pending})"
+            )
+        self.pending += count
+
+    async def _submit(
+        self, engine: NearestAirportEngine, method: str, args: tuple
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        if self.kind == "thread":
+            return await loop.run_in_executor(
+                self._thread_pool(), functools.partial(getattr(engine, method), *args)
+            )
+        return await loop.run_in_executor(
+            self._process_pool(engine), _call_process_engine, method, args
+        )
+
+    def _thread_pool(self) -> Executor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                self.workers, thread_name_prefix="nearest-airport"
+            )
+        return self._pool
+
+    def _process_pool(self, engine: NearestAirportEngine) -> Executor:
+        # Workers are forked with the engine rather than sent it, so they share its (copy on write) arrays,
+        #   and are replaced when a dataset reload swaps in a new engine - the old workers finish the chunks
+        #   already queued for them first
+        if engine is not self._pool_engine:
+            self.shutdown(cancel_futures=False)
+            self._pool = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_set_process_engine,
+                initargs=(engine,),
+            )
+            self._pool_engine = engine
+        return self._pool
+
+
+def _set_process_engine(engine: NearestAirportEngine) -> None:
+    global _process_engine
+    _process_engine = engine
+
+
+def _call_process_engine(method: str, args: tuple) -> Any:
+    return getattr(_process_engine, method)(*args)
@@ -0,0 +1,82 @@
+"""
+In-memory airport lookups, held by the nearest airport engine alongside its airports: hash indexes by id and
+ICAO code serving GET /airports/<id> and GET /airports/icao/<icao> without a database round trip, and a
+prefix index over ICAO codes and airport names serving GET /airports/search.
+
+The prefix index is a pair of sorted key lists, searched with bisect, so a search costs O(log n) plus the
+number of matches returned. Names are indexed from the start of each word (e.g. "LONDON HEATHROW" under
+both "LONDON HEATHROW" and "HEATHROW"), so that type-ahead matches any word of a name.
+"""
+
+import re
+from bisect import bisect_left
+from collections.abc import Iterable
+
+from app.core.store import AirportStore
+
+WORD = re.compile(r"\w+")
+
+
+def normalise(text: str) -> str:
+    """
+    Normalise an ICAO code, name or search prefix for lookups - upper case, with runs of whitespace
+    collapsed to a single space
+    """
+    return " ".join(text.upper().split())
+
+
+class AirportLookup:
+    """
+    Id, ICAO code and prefix indexes over an airport store, built from its columns without creating a
+    record per airport. Lookups return positions in the store.
+    """
+
+    def __init__(self, airports: AirportStore):
+        self.id_positions = {
+            airport_id: position
+            for position, airport_id in enumerate(airports.ids.tolist())
+        }
+        self.icao_positions = {
+            normalise(icao): position for position, icao in enumerate(airports.icaos)
+        }
+        self.icao_keys, self.icao_key_positions = _sorted_keys(
+            (icao, position) for icao, position in self.icao_positions.items()
+        )
+        self.name_keys, self.name_key_positions = _sorted_keys(
+            (name[word.start() :], position)
+            for position, name in enumerate(map(normalise, airports.names))
+            for word in WORD.finditer(name)
+        )
+
+    def position_of_id(self, airport_id: int) -> int | None:
+        return self.id_positions.get(airport_id)
+
+    def position_of_icao(self, icao: str) -> int | None:
+        return self.icao_positions.get(normalise(icao))
+
+    def search(self, prefix: str, limit: int) -> list[int]:
+        """
+        Return the positions of up to `limit` airports with an ICAO code, or a word of their name, starting
+        with prefix (case insensitive). ICAO code matches come first, then name matches, each in
+        alphabetical order of the matching key.
+        """
+        prefix = normalise(prefix)
+        if not prefix:
+            return []
+
+        matches: dict[int, None] = {}  # an insertion ordered set
+        for keys, positions in (
+            (self.icao_keys, self.icao_key_positions),
+            (self.name_keys, self.name_key_positions),
+        ):
+            for key_index in range(bisect_left(keys, prefix), len(keys)):
+                if len(matches) >= limit or not keys[key_index].startswith(prefix):
+                    break
+                matches[positions[key_index]] = None
+
+        return list(matches)
+
+
+def _sorted_keys(entries: Iterable[tuple[str, int]]) -> tuple[list[str], list[int]]:
+    entries = sorted(entries)
+    return [key for key, _ in entries], [position for _, position in entries]
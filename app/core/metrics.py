@@ -0,0 +1,196 @@
+"""
+Prometheus metrics for the API, served by GET /api/v1.0/metrics. Metrics are held per worker process.
+
+    - nearest_airport_request_duration_seconds: request latency by method, route template and status
+    - nearest_airport_phase_duration_seconds: time spent fetching from the database (db_fetch), calculating
+      distances (distance) and reading the nearest airport cache (cache) while handling requests
+    - nearest_airport_cache_requests_total: nearest airport cache lookups by tier (local, redis) and
+      result (hit, miss, stale, error)
+    - nearest_airport_pool_connections: database and redis connection pool size, connections in use and
+      maximum size
+"""
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from databases import Database
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from redis.asyncio import Redis
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+REQUEST_DURATION = Histogram(
+    "nearest_airport_request_duration_seconds",
+    "HTTP request latency by method, route template and status",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+PHASE_DURATION = Histogram(
+    "nearest_airport_phase_duration_seconds",
+    "Time spent in each phase (db_fetch, distance, cache) of handling requests",
+    ["phase"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "nearest_airport_cache_requests",
+    "Nearest airport cache lookups by tier (local, redis) and result (hit, miss, stale, error)",
+    ["tier", "result"],
+)
+POOL_CONNECTIONS = Gauge(
+    "nearest_airport_pool_connections",
+    "Connection pool size, connections in use and maximum size",
+    ["pool", "state"],
+)
+
+# Phase timings of the request being profiled (see profiling.py), or None for every other request
+_request_phases: ContextVar[dict[str, float] | None] = ContextVar(
+    "request_phases", default=None
+)
+# Time spent in the phases nested inside the current phase
+_nested_seconds: ContextVar[list[float] | None] = ContextVar(
+    "nested_seconds", default=None
+)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Record the time spent in a phase of handling a request, e.g.
+
+        with metrics.phase("distance"):
+            engine.nearest(coordinates)
+
+    A phase entered inside another (e.g. a distance calculation made on a cache miss) is only counted once:
+    its time is left out of the enclosing phase.
+    """
+    nested = [0.0]
+    token = _nested_seconds.set(nested)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _nested_seconds.reset(token)
+        parent = _nested_seconds.get()
+        if parent is not None:
+            parent[0] += elapsed
+        elapsed -= nested[0]
+        PHASE_DURATION.labels(name).observe(elapsed)
+        timings = _request_phases.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def record_phases() -> Iterator[dict[str, float]]:
+    """
+    Collect the total time spent in each phase by the current request (including work it runs in the
+    threadpool, which copies its context) into the dict yielded
+    """
+    timings: dict[str, float] = {}
+    token = _request_phases.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_phases.reset(token)
+
+
+def observe_pools(database: Database, rd: Redis) -> None:
+    """
+    Report the usage of the database and redis connection pools, read whenever metrics are collected
+    """
+    for state in ("size", "in_use", "max"):
+        POOL_CONNECTIONS.labels("database", state).set_function(
+            lambda state=state: _database_pool_usage(database).get(state, 0)
+        )
+        POOL_CONNECTIONS.labels("redis", state).set_function(
+            lambda state=state: _redis_pool_usage(rd).get(state, 0)
+        )
+
+
+def render() -> bytes:
+    return generate_latest()
+
+
+def _database_pool_usage(database: Database) -> dict[str, int]:
+    # Only the asyncpg backend reports its pool usage - SQLite (testing) connections are not reported
+    pool = getattr(database._backend, "_pool", None)
+    if not hasattr(pool, "get_size"):
+        return {}
+    size = pool.get_size()
+    return {
+        "size": size,
+        "in_use": size - pool.get_idle_size(),
+        "max": pool.get_max_size(),
+    }
+
+
+def _redis_pool_usage(rd: Redis) -> dict[str, int]:
+    pool = rd.connection_pool
+    connections = getattr(pool, "_connections", [])
+    # BlockingConnectionPool queues idle connections, and None placeholders for connections not yet made
+    idle = sum(1 for connection in pool.pool._queue if connection is not None)
+    return {
+        "size": len(connections),
+        "in_use": len(connections) - idle,
+        "max": pool.max_connections,
+    }
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency of every HTTP request by method, route template (so that path
+    parameters do not create a series per value) and status. Written as plain ASGI, rather than with
+    BaseHTTPMiddleware, so that streamed request and response bodies pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_DURATION.labels(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status_code),
+            ).observe(time.perf_counter() - start)
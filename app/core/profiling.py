@@ -0,0 +1,172 @@
+"""
+Opt-in profiling of single requests. A request carrying the PROFILE_HEADER header (default X-Profile) set
+to the app's SECRET_KEY is run under cProfile, and its response gets an X-Profile-Id header. The secret is
+only accepted in a header, never the query string, which ends up in access and proxy logs. Once the
+response has been sent, two reports are written to PROFILE_DIR, keeping the newest PROFILE_KEEP:
+
+    - <id>.txt: the time spent in each phase of the request (see metrics.phase) - fetching from the
+      database, reading the cache and calculating distances, with the remainder spent routing, resolving
+      dependencies, validating and serialising - followed by the functions with the most cumulative time
+    - <id>.prof: the full cProfile stats, for call tree and flame graph viewers such as snakeviz or
+      flameprof
+
+Both are downloaded from GET /api/v1.0/profiles/<id>, with the same secret.
+
+cProfile only follows the event loop's thread, so work run in the threadpool appears in the phase timings
+but not in the call tree, and any other requests the worker interleaves with the profiled one appear in the
+call tree. Only one request per worker is profiled at a time. Requests without the flag only pay for a scan
+of their headers.
+"""
+
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import re
+import time
+import uuid
+
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.core import metrics
+
+PROFILE_ID_HEADER = b"x-profile-id"
+PROFILES_PATH = "/api/v1.0/profiles/"
+REPORT_FORMATS = {"text": ".txt", "pstats": ".prof"}
+REPORT_LINES = 50
+
+_PROFILE_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def is_authorised(scope: Scope) -> bool:
+    """
+    Return whether a request carries the profiling header set to the app's secret
+    """
+    header = settings.profile_header.lower().encode("latin-1")
+    for name, value in scope["headers"]:
+        if name == header:
+            return _is_secret(value)
+    return False
+
+
+def report_path(profile_id: str, report_format: str) -> str | None:
+    """
+    Return the path of a stored profile report, or None if there is no such report
+    """
+    if not _PROFILE_ID.fullmatch(profile_id) or report_format not in REPORT_FORMATS:
+        return None
+    path = os.path.join(
+        settings.profile_dir, profile_id + REPORT_FORMATS[report_format]
+    )
+    return path if os.path.exists(path) else None
+
+
+def _is_secret(value: bytes) -> bool:
+    return hmac.compare_digest(value, settings.secret_key.encode("latin-1"))
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling the requests which ask for it (see the module docstring), and passing every
+    other request straight through
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.profiling = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or self.profiling
+            or not is_authorised(scope)
+            or scope["path"].startswith(PROFILES_PATH)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        status_code = 500
+
+        async def send_with_profile_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (PROFILE_ID_HEADER, profile_id.encode("latin-1")),
+                ]
+            await send(message)
+
+        self.profiling = True
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            with metrics.record_phases() as phases:
+                profiler.enable()
+                try:
+                    await self.app(scope, receive, send_with_profile_id)
+                finally:
+                    profiler.disable()
+        finally:
+            self.profiling = False
+            seconds = time.perf_counter() - start
+            await run_in_threadpool(
+                _write_reports,
+                profile_id,
+                profiler,
+                f"{scope['method']} {scope['path']} -> {status_code}",
+                seconds,
+                phases,
+            )
+
+
+def _write_reports(
+    profile_id: str,
+    profiler: cProfile.Profile,
+    request: str,
+    seconds: float,
+    phases: dict[str, float],
+) -> None:
+    os.makedirs(settings.profile_dir, exist_ok=True)
+    path = os.path.join(settings.profile_dir, profile_id)
+    profiler.dump_stats(path + REPORT_FORMATS["pstats"])
+
+    report = io.StringIO()
+    report.write(f"{request}\ntotal {seconds * 1000:10.3f} ms\n")
+    for name, phase_seconds in sorted(phases.items()):
+        report.write(f"  {name:<8} {phase_seconds * 1000:10.3f} ms\n")
+    other = seconds - sum(phases.values())
+    report.write(
+        f"  {'other':<8} {other * 1000:10.3f} ms "
+        "(routing, dependencies, validation and serialisation)\n\n"
+    )
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(
+        REPORT_LINES
+    )
+    with open(path + REPORT_FORMATS["text"], "w") as file:
+        file.write(report.getvalue())
+
+    _prune_reports()
+
+
+def _prune_reports() -> None:
+    profile_ids = sorted(
+        (
+            name[: -len(REPORT_FORMATS["pstats"])]
+            for name in os.listdir(settings.profile_dir)
+            if name.endswith(REPORT_FORMATS["pstats"])
+        ),
+        key=lambda profile_id: os.path.getmtime(
+            os.path.join(settings.profile_dir, profile_id + REPORT_FORMATS["pstats"])
+        ),
+    )
+    for profile_id in profile_ids[: -settings.profile_keep]:
+        for extension in REPORT_FORMATS.values():
+            try:
+                os.remove(os.path.join(settings.profile_dir, profile_id + extension))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,136 @@
+"""
+Hot reloading of the airport dataset. Each worker serves requests from the nearest airport engine held in
+its app state, built for a dataset version (see cache.py). When the airport data changes - through POST
+/admin/airports, or python -m app.ingest - the dataset version is bumped in Redis, and every worker rebuilds
+its engine in a worker thread and swaps it in with a single assignment. Requests keep being served from the
+old engine (and its warm caches) until then, so a reload never blocks requests or restarts a worker.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from typing import Any
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import State
+
+from app.core.cache import LocalCache, NearestAirportCache
+from app.core.services import NearestAirportEngine
+
+logger = logging.getLogger(__name__)
+
+
+class DatasetReloader:
+    """
+    Rebuilds a worker's nearest airport engine, and swaps it into state.nearest_airport_engine. `load`
+    builds the engine from the current dataset (the airports table, or the current snapshot), and `publish`
+    from the airports table after it has been updated (writing a new snapshot first, if snapshots are
+    used). Engines are built with their ball tree and airport lookups, so the first queries after a swap are
+    not slowed by building them.
+
+    A worker keeps the cache keys of the dataset version its engine was built for until the new engine is
+    swapped in (see NearestAirportCache.sync_dataset_version), so results calculated from the old dataset
+    are never cached under the new version. Only one reload runs at a time.
+
+    Failed rebuilds are logged, and reported by stats. A publish is retried up to `publish_attempts` times,
+    waiting `retry_seconds` (doubling each time) in between.
+    """
+
+    def __init__(
+        self,
+        state: State,
+        local: LocalCache,
+        load: Callable[[], NearestAirportEngine],
+        publish: Callable[[], NearestAirportEngine],
+        publish_attempts: int = 3,
+        retry_seconds: float = 1.0,
+    ):
+        self.state = state
+        self.local = local
+        self.load = load
+        self.publish_engine = publish
+        self.publish_attempts = publish_attempts
+        self.retry_seconds = retry_seconds
+        self.generation = 0
+        self.status = "idle"
+        self.error: str | None = None
+        self.build_seconds: float | None = None
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    def check(self, dataset_version: int) -> None:
+        """
+        Start reloading the engine for a newer dataset version in the background, unless a reload is
+        already running
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._reload(dataset_version))
+
+    async def publish(self, cache: NearestAirportCache) -> int:
+        """
+        Rebuild the engine from the updated airports table and swap it in, then bump the dataset version
+        so that every other worker reloads. Returns the new dataset version.
+
+        If every attempt to rebuild fails, the dataset version is bumped anyway, as the airports table has
+        already been updated - every worker, this one included, then reloads its engine with `load` rather
+        than serving the old dataset until it restarts. (With snapshots, that is the current snapshot, so a
+        new one must be published by hand with python -m app.snapshot.)
+        """
+        async with self._lock:
+            for attempt in range(self.publish_attempts):
+                if attempt:
+                    await asyncio.sleep(self.retry_seconds * 2 ** (attempt - 1))
+                if await self._swap(self.publish_engine):
+                    return await cache.invalidate()
+
+            logger.error(
+                "Publishing the airport dataset failed after %d attempts, reloading every worker instead",
+                self.publish_attempts,
+            )
+            previous_version = self.local.dataset_version
+            dataset_version = await cache.invalidate()
+            # This worker's engine is still built from the old dataset, so it reloads like any other
+            self.local.dataset_version = previous_version
+        self.check(dataset_version)
+        return dataset_version
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return the status of this worker's dataset reloads, reported by GET /admin/airports/reload
+        """
+        return {
+            "status": self.status,
+            "generation": self.generation,
+            "dataset_version": self.local.dataset_version,
+            "airport_count": len(self.state.nearest_airport_engine),
+            "build_seconds": self.build_seconds,
+            "error": self.error,
+        }
+
+    async def _reload(self, dataset_version: int) -> None:
+        async with self._lock:
+            # A reload or publish that finished while this one waited may already be as new
+            if self.local.dataset_version >= dataset_version:
+                return
+            if await self._swap(self.load):
+                self.local.clear()
+                self.local.dataset_version = dataset_version
+
+    async def _swap(self, build: Callable[[], NearestAirportEngine]) -> bool:
+        self.status = "reloading"
+        start = time.perf_counter()
+        try:
+            engine = await run_in_threadpool(lambda: build().warm())
+        except Exception as error:
+            logger.exception("Rebuilding the nearest airport engine failed")
+            self.status = "failed"
+            self.error = f"{type(error).__name__}: {error}"
+            return False
+
+        self.state.nearest_airport_engine = engine
+        self.generation += 1
+        self.build_seconds = time.perf_counter() - start
+        self.status = "idle"
+        self.error = None
+        return True
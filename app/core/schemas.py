@@ -2,8 +2,10 @@
 Pydantic schemas, used to model airport, coordinate and response objects.
 """
 
-from numpy import deg2rad
-from pydantic import BaseModel, Field
+from math import radians
+from typing import Any, Literal
+
+from pydantic import BaseModel, Field, root_validator
 
 
 class Response(BaseModel):
@@ -30,20 +32,124 @@ class AirportsResponse(Response):
     airport_count: int
 
 
+class AirportsPageResponse(Response):
+    airports: list[dict[str, Any]]
+    airport_count: int
+    next_cursor: int | None
+
+
 class Coordinates(BaseModel):
     longitude_degrees: float = Field(..., le=180, ge=-180)
     latitude_degrees: float = Field(..., le=90, ge=-90)
 
     @property
     def longitude_radians(self) -> float:
-        return deg2rad(self.longitude_degrees)
+        return radians(self.longitude_degrees)
 
     @property
     def latitude_radians(self) -> float:
-        return deg2rad(self.latitude_degrees)
+        return radians(self.latitude_degrees)
+
+
+class BoundingBox(BaseModel):
+    min_longitude: float = Field(..., le=180, ge=-180)
+    min_latitude: float = Field(..., le=90, ge=-90)
+    max_longitude: float = Field(..., le=180, ge=-180)
+    max_latitude: float = Field(..., le=90, ge=-90)
+
+    @classmethod
+    def from_query(cls, bbox: str) -> "BoundingBox":
+        """
+        Parse a min_longitude,min_latitude,max_longitude,max_latitude query parameter
+        """
+        min_longitude, min_latitude, max_longitude, max_latitude = bbox.split(",")
+        return cls(
+            min_longitude=min_longitude,
+            min_latitude=min_latitude,
+            max_longitude=max_longitude,
+            max_latitude=max_latitude,
+        )
+
+    @root_validator(skip_on_failure=True)
+    def check_latitude_order(cls, values):
+        if values["min_latitude"] > values["max_latitude"]:
+            raise ValueError("min_latitude must not be greater than max_latitude")
+        return values
+
+    def as_tuple(self) -> tuple[float, float, float, float]:
+        return (
+            self.min_longitude,
+            self.min_latitude,
+            self.max_longitude,
+            self.max_latitude,
+        )
 
 
 class NearestAirportResponse(Response):
     nearest_airport: Airport
     distance_km: float
     input_coordinates: Coordinates
+
+
+class AirportDistance(BaseModel):
+    airport: Airport
+    distance_km: float
+
+
+class NearbyAirportsResponse(Response):
+    airports: list[AirportDistance]
+    airport_count: int
+    input_coordinates: Coordinates
+
+
+class NearestAirportBatchResult(Response):
+    nearest_airport: Airport | None = None
+    distance_km: float | None = None
+    input_coordinates: Coordinates | None = None
+    errors: list[dict] | None = None
+
+
+class NearestAirportBatchResponse(Response):
+    results: list[NearestAirportBatchResult]
+    result_count: int
+    error_count: int
+
+
+class DistanceMatrixRequest(BaseModel):
+    """
+    Origins and destinations are ICAO airport codes or coordinates, in any mix. Without destinations, the
+    distance between every pair of origins is returned.
+    """
+
+    origins: list[str | Coordinates] = Field(..., min_items=1)
+    destinations: list[str | Coordinates] | None = Field(None, min_items=1)
+
+
+class DistanceMatrixResponse(Response):
+    origin_count: int
+    destination_count: int
+    distances_km: list[list[float]]
+
+
+class IngestionReport(BaseModel):
+    rows_read: int
+    rows_written: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+
+class AirportUploadResponse(Response):
+    report: IngestionReport
+    reloading: bool
+
+
+class DatasetReloadStatus(BaseModel):
+    status: Literal["idle", "reloading", "failed"]
+    generation: int
+    dataset_version: int
+    airport_count: int
+    build_seconds: float | None
+    error: str | None
@@ -0,0 +1,248 @@
+"""
+Fast JSON serialization for the API's responses. Routes build their response bodies here from trusted
+internal data - airports already validated when the engine was built or read from the database, and
+coordinates already validated as request bodies - and return them as a raw JSONResponse, so FastAPI neither
+re-validates them against the route's response_model nor runs them through jsonable_encoder. The
+response_model is still declared on each route, and documents the same JSON shape (field names and order)
+built here.
+
+Bodies are encoded with orjson, and assembled from pre-encoded fragments (an Encoded value is inserted as
+is), so an airport encoded once (see NearestAirportEngine.airport_json) is reused by every response that
+includes it.
+"""
+
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+import numpy as np
+import orjson
+from starlette.responses import Response
+
+from app.core.schemas import Airport, Coordinates
+
+
+class Encoded(bytes):
+    """
+    A JSON encoded value, inserted into a body as is
+    """
+
+
+class JSONResponse(Response):
+    """
+    Response for a body already encoded as JSON
+    """
+
+    media_type = "application/json"
+
+
+def dumps(value: Any) -> bytes:
+    return value if isinstance(value, Encoded) else orjson.dumps(value)
+
+
+def json_object(members: dict[str, Any]) -> Encoded:
+    """
+    Encode a JSON object, inserting any Encoded member values as is
+    """
+    return Encoded(
+        b"{"
+        + b",".join(
+            orjson.dumps(key) + b":" + dumps(value) for key, value in members.items()
+        )
+        + b"}"
+    )
+
+
+def json_array(items: Iterable[Any]) -> Encoded:
+    """
+    Encode a JSON array, inserting any Encoded items as is
+    """
+    return Encoded(b"[" + b",".join(map(dumps, items)) + b"]")
+
+
+def encode_airport(airport: Airport, include: set[str] | None = None) -> Encoded:
+    if include is None:
+        return Encoded(orjson.dumps(dict(airport)))
+    return Encoded(
+        orjson.dumps({name: value for name, value in airport if name in include})
+    )
+
+
+def encode_coordinates(coordinates: Coordinates) -> Encoded:
+    return Encoded(
+        orjson.dumps(
+            {
+                "longitude_degrees": coordinates.longitude_degrees,
+                "latitude_degrees": coordinates.latitude_degrees,
+            }
+        )
+    )
+
+
+def airport_response(airport_json: Encoded) -> JSONResponse:
+    """
+    Return the body of schemas.AirportResponse
+    """
+    return JSONResponse(json_object({"success": True, "airport": airport_json}))
+
+
+def airports_body(airports: Sequence[Airport]) -> Encoded:
+    """
+    Return the body of schemas.AirportsResponse
+    """
+    return json_object(
+        {
+            "success": True,
+            "airports": json_array(map(encode_airport, airports)),
+            "airport_count": len(airports),
+        }
+    )
+
+
+def airport_search_response(airports_json: Sequence[Encoded]) -> JSONResponse:
+    """
+    Return the body of schemas.AirportsResponse for airports already encoded
+    """
+    return JSONResponse(
+        json_object(
+            {
+                "success": True,
+                "airports": json_array(airports_json),
+                "airport_count": len(airports_json),
+            }
+        )
+    )
+
+
+def airports_page_response(
+    airports: Sequence[Airport], include: set[str] | None, next_cursor: int | None
+) -> JSONResponse:
+    """
+    Return the body of schemas.AirportsPageResponse, with each airport projected to the fields in include
+    """
+    return JSONResponse(
+        json_object(
+            {
+                "success": True,
+                "airports": json_array(
+                    encode_airport(airport, include) for airport in airports
+                ),
+                "airport_count": len(airports),
+                "next_cursor": next_cursor,
+            }
+        )
+    )
+
+
+def nearest_airport_result(
+    airport_json: Encoded,
+    distance_km: float,
+    coordinates: Coordinates,
+    batch: bool = False,
+) -> Encoded:
+    """
+    Encode a nearest airport result - the body of schemas.NearestAirportResponse and a line of the nearest
+    airport stream, or with batch=True a successful schemas.NearestAirportBatchResult, which also has a null
+    errors member
+    """
+    members = {
+        "success": True,
+        "nearest_airport": airport_json,
+        "distance_km": float(distance_km),
+        "input_coordinates": encode_coordinates(coordinates),
+    }
+    if batch:
+        members["errors"] = None
+    return json_object(members)
+
+
+def nearest_airport_error(errors: list[dict], batch: bool = False) -> Encoded:
+    """
+    Encode a failed nearest airport result - a line of the nearest airport stream, or with batch=True a
+    failed schemas.NearestAirportBatchResult, which also has null result members
+    """
+    if not batch:
+        return json_object({"success": False, "errors": errors})
+    return json_object(
+        {
+            "success": False,
+            "nearest_airport": None,
+            "distance_km": None,
+            "input_coordinates": None,
+            "errors": errors,
+        }
+    )
+
+
+def nearest_airport_batch_response(
+    results: Sequence[Encoded], error_count: int
+) -> JSONResponse:
+    """
+    Return the body of schemas.NearestAirportBatchResponse for results encoded with nearest_airport_result
+    and nearest_airport_error
+    """
+    return JSONResponse(
+        json_object(
+            {
+                "success": True,
+                "results": json_array(results),
+                "result_count": len(results),
+                "error_count": error_count,
+            }
+        )
+    )
+
+
+def nearby_airports_response(
+    airports: Sequence[tuple[Airport, float]], coordinates: Coordinates
+) -> JSONResponse:
+    """
+    Return the body of schemas.NearbyAirportsResponse
+    """
+    return JSONResponse(
+        json_object(
+            {
+                "success": True,
+                "airports": json_array(
+                    json_object(
+                        {
+                            "airport": encode_airport(airport),
+                            "distance_km": float(distance_km),
+                        }
+                    )
+                    for airport, distance_km in airports
+                ),
+                "airport_count": len(airports),
+                "input_coordinates": encode_coordinates(coordinates),
+            }
+        )
+    )
+
+
+def distance_matrix_response(matrix: np.ndarray) -> JSONResponse:
+    """
+    Return the body of schemas.DistanceMatrixResponse, with the matrix encoded directly from its array
+    """
+    return JSONResponse(
+        json_object(
+            {
+                "success": True,
+                "origin_count": matrix.shape[0],
+                "destination_count": matrix.shape[1],
+                "distances_km": Encoded(
+                    orjson.dumps(matrix, option=orjson.OPT_SERIALIZE_NUMPY)
+                ),
+            }
+        )
+    )
+
+
+def distance_matrix_binary_response(matrix: np.ndarray) -> Response:
+    """
+    Return a distance matrix as little-endian float64 values in row-major order, with its shape (origins,
+    destinations) in the X-Matrix-Shape header
+    """
+    return Response(
+        np.ascontiguousarray(matrix, dtype="<f8").tobytes(),
+        media_type="application/octet-stream",
+        headers={"X-Matrix-Shape": f"{matrix.shape[0]},{matrix.shape[1]}"},
+    )
@@ -1,103 +1,882 @@
 """
-Service layer for the API with business logic used to manipulate a Pandas dataframe containing UK Airport
-information and return the nearest airport to an input coordinate.
+Service layer for the API with business logic used to hold UK Airport locations in memory and return the
+nearest airport to an input coordinate.
 
-Both a brute force and balltree nearest neighbour approach were taken - the API currently relies on the 
-brute force method as this has had more rigerous testing carried out on it.
+Brute force, balltree and lookup grid nearest neighbour approaches are available - the engine used by the
+API is selected with the NEAREST_AIRPORT_ENGINE setting (see config.py). The brute force engine is the
+default, as it is faster for a dataset the size of the UK airports, while the balltree engine answers
+queries in O(log n) and should be used for larger (e.g. global) datasets. The grid engine answers most
+queries with a cell lookup and a handful of distance calculations, at the cost of building its grid at
+startup. The k-nearest and within-radius queries are always served from a ball tree built alongside any
+engine.
+
+Distances are haversine (spherical) distances by default. An engine built with ellipsoidal=True instead
+answers nearest airport queries with WGS-84 geodesic distances, calculated with Vincenty's formulae for the
+few airports which could be nearest once the spherical error is allowed for (see ellipsoidal_nearest_many).
 """
 
-from math import asin, cos, sin, sqrt
+import math
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Mapping, Sequence
+from typing import TYPE_CHECKING, Any
 
 import numpy as np
-import pandas as pd
 from numpy import deg2rad
-from sklearn.neighbors import BallTree
 
-from app.core.schemas import Airport, Coordinates
+from app.core.lookup import AirportLookup
+from app.core.schemas import Coordinates
+from app.core.serialization import Encoded, encode_airport
+from app.core.store import AIRPORT_FIELDS, AirportRecord, AirportStore
+
+if TYPE_CHECKING:
+    from sklearn.neighbors import BallTree
 
 RADIUS_EARTH_KM = 6371
 
+# WGS-84 ellipsoid, in kilometres
+WGS84_SEMI_MAJOR_AXIS_KM = 6378.137
+WGS84_FLATTENING = 1 / 298.257223563
+WGS84_SEMI_MINOR_AXIS_KM = WGS84_SEMI_MAJOR_AXIS_KM * (1 - WGS84_FLATTENING)
+
+# Bounds on the ratio of the WGS-84 geodesic distance to the haversine distance between any two points. The
+#   ellipsoid's radius of curvature in any direction lies between its meridional radius at the equator and
+#   its radius at the poles, so every path is scaled by a factor between these relative to the sphere.
+ELLIPSOIDAL_RATIO_BOUNDS = (
+    WGS84_SEMI_MAJOR_AXIS_KM * (1 - WGS84_FLATTENING) ** 2 / RADIUS_EARTH_KM,
+    WGS84_SEMI_MAJOR_AXIS_KM / (1 - WGS84_FLATTENING) / RADIUS_EARTH_KM,
+)
+INDEX_ARRAYS = (
+    "latitude_radians",
+    "longitude_radians",
+    "cos_latitude",
+    "id_order",
+    "sorted_ids",
+    "latitude_order",
+    "sorted_latitude_radians",
+)
+
+
+class NearestAirportEngine(ABC):
+    """
+    Base class for the in-memory nearest airport engines. Airport coordinates are converted to radians once,
+    when the engine is built, and held as contiguous NumPy arrays. Engines are built from a mapping of
+    column name to column (a dataframe, or the arrays of an airport snapshot - see snapshot.py) and never
+    modify it.
+
+    Every engine also has a ball tree over the airport locations (haversine metric), which serves the
+    k-nearest and within-radius queries whichever engine is selected - subclasses decide how the single
+    nearest airport is found. The tree, and scikit-learn with it, is only loaded on first use: either from
+    tree_loader (a snapshot's prebuilt tree), or built from the airport locations if there is no loader or
+    it returns None. Airports are also indexed by id and by latitude, to serve paginated and bounding box
+    filtered listings, and looked up by id, ICAO code or name prefix from hash and sorted indexes built on
+    first use (see lookup.py).
+
+    The derived arrays (see INDEX_ARRAYS and build_index) can be passed in prebuilt as index, in which case
+    they are used as-is - a snapshot passes read-only memory-mapped arrays, shared by every worker.
+    """
+
+    def __init__(
+        self,
+        airports: AirportStore | Mapping[str, Any],
+        leaf_size: int = 15,
+        index: Mapping[str, np.ndarray] | None = None,
+        tree_loader: Callable[[], "BallTree"] | None = None,
+        ellipsoidal: bool = False,
+        float32: bool = False,
+    ):
+        if not isinstance(airports, AirportStore):
+            airports = AirportStore.from_columns(airports, float32=float32)
+        self.airports = airports
+        self.ids = airports.ids
+        self.latitudes = airports.latitudes
+        self.longitudes = airports.longitudes
+        if index is None:
+            index = build_index(self.ids, self.latitudes, self.longitudes)
+        self.latitude_radians = index["latitude_radians"]
+        self.longitude_radians = index["longitude_radians"]
+        self.cos_latitude = index["cos_latitude"]
+        self.id_order = index["id_order"]
+        self.sorted_ids = index["sorted_ids"]
+        self.latitude_order = index["latitude_order"]
+        self.sorted_latitude_radians = index["sorted_latitude_radians"]
+        self.leaf_size = leaf_size
+        self.tree_loader = tree_loader
+        self.ellipsoidal = ellipsoidal
+        self.snapshot_version: int | None = None
+        self._tree = None
+        self._airport_json: dict[int, Encoded] = {}
+        self._lookup: AirportLookup | None = None
+
+    @property
+    def tree(self) -> "BallTree":
+        if self._tree is None:
+            tree = self.tree_loader() if self.tree_loader is not None else None
+            self._tree = tree if tree is not None else self.build_tree()
+        return self._tree
+
+    def build_tree(self) -> "BallTree":
+        from sklearn.neighbors import BallTree
+
+        return BallTree(
+            np.column_stack((self.latitude_radians, self.longitude_radians)),
+            leaf_size=self.leaf_size,
+            metric="haversine",
+        )
+
+    def warm(self) -> "NearestAirportEngine":
+        """
+        Build (or load) the ball tree and lookup indexes now, rather than on the first query which needs them
+        """
+        self.tree
+        self.lookup
+        return self
+
+    def __len__(self) -> int:
+        return len(self.airports)
+
+    def airport_json(self, airport: AirportRecord) -> Encoded:
+        """
+        Return the JSON encoding of one of the engine's airports, encoded on first use and reused by every
+        response that includes it (see serialization.py)
+        """
+        encoded = self._airport_json.get(airport.id)
+        if encoded is None:
+            encoded = self._airport_json[airport.id] = encode_airport(airport)
+        return encoded
+
+    def airport_json_at(self, index: int) -> Encoded:
+        """
+        Return the JSON encoding of the airport at an index (into self.airports), only building its record
+        the first time it is encoded
+        """
+        encoded = self._airport_json.get(int(self.ids[index]))
+        if encoded is None:
+            encoded = self.airport_json(self.airports[index])
+        return encoded
+
+    @property
+    def lookup(self) -> AirportLookup:
+        if self._lookup is None:
+            self._lookup = AirportLookup(self.airports)
+        return self._lookup
+
+    def airport_by_id(self, airport_id: int) -> AirportRecord | None:
+        position = self.lookup.position_of_id(airport_id)
+        return None if position is None else self.airports[position]
+
+    def airport_by_icao(self, icao: str) -> AirportRecord | None:
+        position = self.lookup.position_of_icao(icao)
+        return None if position is None else self.airports[position]
+
+    def icao_index(self, icao: str) -> int | None:
+        """
+        Return the index (into self.airports) of the airport with an ICAO code, or None if there is none
+        """
+        return self.lookup.position_of_icao(icao)
+
+    def search(self, prefix: str, limit: int) -> list[AirportRecord]:
+        """
+        Return up to `limit` airports with an ICAO code, or a word of their name, starting with prefix
+        (see lookup.py)
+        """
+        return self.airports.records(self.lookup.search(prefix, limit))
+
+    def distance_matrix(
+        self,
+        origins: Sequence[int | Coordinates],
+        destinations: Sequence[int | Coordinates],
+    ) -> np.ndarray:
+        """
+        Return the haversine distance in kilometres from every origin to every destination, as an
+        (origins x destinations) matrix. Each point is either an airport index (into self.airports) or
+        a pair of coordinates. The matrix is calculated in chunks of rows, to bound the memory used
+        alongside it.
+        """
+        origin_longitudes, origin_latitudes = self._point_radians(origins)
+        longitudes, latitudes = self._point_radians(destinations)
+        cos_latitudes = np.cos(latitudes)
+        matrix = np.empty((len(origins), len(destinations)), dtype=np.float64)
+        chunk_size = max(1, BATCH_CHUNK_ELEMENTS // max(len(destinations), 1))
+
+        for start in range(0, len(origins), chunk_size):
+            stop = start + chunk_size
+            longitude = origin_longitudes[start:stop, np.newaxis]
+            latitude = origin_latitudes[start:stop, np.newaxis]
+            a = np.sin((latitudes - latitude) / 2) ** 2 + cos_latitudes * np.cos(
+                latitude
+            ) * (np.sin((longitudes - longitude) / 2) ** 2)
+            matrix[start:stop] = (
+                2 * RADIUS_EARTH_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+            )
+
+        return matrix
+
+    def _point_radians(
+        self, points: Sequence[int | Coordinates]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        longitudes = np.empty(len(points), dtype=np.float64)
+        latitudes = np.empty(len(points), dtype=np.float64)
+        for position, point in enumerate(points):
+            if isinstance(point, Coordinates):
+                longitudes[position] = point.longitude_radians
+                latitudes[position] = point.latitude_radians
+            else:
+                longitudes[position] = self.longitude_radians[point]
+                latitudes[position] = self.latitude_radians[point]
+        return longitudes, latitudes
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return a summary of the engine, reported by GET /engine
+        """
+        return {
+            "engine": type(self).__name__,
+            "airport_count": len(self),
+            "snapshot_version": self.snapshot_version,
+            "distance_model": "ellipsoidal" if self.ellipsoidal else "haversine",
+            "store": {
+                "float32": self.airports.float32,
+                "memory_bytes": self.airports.nbytes,
+            },
+        }
+
+    @abstractmethod
+    def nearest(self, coordinates: Coordinates) -> tuple[AirportRecord, float]:
+        """
+        Return the nearest airport, and corresponding distance in kilometres, to a pair of input coordinates
+        """
+
+    @abstractmethod
+    def nearest_many(
+        self, longitudes: np.ndarray, latitudes: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the index of the nearest airport (into self.airports), and the corresponding distance in
+        kilometres, for each point in a batch of coordinates (radians), in input order
+        """
+
+    def nearest_airport(self, coordinates: Coordinates) -> tuple[AirportRecord, float]:
+        """
+        Return the nearest airport, and corresponding distance in kilometres, to a pair of input coordinates
+        by the engine's distance model - haversine, or WGS-84 if the engine is ellipsoidal
+        """
+        if not self.ellipsoidal:
+            return self.nearest(coordinates)
+        indices, distances = self.ellipsoidal_nearest_many(
+            np.array([coordinates.longitude_radians]),
+            np.array([coordinates.latitude_radians]),
+        )
+        return self.airports[indices[0]], float(distances[0])
+
+    def nearest_airports(
+        self, longitudes: np.ndarray, latitudes: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Batch version of nearest_airport, returning airport indices and distances as nearest_many does
+        """
+        if not self.ellipsoidal:
+            return self.nearest_many(longitudes, latitudes)
+        return self.ellipsoidal_nearest_many(longitudes, latitudes)
+
+    def ellipsoidal_nearest_many(
+        self, longitudes: np.ndarray, latitudes: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the index of the nearest airport by WGS-84 geodesic distance, and that distance in kilometres,
+        for each point in a batch of coordinates (radians). The haversine nearest airport (from the engine's
+        own nearest_many) bounds the geodesic distance to the nearest airport, so only the airports within
+        that bound, scaled by ELLIPSOIDAL_RATIO_BOUNDS, are candidates - usually one or two - and the exact
+        distance is calculated for those alone. Ties are broken by the lowest index, as nearest_many does.
+        """
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        if len(longitudes) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+
+        _, spherical_distances = self.nearest_many(longitudes, latitudes)
+        low, high = ELLIPSOIDAL_RATIO_BOUNDS
+        candidate_lists = self.tree.query_radius(
+            np.column_stack((latitudes, longitudes)),
+            r=spherical_distances * (high / low) / RADIUS_EARTH_KM + 1e-9,
+        )
+        counts = np.fromiter(map(len, candidate_lists), dtype=np.int64)
+        group_starts = np.cumsum(counts) - counts
+        point_of = np.repeat(np.arange(len(longitudes)), counts)
+        candidates = np.concatenate(candidate_lists).astype(np.intp)
+
+        distances = _calculate_vincenty_distance(
+            longitudes[point_of],
+            latitudes[point_of],
+            self.longitude_radians[candidates],
+            self.latitude_radians[candidates],
+        )
+        # Vincenty's formulae only fail to converge for nearly antipodal points, far from any nearest airport
+        #   unless the dataset is tiny - the spherical distance is used for those
+        unconverged = np.isnan(distances)
+        if unconverged.any():
+            distances[unconverged] = _calculate_haversine_distance(
+                longitudes[point_of][unconverged],
+                latitudes[point_of][unconverged],
+                self.longitude_radians[candidates][unconverged],
+                self.latitude_radians[candidates][unconverged],
+            )
+
+        nearest_distances = np.minimum.reduceat(distances, group_starts)
+        indices = np.minimum.reduceat(
+            np.where(distances == nearest_distances[point_of], candidates, len(self)),
+            group_starts,
+        )
+        return indices, nearest_distances
+
+    def k_nearest(
+        self, coordinates: Coordinates, k: int
+    ) -> list[tuple[AirportRecord, float]]:
+        """
+        Return the k nearest airports to a pair of input coordinates, with their distances in kilometres,
+        sorted by distance
+        """
+        k = min(k, len(self))
+        if not k:
+            return []
+        distances, indices = self.tree.query(
+            [[coordinates.latitude_radians, coordinates.longitude_radians]], k=k
+        )
+        return self._results(indices[0], distances[0] * RADIUS_EARTH_KM)
+
+    def within_radius(
+        self, coordinates: Coordinates, radius_km: float, limit: int | None = None
+    ) -> list[tuple[AirportRecord, float]]:
+        """
+        Return the airports within radius_km of a pair of input coordinates, with their distances in
+        kilometres, sorted by distance and truncated to the nearest `limit` airports
+        """
+        indices, distances = self.tree.query_radius(
+            [[coordinates.latitude_radians, coordinates.longitude_radians]],
+            r=radius_km / RADIUS_EARTH_KM,
+            return_distance=True,
+            sort_results=True,
+        )
+        return self._results(indices[0][:limit], distances[0][:limit] * RADIUS_EARTH_KM)
+
+    def page(
+        self,
+        after_id: int | None,
+        limit: int,
+        bbox: tuple[float, float, float, float] | None = None,
+    ) -> tuple[list[AirportRecord], int | None]:
+        """
+        Return up to `limit` airports, ordered by id, with an id greater than after_id and (optionally)
+        within a bounding box of (min longitude, min latitude, max longitude, max latitude) in degrees.
+        A bounding box with min longitude greater than max longitude crosses the antimeridian. Also returns
+        the cursor (last id) for the next page, or None if this is the last page.
+        """
+        if bbox is None:
+            start = (
+                0
+                if after_id is None
+                else np.searchsorted(self.sorted_ids, after_id, "right")
+            )
+            indices = self.id_order[start : start + limit + 1]
+        else:
+            min_longitude, min_latitude, max_longitude, max_latitude = deg2rad(bbox)
+            start = np.searchsorted(self.sorted_latitude_radians, min_latitude, "left")
+            stop = np.searchsorted(self.sorted_latitude_radians, max_latitude, "right")
+            candidates = self.latitude_order[start:stop]
+            longitudes = self.longitude_radians[candidates]
+            if min_longitude <= max_longitude:
+                in_bbox = (longitudes >= min_longitude) & (longitudes <= max_longitude)
+            else:
+                in_bbox = (longitudes >= min_longitude) | (longitudes <= max_longitude)
+            candidates = candidates[in_bbox]
+            if after_id is not None:
+                candidates = candidates[self.ids[candidates] > after_id]
+            indices = candidates[np.argsort(self.ids[candidates], kind="stable")][
+                : limit + 1
+            ]
+
+        airports = self.airports.records(indices[:limit])
+        next_cursor = airports[-1].id if len(indices) > limit else None
+        return airports, next_cursor
+
+    def _results(
+        self, indices: np.ndarray, distances: np.ndarray
+    ) -> list[tuple[AirportRecord, float]]:
+        return [
+            (self.airports[index], float(distance))
+            for index, distance in zip(indices, distances)
+        ]
+
+
+def build_index(
+    ids: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray
+) -> dict[str, np.ndarray]:
+    """
+    Build the arrays an engine derives from its airports' ids and coordinates (degrees), see INDEX_ARRAYS
+    """
+    latitude_radians = deg2rad(latitudes)
+    id_order = np.argsort(ids, kind="stable")
+    latitude_order = np.argsort(latitude_radians, kind="stable")
+    return {
+        "latitude_radians": latitude_radians,
+        "longitude_radians": deg2rad(longitudes),
+        "cos_latitude": np.cos(latitude_radians),
+        "id_order": id_order,
+        "sorted_ids": ids[id_order],
+        "latitude_order": latitude_order,
+        "sorted_latitude_radians": latitude_radians[latitude_order],
+    }
+
+
 # =======================================
 #  Nearest airport- brute force approach
 # =======================================
 
+# Upper bound on the number of elements in the (points x airports) distance matrix built per batch chunk
+BATCH_CHUNK_ELEMENTS = 4_000_000
+
+
+class BruteForceEngine(NearestAirportEngine):
+    """
+    Calculates the distance to every airport in a single vectorised pass per query. Batches are
+    calculated as a (points x airports) distance matrix, in chunks to bound memory use.
+    """
+
+    def distances(self, longitude: float, latitude: float) -> np.ndarray:
+        """
+        Return the haversine distance in kilometres from a point (radians) to every airport, in the order
+        the airports were loaded
+        """
+        dlon = self.longitude_radians - longitude
+        dlat = self.latitude_radians - latitude
+        a = np.sin(dlat / 2) ** 2 + self.cos_latitude * np.cos(latitude) * (
+            np.sin(dlon / 2) ** 2
+        )
+        return 2 * RADIUS_EARTH_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+    def nearest(self, coordinates: Coordinates) -> tuple[AirportRecord, float]:
+        distances = self.distances(
+            coordinates.longitude_radians, coordinates.latitude_radians
+        )
+        nearest_airport_index = int(np.argmin(distances))
+        return (
+            self.airports[nearest_airport_index],
+            float(distances[nearest_airport_index]),
+        )
+
+    def nearest_many(
+        self, longitudes: np.ndarray, latitudes: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        indices = np.empty(len(longitudes), dtype=np.intp)
+        distances = np.empty(len(longitudes), dtype=np.float64)
+        chunk_size = max(1, BATCH_CHUNK_ELEMENTS // max(len(self), 1))
+
+        for start in range(0, len(longitudes), chunk_size):
+            stop = start + chunk_size
+            longitude = np.asarray(longitudes[start:stop])[:, np.newaxis]
+            latitude = np.asarray(latitudes[start:stop])[:, np.newaxis]
+            dlon = self.longitude_radians - longitude
+            dlat = self.latitude_radians - latitude
+            a = np.sin(dlat / 2) ** 2 + self.cos_latitude * np.cos(latitude) * (
+                np.sin(dlon / 2) ** 2
+            )
+            nearest_airport_indices = np.argmin(a, axis=1)
+            nearest_a = np.take_along_axis(
+                a, nearest_airport_indices[:, np.newaxis], axis=1
+            )[:, 0]
+            indices[start:stop] = nearest_airport_indices
+            distances[start:stop] = (
+                2 * RADIUS_EARTH_KM * np.arcsin(np.sqrt(np.clip(nearest_a, 0, 1)))
+            )
+
+        return indices, distances
+
 
 def find_nearest_airport(
-    airports: pd.DataFrame, coordinates: Coordinates
-) -> tuple[Airport, float]:
+    airports: Mapping[str, Any], coordinates: Coordinates
+) -> tuple[AirportRecord, float]:
     """
     Return the geospatially nearest airport, and corresponding distance, to a pair of input coordinates
     from a dataset containing airport locations. 'Nearest' is defined 'as the crow flies', following
     the curvature of the Earth.
+
+    Builds a throwaway engine, so is only suitable for one-off queries - the API holds a single engine
+    built at startup (see BruteForceEngine).
     """
-    _convert_degrees_to_radians(airports)
-    _add_haversine_distance(
-        airports, coordinates.longitude_radians, coordinates.latitude_radians
-    )
+    return BruteForceEngine(airports).nearest(coordinates)
 
-    nearest_airport_index = airports["distance_to_point"].idxmin()
-    nearest_airport = airports.iloc[nearest_airport_index]
 
-    return (
-        Airport(**nearest_airport.to_dict()),
-        nearest_airport.distance_to_point,
-    )
+def _calculate_haversine_distance(
+    lon1: float | np.ndarray,
+    lat1: float | np.ndarray,
+    lon2: float | np.ndarray,
+    lat2: float | np.ndarray,
+) -> float | np.ndarray:
+    """
+    Calculate the great-circle distance in kilometres between two points on the Earth (radians) using the
+    haversine formula. Accepts scalars or NumPy arrays, which are broadcast against each other.
+    """
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * RADIUS_EARTH_KM * np.arcsin(np.sqrt(a))
 
 
-def _convert_degrees_to_radians(airports: pd.DataFrame) -> None:
+def _calculate_vincenty_distance(
+    lon1: float | np.ndarray,
+    lat1: float | np.ndarray,
+    lon2: float | np.ndarray,
+    lat2: float | np.ndarray,
+    tolerance: float = 1e-12,
+    max_iterations: int = 200,
+) -> np.ndarray:
     """
-    Add two new columns to the airports dataset with the longitude and latitude in radians
+    Calculate the geodesic distance in kilometres between two points on the WGS-84 ellipsoid (radians, as
+    geodetic latitude and longitude) using Vincenty's inverse formula, accurate to within a millimetre.
+    Accepts scalars or NumPy arrays, which are broadcast against each other, and iterates until every pair
+    has converged. Returns NaN for pairs which do not converge, which only happens for nearly antipodal
+    points.
     """
-    airports["latitude_radians"] = deg2rad(airports["latitude"])
-    airports["longitude_radians"] = deg2rad(airports["longitude"])
+    lon1, lat1, lon2, lat2 = np.broadcast_arrays(
+        *(np.asarray(value, dtype=np.float64) for value in (lon1, lat1, lon2, lat2))
+    )
+    f = WGS84_FLATTENING
+    reduced_lat1 = np.arctan((1 - f) * np.tan(lat1))
+    reduced_lat2 = np.arctan((1 - f) * np.tan(lat2))
+    sin_u1, cos_u1 = np.sin(reduced_lat1), np.cos(reduced_lat1)
+    sin_u2, cos_u2 = np.sin(reduced_lat2), np.cos(reduced_lat2)
+    dlon = lon2 - lon1
 
+    lam = dlon
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for _ in range(max_iterations):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(
+                cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam
+            )
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            # Coincident points have sin_sigma = 0, and points on the equator cos2_alpha = 0
+            sin_alpha = np.where(
+                sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma
+            )
+            cos2_alpha = 1 - sin_alpha**2
+            cos_2sigma_m = np.where(
+                cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha
+            )
+            c = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            previous_lam = lam
+            lam = dlon + (1 - c) * f * sin_alpha * (
+                sigma
+                + c
+                * sin_sigma
+                * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m**2))
+            )
+            converged = np.abs(lam - previous_lam) <= tolerance
+            if converged.all():
+                break
 
-def _add_haversine_distance(
-    airports: pd.DataFrame,
-    longitude: float,
-    latitude: float,
-) -> None:
+    a, b = WGS84_SEMI_MAJOR_AXIS_KM, WGS84_SEMI_MINOR_AXIS_KM
+    u2 = cos2_alpha * (a**2 - b**2) / b**2
+    big_a = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    big_b = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = (
+        big_b
+        * sin_sigma
+        * (
+            cos_2sigma_m
+            + big_b
+            / 4
+            * (
+                cos_sigma * (-1 + 2 * cos_2sigma_m**2)
+                - big_b
+                / 6
+                * cos_2sigma_m
+                * (-3 + 4 * sin_sigma**2)
+                * (-3 + 4 * cos_2sigma_m**2)
+            )
+        )
+    )
+    return np.where(converged, b * big_a * (sigma - delta_sigma), np.nan)
+
+
+# =======================================
+#  Nearest airport- ball tree approach
+# =======================================
+
+
+class BallTreeEngine(NearestAirportEngine):
     """
-    Add a column to the airports dataframe with the distance from each airport to the input coordinates using
-    the haversine formula
+    Answers nearest airport queries from the engine's ball tree, so that each query only visits O(log n)
+    airports.
     """
-    airports["distance_to_point"] = airports.apply(
-        lambda df: _calculate_haversine_distance(
-            df["longitude_radians"], df["latitude_radians"], longitude, latitude
-        ),
-        axis=1,
-    )
 
+    def nearest(self, coordinates: Coordinates) -> tuple[AirportRecord, float]:
+        distances, indices = self.tree.query(
+            [[coordinates.latitude_radians, coordinates.longitude_radians]], k=1
+        )
+        return (
+            self.airports[int(indices[0, 0])],
+            float(distances[0, 0]) * RADIUS_EARTH_KM,
+        )
 
-def _calculate_haversine_distance(
-    lon1: float, lat1: float, lon2: float, lat2: float
-) -> float:
+    def nearest_many(
+        self, longitudes: np.ndarray, latitudes: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if len(longitudes) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+        distances, indices = self.tree.query(
+            np.column_stack((latitudes, longitudes)), k=1
+        )
+        return indices[:, 0], distances[:, 0] * RADIUS_EARTH_KM
+
+
+# =======================================
+#  Nearest airport- lookup grid approach
+# =======================================
+
+
+class GridEngine(NearestAirportEngine):
     """
-    Calculate the great-circle distance in kilometres between two points on the Earth (radians) using the
-    haversine formula.
+    Answers nearest airport queries from a lookup grid of latitude/longitude cells, precomputed over the
+    airports' bounding box (plus one cell). Each cell holds the airports which could be nearest to some point
+    in it: with c the cell's centre, r a bound on the distance from c to any point p in the cell and d_min
+    the distance from c to its nearest airport, the airport nearest to p is within d_min + 2r of c. A query
+    then only calculates the distance to its cell's candidates - a single airport for most cells, or a
+    handful for cells which straddle a boundary between airports - and the answer stays exact. Points
+    outside the grid are answered from the ball tree.
+
+    Candidate lists are held in CSR form: cell i's candidates are candidates[offsets[i] : offsets[i + 1]].
     """
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    return 2 * RADIUS_EARTH_KM * asin(sqrt(a))
+
+    def __init__(
+        self, airports: Mapping[str, Any], resolution_degrees: float = 0.1, **kwargs
+    ):
+        super().__init__(airports, **kwargs)
+        start = time.perf_counter()
+        self.resolution_degrees = resolution_degrees
+        self.resolution_radians = math.radians(resolution_degrees)
+
+        if len(self):
+            min_latitude = max(
+                -90.0,
+                (math.floor(self.latitudes.min() / resolution_degrees) - 1)
+                * resolution_degrees,
+            )
+            min_longitude = max(
+                -180.0,
+                (math.floor(self.longitudes.min() / resolution_degrees) - 1)
+                * resolution_degrees,
+            )
+            max_latitude = min(
+                90.0,
+                (math.floor(self.latitudes.max() / resolution_degrees) + 2)
+                * resolution_degrees,
+            )
+            max_longitude = min(
+                180.0,
+                (math.floor(self.longitudes.max() / resolution_degrees) + 2)
+                * resolution_degrees,
+            )
+        else:
+            min_latitude = min_longitude = max_latitude = max_longitude = 0.0
+        self.min_latitude_radians = math.radians(min_latitude)
+        self.min_longitude_radians = math.radians(min_longitude)
+        self.latitude_cells = math.ceil(
+            (max_latitude - min_latitude) / resolution_degrees - 1e-9
+        )
+        self.longitude_cells = math.ceil(
+            (max_longitude - min_longitude) / resolution_degrees - 1e-9
+        )
+
+        self.offsets, self.candidates = self._build_grid()
+        self.max_candidates = int(np.diff(self.offsets).max(initial=0))
+        self.build_seconds = time.perf_counter() - start
+
+    def _build_grid(self) -> tuple[np.ndarray, np.ndarray]:
+        if not self.latitude_cells or not self.longitude_cells:
+            return np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32)
+
+        half_cell = self.resolution_radians / 2
+        latitude_centres = (
+            self.min_latitude_radians
+            + (np.arange(self.latitude_cells) + 0.5) * self.resolution_radians
+        )
+        longitude_centres = (
+            self.min_longitude_radians
+            + (np.arange(self.longitude_cells) + 0.5) * self.resolution_radians
+        )
+        # Travelling from the centre along a meridian, then along the point's parallel, bounds the distance
+        # to any point in a cell by half a cell of latitude plus half a cell of longitude at the cell edge
+        # nearest the equator
+        edge_cos_latitude = np.cos(
+            np.clip(np.abs(latitude_centres) - half_cell, 0, np.pi / 2)
+        )
+        cell_radii = half_cell * (1 + edge_cos_latitude)
+
+        centres = np.column_stack(
+            (
+                np.repeat(
+                    np.clip(latitude_centres, -np.pi / 2, np.pi / 2),
+                    len(longitude_centres),
+                ),
+                np.tile(longitude_centres, len(latitude_centres)),
+            )
+        )
+        cell_radii = np.repeat(cell_radii, len(longitude_centres))
+        nearest_distances, _ = self.tree.query(centres, k=1)
+        candidate_lists = self.tree.query_radius(
+            centres, r=nearest_distances[:, 0] + 2 * cell_radii + 1e-9
+        )
+
+        counts = np.fromiter(
+            (len(candidates) for candidates in candidate_lists),
+            dtype=np.int64,
+            count=len(candidate_lists),
+        )
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        candidates = np.concatenate(candidate_lists).astype(np.int32)
+        # Each cell's candidates in ascending airport index order, so that ties are broken as the brute
+        # force engine breaks them
+        candidates = candidates[
+            np.lexsort((candidates, np.repeat(np.arange(len(counts)), counts)))
+        ]
+        return offsets, candidates
+
+    def cells(self, longitudes: np.ndarray, latitudes: np.ndarray) -> np.ndarray:
+        """
+        Return the grid cell of each point (radians), or -1 for points outside the grid
+        """
+        rows = np.floor(
+            (latitudes - self.min_latitude_radians) / self.resolution_radians
+        ).astype(np.int64)
+        columns = np.floor(
+            (longitudes - self.min_longitude_radians) / self.resolution_radians
+        ).astype(np.int64)
+        inside = (
+            (rows >= 0)
+            & (rows < self.latitude_cells)
+            & (columns >= 0)
+            & (columns < self.longitude_cells)
+        )
+        return np.where(inside, rows * self.longitude_cells + columns, -1)
+
+    def nearest(self, coordinates: Coordinates) -> tuple[AirportRecord, float]:
+        longitude = coordinates.longitude_radians
+        latitude = coordinates.latitude_radians
+        row = math.floor(
+            (latitude - self.min_latitude_radians) / self.resolution_radians
+        )
+        column = math.floor(
+            (longitude - self.min_longitude_radians) / self.resolution_radians
+        )
+        if not (0 <= row < self.latitude_cells and 0 <= column < self.longitude_cells):
+            distances, indices = self.tree.query([[latitude, longitude]], k=1)
+            return (
+                self.airports[int(indices[0, 0])],
+                float(distances[0, 0]) * RADIUS_EARTH_KM,
+            )
+
+        cell = row * self.longitude_cells + column
+        candidates = self.candidates[self.offsets[cell] : self.offsets[cell + 1]]
+        a = np.sin((self.latitude_radians[candidates] - latitude) / 2) ** 2 + (
+            self.cos_latitude[candidates]
+            * np.cos(latitude)
+            * np.sin((self.longitude_radians[candidates] - longitude) / 2) ** 2
+        )
+        nearest = int(np.argmin(a))
+        return (
+            self.airports[candidates[nearest]],
+            float(2 * RADIUS_EARTH_KM * np.arcsin(np.sqrt(np.clip(a[nearest], 0, 1)))),
+        )
+
+    def nearest_many(
+        self, longitudes: np.ndarray, latitudes: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        indices = np.empty(len(longitudes), dtype=np.intp)
+        distances = np.empty(len(longitudes), dtype=np.float64)
+        cells = self.cells(longitudes, latitudes)
+
+        outside = np.flatnonzero(cells < 0)
+        if len(outside):
+            tree_distances, tree_indices = self.tree.query(
+                np.column_stack((latitudes[outside], longitudes[outside])), k=1
+            )
+            indices[outside] = tree_indices[:, 0]
+            distances[outside] = tree_distances[:, 0] * RADIUS_EARTH_KM
+
+        inside = np.flatnonzero(cells >= 0)
+        chunk_size = max(1, BATCH_CHUNK_ELEMENTS // max(self.max_candidates, 1))
+        for start in range(0, len(inside), chunk_size):
+            points = inside[start : start + chunk_size]
+            cell_starts = self.offsets[cells[points]]
+            counts = self.offsets[cells[points] + 1] - cell_starts
+            group_starts = np.cumsum(counts) - counts
+            point_of = np.repeat(np.arange(len(points)), counts)
+            candidates = self.candidates[
+                cell_starts[point_of]
+                + np.arange(len(point_of))
+                - group_starts[point_of]
+            ]
+
+            longitude = longitudes[points][point_of]
+            latitude = latitudes[points][point_of]
+            a = np.sin((self.latitude_radians[candidates] - latitude) / 2) ** 2 + (
+                self.cos_latitude[candidates]
+                * np.cos(latitude)
+                * np.sin((self.longitude_radians[candidates] - longitude) / 2) ** 2
+            )
+            # The lowest index among each point's nearest candidates, as the brute force engine breaks ties
+            nearest_a = np.minimum.reduceat(a, group_starts)
+            indices[points] = np.minimum.reduceat(
+                np.where(a == nearest_a[point_of], candidates, len(self)), group_starts
+            )
+            distances[points] = (
+                2 * RADIUS_EARTH_KM * np.arcsin(np.sqrt(np.clip(nearest_a, 0, 1)))
+            )
+
+        return indices, distances
+
+    def stats(self) -> dict[str, Any]:
+        counts = np.diff(self.offsets)
+        return {
+            **super().stats(),
+            "grid": {
+                "resolution_degrees": self.resolution_degrees,
+                "cells": len(counts),
+                "build_seconds": self.build_seconds,
+                "memory_bytes": self.offsets.nbytes + self.candidates.nbytes,
+                "mean_candidates": float(counts.mean()) if len(counts) else 0.0,
+                "max_candidates": self.max_candidates,
+                "single_candidate_cells": int(np.count_nonzero(counts == 1)),
+            },
+        }
 
 
 # =======================================
-#  Nearest airport- ball tree approach
+#  Engine selection
 # =======================================
 
+ENGINES = {
+    "brute_force": BruteForceEngine,
+    "balltree": BallTreeEngine,
+    "grid": GridEngine,
+}
 
-# TODO: not yet implemented correctly, API is relying on brute force approach for now
-def find_nearest_airport_balltree(airports: pd.DataFrame, coordinates: Coordinates):
-    airport_locations = airports[["latitude", "longitude"]].values
-    airport_locations_radians = deg2rad(airport_locations)
-    tree = BallTree(airport_locations_radians, leaf_size=15, metric="haversine")
-    random_geo = np.random.normal(
-        loc=(coordinates.longitude_degrees, coordinates.latitude_degrees),
-        scale=(0.1, 0.1),
-        size=(10000, 2),
-    )
-    random_geo_radians = np.radians(random_geo)
-    distances, idx = tree.query(random_geo_radians, k=1)
 
-    nearest = airports.name[idx[:, 0]]
+def build_engine(
+    airports: AirportStore | Mapping[str, Any], engine_name: str, **kwargs
+) -> NearestAirportEngine:
+    """
+    Build the nearest airport engine registered under engine_name (see ENGINES) from an airport store, or a
+    mapping of airport columns.
+    Keyword arguments are passed on to the engine (see NearestAirportEngine).
+    """
+    if engine_name not in ENGINES:
+        raise ValueError(
+            f"Unknown nearest airport engine '{engine_name}', expected one of {list(ENGINES)}"
+        )
+    return ENGINES[engine_name](airports, **kwargs)
@@ -0,0 +1,172 @@
+"""
+Prebuilt airport snapshots, used to start the API without reading the airports table or building the
+nearest airport engine's index, and to share one copy of the engine's arrays between worker processes.
+
+A snapshot directory holds numbered versions, and a `current` symlink pointing at the latest:
+
+    snapshots/
+    ├── current -> v2
+    ├── v1/
+    └── v2/
+        ├── manifest.json
+        ├── id.npy, name.npy, icao.npy, latitude.npy, longitude.npy
+        ├── latitude_radians.npy, ... (see services.INDEX_ARRAYS)
+        └── tree_0.npy, ..., tree.pkl
+
+Each version is a set of uncompressed .npy files, which workers open as read-only memory maps - every
+worker on a host then shares one physical copy of the arrays through the page cache, including the ball
+tree's, which is rebuilt around its memory-mapped arrays on first use. A new version is written alongside
+the old and published by atomically replacing the `current` symlink, so a worker never loads a partially
+written version. Workers which have already loaded a version keep using it until they load the snapshot
+again.
+
+Snapshots are written by a build step (python -m app.snapshot) and must only be loaded from trusted
+paths, as the ball tree's metric is unpickled.
+"""
+
+import json
+import os
+import pickle
+import shutil
+from collections.abc import Callable
+
+import numpy as np
+
+from app.core.services import (
+    AIRPORT_FIELDS,
+    INDEX_ARRAYS,
+    NearestAirportEngine,
+    build_engine,
+)
+
+SNAPSHOT_FORMAT_VERSION = 2
+CURRENT_LINK = "current"
+
+
+def write_snapshot(engine: NearestAirportEngine, directory: str, keep: int = 2) -> int:
+    """
+    Write an engine's airports, index and ball tree as a new snapshot version, publish it as the current
+    version and return its number. All but the newest `keep` versions are then removed - workers that have
+    already mapped a removed version keep their mapping until they exit.
+    """
+    import sklearn
+
+    os.makedirs(directory, exist_ok=True)
+    version = max(snapshot_versions(directory), default=0) + 1
+    version_name = f"v{version}"
+    staging = os.path.join(directory, f".{version_name}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    arrays = {
+        "id": engine.ids,
+        "name": np.array(engine.airports.names, dtype=str),
+        "icao": np.array(engine.airports.icaos, dtype=str),
+        "latitude": engine.latitudes,
+        "longitude": engine.longitudes,
+    }
+    arrays.update({name: getattr(engine, name) for name in INDEX_ARRAYS})
+
+    tree_state = list(engine.tree.__getstate__())
+    tree_arrays = [
+        i for i, item in enumerate(tree_state) if isinstance(item, np.ndarray)
+    ]
+    for i in tree_arrays:
+        arrays[f"tree_{i}"] = tree_state[i]
+        tree_state[i] = None
+
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+    with open(os.path.join(staging, "tree.pkl"), "wb") as file:
+        pickle.dump(tree_state, file, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(os.path.join(staging, "manifest.json"), "w") as file:
+        json.dump(
+            {
+                "format_version": SNAPSHOT_FORMAT_VERSION,
+                "version": version,
+                "airport_count": len(engine),
+                "tree_arrays": tree_arrays,
+                "sklearn_version": sklearn.__version__,
+            },
+            file,
+        )
+
+    os.rename(staging, os.path.join(directory, version_name))
+    link = os.path.join(directory, f".{CURRENT_LINK}.tmp")
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(version_name, link)
+    os.replace(link, os.path.join(directory, CURRENT_LINK))
+
+    for old_version in snapshot_versions(directory)[:-keep]:
+        shutil.rmtree(os.path.join(directory, f"v{old_version}"))
+    return version
+
+
+def snapshot_versions(directory: str) -> list[int]:
+    """
+    Return the snapshot versions written to a snapshot directory, oldest first
+    """
+    return sorted(
+        int(name[1:])
+        for name in os.listdir(directory)
+        if name.startswith("v") and name[1:].isdigit()
+    )
+
+
+def current_version(directory: str) -> int:
+    """
+    Return the snapshot version currently published in a snapshot directory
+    """
+    return int(os.readlink(os.path.join(directory, CURRENT_LINK))[1:])
+
+
+def load_engine(directory: str, engine_name: str, **kwargs) -> NearestAirportEngine:
+    """
+    Build the nearest airport engine registered under engine_name from the current version of a snapshot
+    directory, memory-mapping its arrays. Keyword arguments are passed on to the engine, and its
+    snapshot_version is set to the version loaded.
+    """
+    path = os.path.join(directory, f"v{current_version(directory)}")
+    with open(os.path.join(path, "manifest.json")) as file:
+        manifest = json.load(file)
+    if manifest["format_version"] != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported airport snapshot format {manifest['format_version']}, "
+            f"expected {SNAPSHOT_FORMAT_VERSION}"
+        )
+
+    def load(name: str) -> np.ndarray:
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+    engine = build_engine(
+        {field: load(field) for field in AIRPORT_FIELDS},
+        engine_name,
+        index={name: load(name) for name in INDEX_ARRAYS},
+        tree_loader=_tree_loader(path, manifest, load),
+        **kwargs,
+    )
+    engine.snapshot_version = manifest["version"]
+    return engine
+
+
+def _tree_loader(
+    path: str, manifest: dict, load: Callable[[str], np.ndarray]
+) -> Callable:
+    def load_tree():
+        import sklearn
+        from sklearn.neighbors import BallTree
+
+        # The layout of a tree's state is private to scikit-learn, so a tree written by another version is
+        # rebuilt by the engine rather than trusted
+        if manifest["sklearn_version"] != sklearn.__version__:
+            return None
+        with open(os.path.join(path, "tree.pkl"), "rb") as file:
+            tree_state = pickle.load(file)
+        for i in manifest["tree_arrays"]:
+            tree_state[i] = load(f"tree_{i}")
+        tree = BallTree.__new__(BallTree)
+        tree.__setstate__(tuple(tree_state))
+        return tree
+
+    return load_tree
@@ -0,0 +1,159 @@
+"""
+Compact, immutable in-memory airport store, held by the nearest airport engine. Airports are stored as a
+struct of arrays - contiguous typed arrays for ids and coordinates, and tuples of interned strings for names
+and ICAO codes - rather than an object per airport, so memory use grows by a few dozen bytes per airport
+and building the store allocates a handful of objects whatever the size of the dataset.
+
+Coordinates are float64 by default. With float32=True they are held as float32, halving their memory use
+at a precision of about a metre, and records report the shortest decimal which round trips through
+float32 - the value loaded, for coordinates given to 6 or 7 significant figures.
+
+Indexing the store builds an AirportRecord, a small __slots__ object with the same fields as
+schemas.Airport, so that records are only created for the airports a query actually returns.
+"""
+
+import functools
+import sys
+from collections.abc import Iterator, Mapping, Sequence
+from typing import Any
+
+import numpy as np
+
+AIRPORT_FIELDS = ("id", "name", "icao", "latitude", "longitude")
+
+
+class AirportRecord:
+    """
+    A single airport, built from the store on demand. Has the same fields as schemas.Airport, iterates as
+    (field, value) pairs like a pydantic model and compares equal to an Airport with the same values.
+    """
+
+    __slots__ = AIRPORT_FIELDS
+
+    def __init__(
+        self, id: int, name: str, icao: str, latitude: float, longitude: float
+    ):
+        self.id = id
+        self.name = name
+        self.icao = icao
+        self.latitude = latitude
+        self.longitude = longitude
+
+    def __iter__(self) -> Iterator[tuple[str, Any]]:
+        for field in AIRPORT_FIELDS:
+            yield field, getattr(self, field)
+
+    def dict(self) -> dict[str, Any]:
+        return dict(self)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Mapping):
+            return dict(self) == other
+        if all(hasattr(other, field) for field in AIRPORT_FIELDS):
+            return all(
+                getattr(self, field) == getattr(other, field)
+                for field in AIRPORT_FIELDS
+            )
+        return NotImplemented
+
+    __hash__ = None  # mutable, like schemas.Airport
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{field}={value!r}" for field, value in self)
+        return f"AirportRecord({fields})"
+
+
+class AirportStore:
+    """
+    Immutable struct-of-arrays store of airports, in load order. Arrays are read-only, and memory-mapped
+    arrays (from a snapshot) are used as they are when they already have the store's types.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[int],
+        names: Sequence[str],
+        icaos: Sequence[str],
+        latitudes: Sequence[float],
+        longitudes: Sequence[float],
+        float32: bool = False,
+    ):
+        coordinate_type = np.float32 if float32 else np.float64
+        self.float32 = float32
+        self.ids = _read_only(np.asarray(ids, dtype=np.int64))
+        self.latitudes = _read_only(np.asarray(latitudes, dtype=coordinate_type))
+        self.longitudes = _read_only(np.asarray(longitudes, dtype=coordinate_type))
+        self.names = _interned(names)
+        self.icaos = _interned(icaos)
+        if not (
+            len(self.ids)
+            == len(self.names)
+            == len(self.icaos)
+            == len(self.latitudes)
+            == len(self.longitudes)
+        ):
+            raise ValueError("Airport columns must all have the same length")
+
+    @classmethod
+    def from_columns(
+        cls, columns: Mapping[str, Any], float32: bool = False
+    ) -> "AirportStore":
+        """
+        Build a store from a mapping of column name to column (see AIRPORT_FIELDS), e.g. a dataframe or the
+        arrays of a snapshot
+        """
+        return cls(
+            columns["id"],
+            columns["name"],
+            columns["icao"],
+            columns["latitude"],
+            columns["longitude"],
+            float32=float32,
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> AirportRecord:
+        return AirportRecord(
+            int(self.ids[index]),
+            self.names[index],
+            self.icaos[index],
+            self._coordinate(self.latitudes[index]),
+            self._coordinate(self.longitudes[index]),
+        )
+
+    def records(self, indices: Sequence[int]) -> list[AirportRecord]:
+        return [self[index] for index in indices]
+
+    @functools.cached_property
+    def nbytes(self) -> int:
+        """
+        Memory used by the store's arrays, and the string tuples and (shared) strings they refer to
+        """
+        strings = {id(value): value for value in (*self.names, *self.icaos)}
+        return (
+            self.ids.nbytes
+            + self.latitudes.nbytes
+            + self.longitudes.nbytes
+            + sys.getsizeof(self.names)
+            + sys.getsizeof(self.icaos)
+            + sum(map(sys.getsizeof, strings.values()))
+        )
+
+    def _coordinate(self, value: np.floating) -> float:
+        # The shortest decimal which round trips through float32, e.g. 51.4775 rather than 51.47750091552734
+        return float(str(value)) if self.float32 else float(value)
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    if array.flags.writeable:
+        array = array.view()
+        array.flags.writeable = False
+    return array
+
+
+def _interned(values: Sequence[str]) -> tuple[str, ...]:
+    if isinstance(values, np.ndarray):
+        values = values.tolist()
+    return tuple(sys.intern(str(value)) for value in values)
@@ -0,0 +1,205 @@
+"""
+Streaming pipeline for resolving very large files of coordinates to their nearest airport. Input lines are
+read from the request body as they arrive and resolved in fixed-size chunks through the nearest airport
+engine, on the compute executor, with NDJSON results sent as each chunk finishes, so memory use is bounded
+by the chunk size rather than the size of the input.
+"""
+
+import csv
+import json
+from collections.abc import AsyncIterator
+
+import numpy as np
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect, Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.core import metrics, serialization
+from app.core.executor import ComputeExecutor
+from app.core.schemas import Coordinates
+from app.core.services import NearestAirportEngine
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+STREAM_MEDIA_TYPES = (NDJSON_MEDIA_TYPE, CSV_MEDIA_TYPE)
+
+
+class NearestAirportStreamResponse(Response):
+    """
+    Raw ASGI response that reads the request body and sends NDJSON results as each chunk is resolved.
+    Starlette's StreamingResponse listens for a client disconnect by consuming request messages, which
+    would race this response for the request body, so the body stream is owned here instead and a
+    disconnect is raised by request.stream() as a ClientDisconnect. The next chunk of the body is only
+    read once the previous results have been sent, which applies the client's backpressure to the input.
+    """
+
+    media_type = NDJSON_MEDIA_TYPE
+
+    def __init__(
+        self,
+        request: Request,
+        engine: NearestAirportEngine,
+        executor: ComputeExecutor,
+        media_type: str,
+        chunk_size: int,
+    ):
+        self.status_code = 200
+        self.background = None
+        self.request = request
+        self.engine = engine
+        self.executor = executor
+        self.input_media_type = media_type
+        self.chunk_size = chunk_size
+        self.init_headers()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        try:
+            async for body in stream_nearest_airports(
+                self.request.stream(),
+                self.engine,
+                self.executor,
+                self.input_media_type,
+                self.chunk_size,
+            ):
+                await send(
+                    {"type": "http.response.body", "body": body, "more_body": True}
+                )
+        except ClientDisconnect:
+            return
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def stream_nearest_airports(
+    body: AsyncIterator[bytes],
+    engine: NearestAirportEngine,
+    executor: ComputeExecutor,
+    media_type: str,
+    chunk_size: int,
+) -> AsyncIterator[bytes]:
+    """
+    Yield NDJSON nearest airport results, one line per input record and in input order, for an NDJSON or
+    CSV (with a longitude_degrees,latitude_degrees header) stream of coordinates. Each chunk is resolved on
+    the compute executor, and encoded in a worker thread, so the event loop is free to serve other requests.
+    """
+    header = None
+    chunk: list[Coordinates | list[dict]] = []
+
+    async for line in _iter_lines(body):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            text = line.decode()
+        except UnicodeDecodeError as error:
+            chunk.append(
+                [{"loc": [], "msg": str(error), "type": "value_error.unicodedecode"}]
+            )
+            text = None
+
+        if text is None:
+            pass
+        elif media_type == CSV_MEDIA_TYPE:
+            row = next(csv.reader([text]))
+            if header is None:
+                header = row
+                continue
+            chunk.append(_parse_record(dict(zip(header, row))))
+        else:
+            try:
+                chunk.append(_parse_record(json.loads(text)))
+            except json.JSONDecodeError as error:
+                chunk.append(
+                    [{"loc": [], "msg": str(error), "type": "value_error.jsondecode"}]
+                )
+
+        if len(chunk) >= chunk_size:
+            yield await _resolve_chunk(chunk, engine, executor)
+            chunk = []
+
+    if chunk:
+        yield await _resolve_chunk(chunk, engine, executor)
+
+
+async def _iter_lines(body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Split a stream of arbitrarily sized byte chunks into lines
+    """
+    buffer = b""
+    async for data in body:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+def _parse_record(record) -> Coordinates | list[dict]:
+    """
+    Return the coordinates for a record, or its validation errors if they are invalid
+    """
+    try:
+        return Coordinates.parse_obj(record)
+    except ValidationError as error:
+        return error.errors()
+
+
+async def _resolve_chunk(
+    chunk: list[Coordinates | list[dict]],
+    engine: NearestAirportEngine,
+    executor: ComputeExecutor,
+) -> bytes:
+    """
+    Resolve a chunk of records through a single engine query and return the NDJSON encoded results
+    """
+    coordinates = [record for record in chunk if isinstance(record, Coordinates)]
+    with metrics.phase("distance"):
+        airport_indices, distances_km = await executor.run_chunked(
+            engine,
+            "nearest_airports",
+            (
+                np.array([record.longitude_radians for record in coordinates]),
+                np.array([record.latitude_radians for record in coordinates]),
+            ),
+        )
+    return await run_in_threadpool(
+        _encode_chunk, chunk, engine, airport_indices, distances_km
+    )
+
+
+def _encode_chunk(
+    chunk: list[Coordinates | list[dict]],
+    engine: NearestAirportEngine,
+    airport_indices: np.ndarray,
+    distances_km: np.ndarray,
+) -> bytes:
+    """
+    Encode a chunk's records as NDJSON lines, with the nearest airport results for its valid coordinates
+    """
+    results = iter(zip(airport_indices, distances_km))
+
+    lines = []
+    for record in chunk:
+        if isinstance(record, Coordinates):
+            airport_index, distance_km = next(results)
+            lines.append(
+                serialization.nearest_airport_result(
+                    engine.airport_json_at(airport_index),
+                    distance_km,
+                    record,
+                )
+            )
+        else:
+            lines.append(serialization.nearest_airport_error(record))
+
+    return b"\n".join(lines) + b"\n"
@@ -1,12 +1,46 @@
 """
-FastAPI extension (redis and database)
+FastAPI extension (redis, in-process cache, database, nearest airport engine, compute executor and dataset
+reloader, and secret key authentication)
 """
 
-from redis import Redis
+import hmac
 
-from app.core.database import SessionLocal
+from databases import Database
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from redis.asyncio import BlockingConnectionPool, Redis
 
-rd = Redis(host="redis", port=6379, db=0)
+from app.config import settings
+from app.core.cache import LocalCache, SerializedResponseCache, SingleFlight
+from app.core.database import SessionLocal, database
+from app.core.executor import ComputeExecutor
+from app.core.reload import DatasetReloader
+from app.core.services import NearestAirportEngine
+
+rd = Redis(
+    connection_pool=BlockingConnectionPool(
+        host="redis", port=6379, db=0, max_connections=settings.redis_max_connections
+    )
+)
+
+# In-process tier of the nearest airport cache, shared by every request handled by this worker
+local_cache = LocalCache(
+    maxsize=settings.local_cache_size, ttl_seconds=settings.local_cache_ttl_seconds
+)
+
+# Nearest airport cache misses in flight in this worker, shared by concurrent requests for the same key
+nearest_airport_flights = SingleFlight()
+
+# Thread or process pool running this worker's nearest airport engine queries off the event loop
+compute_executor = ComputeExecutor(
+    kind=settings.compute_executor,
+    workers=settings.compute_workers,
+    max_pending=settings.compute_max_pending,
+    chunk_size=settings.compute_chunk_size,
+)
+
+# Serialised GET /airports response body for the current dataset version
+airports_response_cache = SerializedResponseCache()
 
 
 def get_db():
@@ -15,3 +49,42 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_database() -> Database:
+    """
+    Return the pooled async database, connected at startup
+    """
+    return database
+
+
+def get_nearest_airport_engine(request: Request) -> NearestAirportEngine:
+    """
+    Return the nearest airport engine loaded into the app state at startup, or swapped in by the latest
+    dataset reload
+    """
+    return request.app.state.nearest_airport_engine
+
+
+def get_dataset_reloader(request: Request) -> DatasetReloader:
+    """
+    Return the app's dataset reloader (see reload.py)
+    """
+    return request.app.state.dataset_reloader
+
+
+def require_secret_key(
+    credentials: HTTPAuthorizationCredentials
+    | None = Depends(HTTPBearer(auto_error=False)),
+) -> None:
+    """
+    Require the app's secret key as a bearer token
+    """
+    if credentials is None or not hmac.compare_digest(
+        credentials.credentials.encode(), settings.secret_key.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or missing secret key",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
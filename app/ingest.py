@@ -0,0 +1,68 @@
+"""
+Command line entry point to bulk load an airport data file into the database, upserting by ICAO code:
+
+    python -m app.ingest path/to/airports.csv [--chunksize 50000]
+
+The file must have name, icao, latitude and longitude columns (or the NAME, ICAO, Latitude and Longitude
+headers of the bundled UK airport data). Once loaded, the dataset version is bumped so that every worker
+ignores nearest airport results cached for the previous data and reloads its nearest airport engine (see
+core/reload.py).
+"""
+
+import argparse
+import asyncio
+
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.core import crud
+from app.core.cache import NearestAirportCache
+from app.core.database import SessionLocal
+from app.extensions import local_cache, rd
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("filepath", help="Airport data CSV file")
+    parser.add_argument("--chunksize", type=int, default=settings.ingest_chunk_size)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        try:
+            crud.validate_airport_data(args.filepath, args.chunksize, db)
+        except ValueError as error:
+            parser.error(str(error))
+        report = crud.upsert_airport_data(db, args.filepath, args.chunksize)
+    finally:
+        db.close()
+
+    print(
+        f"Upserted {report.rows_written} of {report.rows_read} airports in "
+        f"{report.seconds:.2f}s ({report.rows_per_second:,.0f} rows/s)"
+    )
+
+    if report.rows_written:
+        asyncio.run(_invalidate_cache())
+
+
+async def _invalidate_cache():
+    cache = NearestAirportCache(
+        rd,
+        local_cache,
+        ttl_seconds=settings.cache_ttl_seconds,
+        precision=settings.cache_coordinate_precision,
+        version_check_seconds=settings.cache_version_check_seconds,
+    )
+    try:
+        dataset_version = await cache.invalidate()
+    except RedisError as error:
+        print(
+            f"Could not bump the dataset version, cached results may be stale: {error}"
+        )
+        return
+    print(f"Dataset version bumped to {dataset_version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Command line entry point to build a new version of a prebuilt airport snapshot from the airports table:
+
+    python -m app.snapshot path/to/snapshots [--keep 2]
+
+Point AIRPORT_SNAPSHOT_DIR at the snapshot directory to have workers memory-map its current version at
+startup, skipping the airports table query and the engine build. Rebuild the snapshot whenever airport data
+is loaded (see app.ingest).
+"""
+
+import argparse
+import time
+
+from app.core import crud
+from app.core.database import SessionLocal
+from app.core.services import BruteForceEngine
+from app.core.snapshot import write_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory", help="Snapshot directory")
+    parser.add_argument(
+        "--keep", type=int, default=2, help="Number of snapshot versions to keep"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        engine = BruteForceEngine(crud.get_airport_store(db))
+    finally:
+        db.close()
+    version = write_snapshot(engine, args.directory, args.keep)
+
+    print(
+        f"Wrote snapshot version {version} of {len(engine)} airports to {args.directory} in "
+        f"{time.perf_counter() - start:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
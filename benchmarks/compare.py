@@ -0,0 +1,75 @@
+"""
+Compare two benchmark result files (see run.py), reporting the change in a metric for every benchmark they
+share:
+
+    python -m benchmarks.compare baseline.json candidate.json [--metric p50_ms] [--threshold 0.1]
+
+Exits with status 1 if any benchmark regressed by more than the threshold (a fraction of the baseline), so
+it can gate a CI job. Latency metrics (_ms, _seconds) regress when they rise, throughput metrics (_per_s)
+when they fall.
+"""
+
+import argparse
+import json
+import sys
+
+from benchmarks.timing import result_key
+
+
+def compare(
+    baseline: dict, candidate: dict, metric: str, threshold: float
+) -> list[dict]:
+    """
+    Return the change in metric for each benchmark in both result files, flagging regressions beyond
+    threshold
+    """
+    baseline_results = {result_key(record): record for record in baseline["results"]}
+    higher_is_better = metric.endswith("_per_s")
+    changes = []
+    for record in candidate["results"]:
+        key = result_key(record)
+        if key not in baseline_results:
+            continue
+        before = baseline_results[key]["metrics"].get(metric)
+        after = record["metrics"].get(metric)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        regression = -change if higher_is_better else change
+        changes.append(
+            {
+                "benchmark": key,
+                "baseline": before,
+                "candidate": after,
+                "change": change,
+                "regressed": regression > threshold,
+            }
+        )
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("baseline", help="Baseline result file")
+    parser.add_argument("candidate", help="Candidate result file")
+    parser.add_argument("--metric", default="p50_ms")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.candidate) as file:
+        candidate = json.load(file)
+
+    changes = compare(baseline, candidate, args.metric, args.threshold)
+    for change in changes:
+        flag = "REGRESSED" if change["regressed"] else ""
+        print(
+            f"{change['benchmark']:<70} {change['baseline']:>12.4f} {change['candidate']:>12.4f} "
+            f"{change['change']:>+8.1%} {flag}"
+        )
+    sys.exit(1 if any(change["regressed"] for change in changes) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Synthetic airport datasets and query points for the benchmark suite, generated from a fixed seed so that
+results are comparable between runs and commits.
+"""
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SEED = 20230301
+
+
+def synthetic_airports(size: int, seed: int = DEFAULT_SEED) -> pd.DataFrame:
+    """
+    Return `size` airports spread uniformly over the Earth's surface, with unique names and ICAO codes, in the
+    shape of the airports table
+    """
+    rng = np.random.default_rng(seed)
+    longitudes, latitudes = _uniform_sphere_points(rng, size)
+    ids = np.arange(1, size + 1)
+    return pd.DataFrame(
+        {
+            "id": ids,
+            "name": [f"AIRPORT {i}" for i in ids],
+            "icao": [f"X{i:06X}" for i in ids],
+            "latitude": latitudes,
+            "longitude": longitudes,
+        }
+    )
+
+
+def query_points(
+    count: int, seed: int = DEFAULT_SEED + 1
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return `count` query points (longitudes, latitudes in degrees) spread uniformly over the Earth's surface
+    """
+    return _uniform_sphere_points(np.random.default_rng(seed), count)
+
+
+def _uniform_sphere_points(
+    rng: np.random.Generator, count: int
+) -> tuple[np.ndarray, np.ndarray]:
+    longitudes = rng.uniform(-180, 180, count)
+    latitudes = np.degrees(np.arcsin(rng.uniform(-1, 1, count)))
+    return longitudes, latitudes
@@ -0,0 +1,325 @@
+"""
+Run the benchmark suite fully offline - against temporary SQLite databases and fakeredis - and write the
+results as JSON:
+
+    python -m benchmarks.run [--sizes 100 1000 ...] [--queries 1000] [--output results.json]
+
+For each synthetic dataset size (see datasets.py), the suite measures:
+
+- engine.build: the time to build each nearest airport engine (including its ball tree, and grid)
+- engine.nearest: single query latency for each engine
+- engine.nearest_many: batch latency for each engine and batch size
+- engine.nearest_ellipsoidal and engine.nearest_many_ellipsoidal: the same, with WGS-84 distances (see
+  NearestAirportEngine.ellipsoidal_nearest_many)
+- db.ingest and db.load: bulk upserting the dataset into the airports table, and reading it back
+- api.nearest: POST /airports/nearest latency on the cache miss, redis hit and local hit paths
+- api.nearest_batch: POST /airports/nearest/batch latency for each batch size, with a cold cache
+
+Brute force queries whose (points x airports) work exceeds --max-pairs are skipped. Compare two result
+files with benchmarks.compare.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest import mock
+
+BENCHMARK_DIR = tempfile.mkdtemp(prefix="nearest-airport-benchmark-")
+
+os.environ["ENV"] = "testing"
+os.environ["TEST_DATABASE_URL"] = f"sqlite:///{BENCHMARK_DIR}/api.db"
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", os.environ["TEST_DATABASE_URL"])
+
+import fakeredis
+import fakeredis.aioredis
+import numpy as np
+import sklearn
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.api import create_app
+from app.config import settings
+from app.core import crud, models
+from app.core.schemas import Coordinates
+from app.core.services import ENGINES, build_engine
+from app.extensions import local_cache
+from benchmarks.datasets import query_points, synthetic_airports
+from benchmarks.timing import measure, result
+
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_BATCH_SIZES = [1, 100, 10_000]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=DEFAULT_BATCH_SIZES
+    )
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--max-pairs", type=int, default=1_000_000_000)
+    parser.add_argument(
+        "--grid-resolution",
+        type=float,
+        default=None,
+        help="Grid engine cell size in degrees (default: about one airport per cell)",
+    )
+    parser.add_argument("--output", default="benchmark-results.json")
+    args = parser.parse_args()
+
+    results = []
+    try:
+        for size in args.sizes:
+            airports = synthetic_airports(size)
+            for record in (
+                benchmark_engines(airports, args)
+                + benchmark_database(airports)
+                + benchmark_api(airports, args)
+            ):
+                print(_summary(record), file=sys.stderr)
+                results.append(record)
+    finally:
+        shutil.rmtree(BENCHMARK_DIR, ignore_errors=True)
+
+    with open(args.output, "w") as file:
+        json.dump({"meta": _meta(args), "results": results}, file, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}", file=sys.stderr)
+
+
+def benchmark_engines(airports, args) -> list[dict]:
+    size = len(airports)
+    longitudes, latitudes = query_points(max(args.queries, *args.batch_sizes))
+    coordinates = [
+        Coordinates(longitude_degrees=longitude, latitude_degrees=latitude)
+        for longitude, latitude in zip(
+            longitudes[: args.queries], latitudes[: args.queries]
+        )
+    ]
+    results = []
+
+    for engine_name in ENGINES:
+        params = {"engine": engine_name, "size": size}
+        start = time.perf_counter()
+        engine = build_engine(
+            airports, engine_name, **_engine_options(engine_name, size, args)
+        )
+        engine.tree  # built on first use
+        results.append(
+            result("engine.build", params, {"seconds": time.perf_counter() - start})
+        )
+
+        if engine_name != "brute_force" or size <= args.max_pairs:
+            queries = _repeat(engine_name, size, 1, args)
+            results.append(
+                result(
+                    "engine.nearest",
+                    params,
+                    measure(lambda i: engine.nearest(coordinates[i]), queries),
+                )
+            )
+            # Ellipsoidal queries refine the engine's own haversine results, so are measured on the same
+            #   engine
+            engine.ellipsoidal = True
+            results.append(
+                result(
+                    "engine.nearest_ellipsoidal",
+                    params,
+                    measure(lambda i: engine.nearest_airport(coordinates[i]), queries),
+                )
+            )
+            engine.ellipsoidal = False
+
+        for batch_size in args.batch_sizes:
+            if engine_name == "brute_force" and size * batch_size > args.max_pairs:
+                continue
+            batch_longitudes = np.radians(longitudes[:batch_size])
+            batch_latitudes = np.radians(latitudes[:batch_size])
+            metrics = measure(
+                lambda i: engine.nearest_many(batch_longitudes, batch_latitudes),
+                _repeat(engine_name, size, batch_size, args),
+            )
+            metrics["points_per_s"] = metrics["throughput_per_s"] * batch_size
+            results.append(
+                result(
+                    "engine.nearest_many", {**params, "batch_size": batch_size}, metrics
+                )
+            )
+
+            engine.ellipsoidal = True
+            metrics = measure(
+                lambda i: engine.nearest_airports(batch_longitudes, batch_latitudes),
+                _repeat(engine_name, size, batch_size, args),
+            )
+            engine.ellipsoidal = False
+            metrics["points_per_s"] = metrics["throughput_per_s"] * batch_size
+            results.append(
+                result(
+                    "engine.nearest_many_ellipsoidal",
+                    {**params, "batch_size": batch_size},
+                    metrics,
+                )
+            )
+
+    return results
+
+
+def benchmark_database(airports) -> list[dict]:
+    size = len(airports)
+    filepath = os.path.join(BENCHMARK_DIR, f"airports_{size}.csv")
+    airports.drop(columns="id").to_csv(filepath, index=False)
+    engine = create_engine(f"sqlite:///{BENCHMARK_DIR}/airports_{size}.db")
+    models.Base.metadata.create_all(bind=engine)
+
+    with Session(engine) as db:
+        report = crud.upsert_airport_data(db, filepath, settings.ingest_chunk_size)
+        start = time.perf_counter()
+        crud.get_airport_store(db)
+        load_seconds = time.perf_counter() - start
+    engine.dispose()
+
+    return [
+        result(
+            "db.ingest",
+            {"size": size},
+            {"seconds": report.seconds, "rows_per_s": report.rows_per_second},
+        ),
+        result("db.load", {"size": size}, {"seconds": load_seconds}),
+    ]
+
+
+def benchmark_api(airports, args) -> list[dict]:
+    size = len(airports)
+    engine_name = settings.nearest_airport_engine
+    longitudes, latitudes = query_points(args.queries, seed=size)
+    bodies = [
+        {"longitude_degrees": longitude, "latitude_degrees": latitude}
+        for longitude, latitude in zip(longitudes, latitudes)
+    ]
+    server = fakeredis.FakeServer()
+    redis = fakeredis.FakeRedis(server=server)
+    results = []
+
+    def post(path, body):
+        response = client.post(f"/api/v1.0/airports/{path}", json=body)
+        response.raise_for_status()
+
+    def post_redis_hit(i):
+        local_cache.clear()
+        post("nearest", bodies[i])
+
+    def post_cold_batch(body):
+        redis.flushall()
+        local_cache.clear()
+        post("nearest/batch", body)
+
+    with (
+        mock.patch(
+            "app.api.v1.airports.rd", fakeredis.aioredis.FakeRedis(server=server)
+        ),
+        TestClient(create_app()) as client,
+    ):
+        client.app.state.nearest_airport_engine = build_engine(
+            airports, engine_name, **_engine_options(engine_name, size, args)
+        )
+        local_cache.clear()
+        queries = _repeat(engine_name, size, 1, args)
+
+        for path, function in [
+            ("miss", lambda i: post("nearest", bodies[i])),
+            ("redis_hit", post_redis_hit),
+            ("local_hit", lambda i: post("nearest", bodies[i])),
+        ]:
+            results.append(
+                result(
+                    "api.nearest",
+                    {"engine": engine_name, "size": size, "path": path},
+                    measure(function, queries),
+                )
+            )
+
+        for batch_size in args.batch_sizes:
+            if batch_size > settings.nearest_airport_batch_limit or (
+                engine_name == "brute_force" and size * batch_size > args.max_pairs
+            ):
+                continue
+            body = [bodies[i % len(bodies)] for i in range(batch_size)]
+            metrics = measure(
+                lambda i: post_cold_batch(body),
+                _repeat(engine_name, size, batch_size, args),
+            )
+            metrics["points_per_s"] = metrics["throughput_per_s"] * batch_size
+            results.append(
+                result(
+                    "api.nearest_batch",
+                    {"engine": engine_name, "size": size, "batch_size": batch_size},
+                    metrics,
+                )
+            )
+
+    return results
+
+
+def _engine_options(engine_name: str, size: int, args) -> dict:
+    if engine_name != "grid":
+        return {}
+    resolution = args.grid_resolution
+    if resolution is None:
+        # Cells of roughly the area per airport, within the range a global grid can be built in reasonably
+        resolution = float(np.clip(np.degrees(np.sqrt(4 * np.pi / size)), 0.2, 5))
+    return {"resolution_degrees": resolution}
+
+
+def _repeat(engine_name: str, size: int, batch_size: int, args) -> int:
+    """
+    Return how many times to repeat a query, bounding brute force work by --max-pairs and batch work by
+    (about) --queries points
+    """
+    repeat = max(1, args.queries // batch_size)
+    if engine_name == "brute_force":
+        repeat = min(repeat, max(1, args.max_pairs // (size * batch_size)))
+    return repeat
+
+
+def _meta(args) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scikit_learn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+    }
+
+
+def _summary(record: dict) -> str:
+    params = " ".join(f"{key}={value}" for key, value in record["params"].items())
+    metrics = record["metrics"]
+    if "p50_ms" in metrics:
+        measured = (
+            f"p50 {metrics['p50_ms']:.3f}ms p99 {metrics['p99_ms']:.3f}ms "
+            f"{metrics['throughput_per_s']:,.1f}/s"
+        )
+    else:
+        measured = f"{metrics['seconds']:.3f}s"
+    return f"{record['name']:<20} {params:<50} {measured}"
+
+
+if __name__ == "__main__":
+    main()
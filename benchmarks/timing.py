@@ -0,0 +1,48 @@
+"""
+Timing helpers for the benchmark suite.
+"""
+
+import time
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+
+
+def measure(function: Callable[[int], Any], repeat: int) -> dict[str, float]:
+    """
+    Call function(i) for i in range(repeat) and return the latency percentiles (milliseconds) and
+    throughput (calls per second) of the calls
+    """
+    timings = np.empty(repeat, dtype=np.float64)
+    start = time.perf_counter()
+    for i in range(repeat):
+        call_start = time.perf_counter()
+        function(i)
+        timings[i] = time.perf_counter() - call_start
+    elapsed = time.perf_counter() - start
+
+    p50, p90, p99 = np.percentile(timings, [50, 90, 99]) * 1000
+    return {
+        "count": repeat,
+        "mean_ms": float(timings.mean() * 1000),
+        "p50_ms": float(p50),
+        "p90_ms": float(p90),
+        "p99_ms": float(p99),
+        "max_ms": float(timings.max() * 1000),
+        "throughput_per_s": repeat / elapsed,
+    }
+
+
+def result(name: str, params: dict[str, Any], metrics: dict[str, Any]) -> dict:
+    """
+    Return a benchmark result record, identified by name and params when comparing result files
+    """
+    return {"name": name, "params": params, "metrics": metrics}
+
+
+def result_key(record: dict) -> str:
+    params = ",".join(
+        f"{key}={value}" for key, value in sorted(record["params"].items())
+    )
+    return f"{record['name']}[{params}]"
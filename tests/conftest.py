@@ -4,10 +4,14 @@ from fastapi import FastAPI
 
 os.environ["ENV"] = "testing"
 
+import anyio
 import fakeredis
+import fakeredis.aioredis
 import pytest
+from fastapi.testclient import TestClient
 
 from app.api import create_app
+from app.extensions import airports_response_cache, local_cache
 
 
 @pytest.fixture(scope="session")
@@ -15,6 +19,38 @@ def app() -> FastAPI:
     yield create_app()
 
 
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
 @pytest.fixture(scope="function")
 def redis_mock():
-    yield fakeredis.FakeStrictRedis(version=6)
+    yield fakeredis.aioredis.FakeRedis()
+
+
+@pytest.fixture
+def wait_for_reload():
+    """
+    Return a function waiting (for up to 5 seconds) for a client's app to swap in a new dataset generation
+    """
+
+    def wait(client: TestClient, generation: int):
+        reloader = client.app.state.dataset_reloader
+        for _ in range(500):
+            if reloader.generation > generation and reloader.status == "idle":
+                return
+            client.portal.call(anyio.sleep, 0.01)
+        raise TimeoutError(f"Dataset not reloaded: {reloader.stats()}")
+
+    return wait
+
+
+@pytest.fixture(autouse=True)
+def clear_local_cache():
+    airports_response_cache.clear()
+    local_cache.clear()
+    local_cache.hits = local_cache.misses = 0
+    local_cache.version_checked_at = float("-inf")
+    local_cache.dataset_version = 0
+    yield
@@ -0,0 +1,189 @@
+import shutil
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.extensions import get_db
+
+AUTHORIZATION = {"Authorization": f"Bearer {settings.secret_key}"}
+CSV_HEADERS = {**AUTHORIZATION, "Content-Type": "text/csv"}
+
+
+@pytest.fixture
+def admin_db(mocker, app, tmp_path):
+    """
+    Point the admin routes, and dataset reloads, at a copy of the test database, and restore the app's
+    nearest airport engine afterwards
+    """
+    shutil.copy("tests/data/test_nearest_airport.db", tmp_path / "airports.db")
+    db_engine = create_engine(f"sqlite:///{tmp_path}/airports.db")
+    session = sessionmaker(bind=db_engine)
+    mocker.patch("app.api.SessionLocal", session)
+
+    def get_test_db():
+        db = session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = get_test_db
+    nearest_airport_engine = getattr(app.state, "nearest_airport_engine", None)
+    yield
+    del app.dependency_overrides[get_db]
+    if nearest_airport_engine is not None:
+        app.state.nearest_airport_engine = nearest_airport_engine
+    db_engine.dispose()
+
+
+def test_upload_airports_reloads_dataset(mocker, redis_mock, app, admin_db):
+    mocker.patch("app.api.v1.airports.rd", redis_mock)
+    coordinates = {"latitude_degrees": 0.5, "longitude_degrees": 0.5}
+    with TestClient(app) as client:
+        engine = app.state.nearest_airport_engine
+        generation = app.state.dataset_reloader.generation
+        before = client.post("/api/v1.0/airports/nearest", json=coordinates).json()
+
+        response = client.post(
+            "/api/v1.0/admin/airports",
+            content="name,icao,latitude,longitude\nNULL ISLAND,ZZZZ,0.5,0.5\n",
+            headers=CSV_HEADERS,
+        )
+        assert response.status_code == 202
+        assert response.json()["report"]["rows_written"] == 1
+        assert response.json()["reloading"] is True
+
+        # The new dataset is swapped in, and its version bumped, once the response has been sent
+        status = client.get(
+            "/api/v1.0/admin/airports/reload", headers=AUTHORIZATION
+        ).json()
+        assert status["status"] == "idle"
+        assert status["generation"] == generation + 1
+        assert status["dataset_version"] == 1
+        assert status["airport_count"] == len(engine) + 1
+        assert (
+            client.portal.call(redis_mock.get, "nearest-airport:dataset-version")
+            == b"1"
+        )
+
+        after = client.post("/api/v1.0/airports/nearest", json=coordinates).json()
+        assert before["nearest_airport"]["icao"] != "ZZZZ"
+        assert after["nearest_airport"]["icao"] == "ZZZZ"
+        assert after["distance_km"] == 0
+
+
+def test_upload_airports_reloads_after_failed_publish(
+    mocker, redis_mock, app, admin_db, wait_for_reload
+):
+    mocker.patch("app.api.v1.airports.rd", redis_mock)
+    coordinates = {"latitude_degrees": 0.5, "longitude_degrees": 0.5}
+    with TestClient(app) as client:
+        reloader = app.state.dataset_reloader
+        publish = mocker.patch.object(
+            reloader, "publish_engine", side_effect=MemoryError("out of memory")
+        )
+        mocker.patch.object(reloader, "retry_seconds", 0)
+        generation = reloader.generation
+
+        response = client.post(
+            "/api/v1.0/admin/airports",
+            content="name,icao,latitude,longitude\nNULL ISLAND,ZZZZ,0.5,0.5\n",
+            headers=CSV_HEADERS,
+        )
+        assert response.status_code == 202
+
+        # Every attempt failed, but the dataset version is still bumped and the worker reloads
+        assert publish.call_count == reloader.publish_attempts
+        assert (
+            client.portal.call(redis_mock.get, "nearest-airport:dataset-version")
+            == b"1"
+        )
+        wait_for_reload(client, generation)
+        assert reloader.stats()["dataset_version"] == 1
+        after = client.post("/api/v1.0/airports/nearest", json=coordinates).json()
+        assert after["nearest_airport"]["icao"] == "ZZZZ"
+
+
+def test_upload_unchanged_airports_does_not_reload(mocker, redis_mock, app, admin_db):
+    mocker.patch("app.api.v1.airports.rd", redis_mock)
+    with TestClient(app) as client:
+        generation = app.state.dataset_reloader.generation
+        response = client.post(
+            "/api/v1.0/admin/airports",
+            content="NAME,ICAO,Latitude,Longitude\nHONINGTON,EGXH,52.342611,0.772939\n",
+            headers=CSV_HEADERS,
+        )
+
+        assert response.status_code == 202
+        assert response.json()["report"]["rows_written"] == 0
+        assert response.json()["reloading"] is False
+        assert app.state.dataset_reloader.generation == generation
+
+
+@pytest.mark.parametrize(
+    "content, detail",
+    [
+        ("name,icao,latitude\nNULL ISLAND,ZZZZ,0.5\n", "Missing columns ['longitude']"),
+        (
+            "name,icao,latitude,longitude\nA,ZZZA,0.5,0.5\nB,ZZZB,95,0.5\n",
+            "Invalid airport on line 3",
+        ),
+        (
+            "name,icao,latitude,longitude\nA,ZZZA,north,0.5\n",
+            "Invalid airport on line 2",
+        ),
+        ("name,icao,latitude,longitude\n", "Airport data file has no rows"),
+        (
+            "name,icao,latitude,longitude\nA,ZZZA,0.5,0.5\nA,ZZZB,0.6,0.6\n",
+            "Duplicate airport name on line 3",
+        ),
+        (
+            "name,icao,latitude,longitude\nHONINGTON,ZZZA,0.5,0.5\n",
+            "Duplicate airport name on line 2",
+        ),
+    ],
+)
+def test_upload_invalid_airports(app, admin_db, content, detail):
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1.0/admin/airports", content=content, headers=CSV_HEADERS
+        )
+
+        assert response.status_code == 422
+        assert response.json()["detail"] == detail
+
+
+def test_upload_conflicting_airports(app, admin_db):
+    # Swapping two airports' names is valid once the upsert completes, but conflicts part way through
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1.0/admin/airports",
+            content=(
+                "name,icao,latitude,longitude\n"
+                "WELSHPOOL,EGXH,52.342611,0.772939\n"
+                "HONINGTON,EGCW,52.628611,-3.153333\n"
+            ),
+            headers=CSV_HEADERS,
+        )
+
+        assert response.status_code == 409
+        assert response.json()["detail"] == (
+            "Airport data conflicts with the airports table"
+        )
+
+
+def test_admin_requires_secret_key(app, admin_db):
+    with TestClient(app) as client:
+        for headers in [{}, {"Authorization": "Bearer wrong"}]:
+            response = client.get("/api/v1.0/admin/airports/reload", headers=headers)
+            assert response.status_code == 401
+
+        response = client.post(
+            "/api/v1.0/admin/airports",
+            content="{}",
+            headers={**AUTHORIZATION, "Content-Type": "application/json"},
+        )
+        assert response.status_code == 415
@@ -1,5 +1,12 @@
+import json
+import os
+
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.core import async_crud, services
 
 # ========================
 #  Airport fixtures
@@ -47,7 +54,8 @@ def invalid_coordinates_response() -> dict:
 # ========================
 
 
-def test_get_airports(app, honington_airport):
+def test_get_airports(mocker, redis_mock, app, honington_airport):
+    mocker.patch("app.api.v1.airports.rd", redis_mock)
     with TestClient(app) as client:
         response = client.get(
             "/api/v1.0/airports",
@@ -60,6 +68,58 @@ def test_get_airports(app, honington_airport):
         assert response_json["airports"][0] == honington_airport
 
 
+def test_get_airports_etag(mocker, redis_mock, app):
+    mocker.patch("app.api.v1.airports.rd", redis_mock)
+    with TestClient(app) as client:
+        response = client.get("/api/v1.0/airports")
+        etag = response.headers["etag"]
+
+        not_modified = client.get("/api/v1.0/airports", headers={"If-None-Match": etag})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert not_modified.headers["etag"] == etag
+
+        modified = client.get(
+            "/api/v1.0/airports", headers={"If-None-Match": '"stale"'}
+        )
+        assert modified.status_code == 200
+        assert modified.content == response.content
+
+
+def test_get_airports_without_redis(mocker, redis_mock, app):
+    mocker.patch("app.api.v1.airports.rd", redis_mock)
+    mocker.patch("app.api.v1.airports.settings.cache_version_check_seconds", 0)
+    get = mocker.patch.object(redis_mock, "get", side_effect=RedisConnectionError)
+    with TestClient(app) as client:
+        response = client.get("/api/v1.0/airports")
+
+        assert response.status_code == 200
+        assert response.json()["airport_count"] == 59
+        assert get.called
+
+
+def test_get_airports_serialised_once_per_dataset_version(
+    mocker, redis_mock, app, wait_for_reload
+):
+    mocker.patch("app.api.v1.airports.rd", redis_mock)
+    mocker.patch("app.api.v1.airports.settings.cache_version_check_seconds", 0)
+    get_all_airports = mocker.spy(async_crud, "get_all_airports")
+    with TestClient(app) as client:
+        etag = client.get("/api/v1.0/airports").headers["etag"]
+        client.get("/api/v1.0/airports")
+        assert get_all_airports.call_count == 1
+
+        # Served from the current dataset until the worker has reloaded
+        generation = app.state.dataset_reloader.generation
+        client.portal.call(redis_mock.incr, "nearest-airport:dataset-version")
+        assert client.get("/api/v1.0/airports").headers["etag"] == etag
+        assert get_all_airports.call_count == 1
+
+        wait_for_reload(client, generation)
+        assert client.get("/api/v1.0/airports").headers["etag"] == etag
+        assert get_all_airports.call_count == 2
+
+
 def test_get_airport_by_id(app, honington_airport):
     with TestClient(app) as client:
         response = client.get(
@@ -72,10 +132,10 @@ def test_get_airport_by_id(app, honington_airport):
         assert response_json["airport"] == honington_airport
 
 
-def test_get_airport_by_id(app, honington_airport):
+def test_get_airport_by_icao(app, honington_airport):
     with TestClient(app) as client:
         response = client.get(
-            "/api/v1.0/airports/icao/EGXH",
+            "/api/v1.0/airports/icao/egxh",
         )
         response_json = response.json()
 
@@ -84,6 +144,55 @@ def test_get_airport_by_id(app, honington_airport):
         assert response_json["airport"] == honington_airport
 
 
+def test_get_airport_not_found(app):
+    with TestClient(app) as client:
+        response = client.get("/api/v1.0/airports/9999")
+        assert response.status_code == 404
+        assert response.json()["detail"] == "Airport with id 9999 cannot be found"
+
+        response = client.get("/api/v1.0/airports/icao/zzzz")
+        assert response.status_code == 404
+        assert (
+            response.json()["detail"] == "Airport with ICAO code ZZZZ cannot be found"
+        )
+
+
+def test_search_airports(app, heathrow_airport):
+    with TestClient(app) as client:
+        response = client.get("/api/v1.0/airports/search?q=heath")
+        response_json = response.json()
+
+        assert response.status_code == 200
+        assert [airport["name"] for airport in response_json["airports"]] == [
+            "BARKSTON HEATH",
+            "HEATHROW",
+        ]
+        assert response_json["airports"][1] == heathrow_airport
+        assert response_json["airport_count"] == 2
+
+        response = client.get("/api/v1.0/airports/search?q=EGL&limit=2")
+        assert [airport["icao"] for airport in response.json()["airports"]] == [
+            "EGLC",
+            "EGLK",
+        ]
+
+
+@pytest.mark.parametrize(
+    "path", ["/airports/1", "/airports/icao/EGXH", "/airports/search?q=EGX"]
+)
+def test_airport_lookups_reload_dataset(mocker, redis_mock, app, wait_for_reload, path):
+    mocker.patch("app.api.v1.airports.rd", redis_mock)
+    mocker.patch("app.api.v1.airports.settings.cache_version_check_seconds", 0)
+    with TestClient(app) as client:
+        assert client.get(f"/api/v1.0{path}").status_code == 200
+        generation = app.state.dataset_reloader.generation
+
+        # A worker serving only lookups still notices a new dataset version
+        client.portal.call(redis_mock.incr, "nearest-airport:dataset-version")
+        assert client.get(f"/api/v1.0{path}").status_code == 200
+        wait_for_reload(client, generation)
+
+
 def test_nearest_airport_honington(mocker, redis_mock, app, honington_airport):
     mocker.patch("app.api.v1.airports.rd", redis_mock)
     coordinates = {"latitude_degrees": 52.327640, "longitude_degrees": 0.851955}
@@ -112,6 +221,30 @@ def test_nearest_airport_heathrow(mocker, redis_mock, app, heathrow_airport):
         assert response_json["input_coordinates"] == coordinates
 
 
+def test_nearest_airport_ellipsoidal(mocker, redis_mock, app, heathrow_airport):
+    mocker.patch("app.api.v1.airports.rd", redis_mock)
+    mocker.patch("app.config.settings.distance_model", "ellipsoidal")
+    coordinates = {"latitude_degrees": 51.408314, "longitude_degrees": -0.301567}
+    expected_distance_km = services._calculate_vincenty_distance(
+        *np.radians([-0.301567, 51.408314, -0.461389, 51.4775])
+    )
+    with TestClient(app) as client:
+        for path in ["nearest", "nearest/batch"]:
+            # A cache miss, then a hit
+            for _ in range(2):
+                response = client.post(
+                    f"/api/v1.0/airports/{path}",
+                    json=coordinates if path == "nearest" else [coordinates],
+                )
+                result = response.json()
+                if path == "nearest/batch":
+                    result = result["results"][0]
+
+                assert result["nearest_airport"] == heathrow_airport
+                assert result["distance_km"] == pytest.approx(expected_distance_km)
+                assert result["distance_km"] != pytest.approx(13.486, abs=0.001)
+
+
 def test_nearest_airport_invalid_coordinates(
     mocker, redis_mock, app, invalid_coordinates_response
 ):
@@ -123,3 +256,297 @@ def test_nearest_airport_invalid_coordinates(
 
         assert response.status_code == 422
         assert response_json == invalid_coordinates_response
+
+
+def test_nearest_airport_batch(
+    mocker, redis_mock, app, honington_airport, heathrow_airport
+):
+    mocker.patch("app.api.v1.airports.rd", redis_mock)
+    coordinates = [
+        {"latitude_degrees": 51.408314, "longitude_degrees": -0.301567},
+        {"latitude_degrees": 100, "longitude_degrees": -0.301567},
+        {"latitude_degrees": 52.327640, "longitude_degrees": 0.851955},
+    ]
+    with TestClient(app) as client:
+        response = client.post("/api/v1.0/airports/nearest/batch", json=coordinates)
+        response_json = response.json()
+
+        assert response.status_code == 200
+        assert response_json["success"] == True
+        assert response_json["result_count"] == 3
+        assert response_json["error_count"] == 1
+
+        heathrow, invalid, honington = response_json["results"]
+        assert heathrow["nearest_airport"] == heathrow_airport
+        assert heathrow["distance_km"] == pytest.approx(13.486, 0.01)
+        assert heathrow["input_coordinates"] == coordinates[0]
+        assert invalid["success"] == False
+        assert invalid["errors"][0]["loc"] == ["latitude_degrees"]
+        assert honington["nearest_airport"] == honington_airport
+
+        # Repeat request is served from the cache, in the same order
+        cached_response = client.post(
+            "/api/v1.0/airports/nearest/batch", json=coordinates
+        )
+        assert cached_response.json() == response_json
+
+
+def test_nearest_airport_batch_too_large(mocker, redis_mock, app):
+    mocker.patch("app.api.v1.airports.rd", redis_mock)
+    mocker.patch("app.api.v1.airports.settings.nearest_airport_batch_limit", 1)
+    coordinates = [{"latitude_degrees": 52, "longitude_degrees": -0.3}] * 2
+    with TestClient(app) as client:
+        response = client.post("/api/v1.0/airports/nearest/batch", json=coordinates)
+
+        assert response.status_code == 413
+
+
+def test_k_nearest_airports(app, heathrow_airport):
+    coordinates = {"latitude_degrees": 51.408314, "longitude_degrees": -0.301567}
+    with TestClient(app) as client:
+        response = client.post("/api/v1.0/airports/nearest/k?k=3", json=coordinates)
+        response_json = response.json()
+
+        assert response.status_code == 200
+        assert response_json["success"] == True
+        assert response_json["airport_count"] == 3
+        assert response_json["airports"][0]["airport"] == heathrow_airport
+        assert response_json["airports"][0]["distance_km"] == pytest.approx(
+            13.486, 0.01
+        )
+        assert response_json["input_coordinates"] == coordinates
+
+
+def test_airports_within_radius(app, heathrow_airport):
+    coordinates = {"latitude_degrees": 51.408314, "longitude_degrees": -0.301567}
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1.0/airports/within?radius_km=50&limit=2", json=coordinates
+        )
+        response_json = response.json()
+        distances = [airport["distance_km"] for airport in response_json["airports"]]
+
+        assert response.status_code == 200
+        assert response_json["airport_count"] == 2
+        assert response_json["airports"][0]["airport"] == heathrow_airport
+        assert distances == sorted(distances)
+        assert all(distance <= 50 for distance in distances)
+
+
+@pytest.mark.parametrize("warm_start", [True, False])
+def test_engine_warm_start(mocker, app, warm_start):
+    mocker.patch("app.config.settings.engine_warm_start", warm_start)
+    with TestClient(app):
+        engine = app.state.nearest_airport_engine
+
+        assert (engine._tree is not None) is warm_start
+        assert (engine._lookup is not None) is warm_start
+
+
+def test_engine_stats(app):
+    with TestClient(app) as client:
+        response = client.get("/api/v1.0/engine")
+        engine = client.app.state.nearest_airport_engine
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "engine": type(engine).__name__,
+            "airport_count": len(engine),
+            "snapshot_version": None,
+            "distance_model": "haversine",
+            "store": {
+                "float32": False,
+                "memory_bytes": engine.airports.nbytes,
+            },
+            "executor": {
+                "kind": "thread",
+                "workers": os.cpu_count(),
+                "pending": 0,
+                "max_pending": 1_000,
+                "chunk_size": 10_000,
+            },
+        }
+
+
+def test_nearest_airport_stream_ndjson(
+    mocker, app, honington_airport, heathrow_airport
+):
+    mocker.patch("app.api.v1.airports.settings.nearest_airport_stream_chunk_size", 2)
+    body = (
+        '{"latitude_degrees": 51.408314, "longitude_degrees": -0.301567}\n'
+        '{"latitude_degrees": 100, "longitude_degrees": -0.301567}\n'
+        "\n"
+        "not json\n"
+        '{"latitude_degrees": 52.327640, "longitude_degrees": 0.851955}'
+    )
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1.0/airports/nearest/stream",
+            content=body,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        results = [json.loads(line) for line in response.text.splitlines()]
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert [result["success"] for result in results] == [True, False, False, True]
+        assert results[0]["nearest_airport"] == heathrow_airport
+        assert results[0]["distance_km"] == pytest.approx(13.486, 0.01)
+        assert results[1]["errors"][0]["loc"] == ["latitude_degrees"]
+        assert results[3]["nearest_airport"] == honington_airport
+
+
+def test_nearest_airport_stream_csv(app, honington_airport, heathrow_airport):
+    body = (
+        "longitude_degrees,latitude_degrees\n"
+        "-0.301567,51.408314\n"
+        "0.851955,52.327640\n"
+    )
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1.0/airports/nearest/stream",
+            content=body,
+            headers={"Content-Type": "text/csv"},
+        )
+        results = [json.loads(line) for line in response.text.splitlines()]
+
+        assert response.status_code == 200
+        assert results[0]["nearest_airport"] == heathrow_airport
+        assert results[0]["input_coordinates"] == {
+            "longitude_degrees": -0.301567,
+            "latitude_degrees": 51.408314,
+        }
+        assert results[1]["nearest_airport"] == honington_airport
+
+
+def test_nearest_airport_stream_invalid_utf8(app, heathrow_airport):
+    body = (
+        b"longitude_degrees,latitude_degrees\n"
+        b"\xff\xfe,51.408314\n"
+        b"-0.301567,51.408314\n"
+    )
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1.0/airports/nearest/stream",
+            content=body,
+            headers={"Content-Type": "text/csv"},
+        )
+        results = [json.loads(line) for line in response.text.splitlines()]
+
+        assert response.status_code == 200
+        assert results[0]["success"] == False
+        assert results[0]["errors"][0]["type"] == "value_error.unicodedecode"
+        assert results[1]["nearest_airport"] == heathrow_airport
+
+
+def test_nearest_airport_stream_unsupported_media_type(app):
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1.0/airports/nearest/stream",
+            content="<xml/>",
+            headers={"Content-Type": "application/xml"},
+        )
+
+        assert response.status_code == 415
+
+
+def test_get_airports_page(app, honington_airport):
+    with TestClient(app) as client:
+        first_page = client.get("/api/v1.0/airports?limit=25").json()
+        second_page = client.get(
+            f"/api/v1.0/airports?limit=25&cursor={first_page['next_cursor']}"
+        ).json()
+        last_page = client.get(
+            f"/api/v1.0/airports?limit=25&cursor={second_page['next_cursor']}"
+        ).json()
+
+        ids = [
+            airport["id"]
+            for page in (first_page, second_page, last_page)
+            for airport in page["airports"]
+        ]
+        assert first_page["airports"][0] == honington_airport
+        assert first_page["next_cursor"] == 25
+        assert last_page["airport_count"] == 9
+        assert last_page["next_cursor"] is None
+        assert ids == list(range(1, 60))
+
+
+def test_get_airports_fields(app):
+    with TestClient(app) as client:
+        response = client.get("/api/v1.0/airports?fields=id,icao&limit=1")
+
+        assert response.status_code == 200
+        assert response.json()["airports"] == [{"id": 1, "icao": "EGXH"}]
+
+        response = client.get("/api/v1.0/airports?fields=id,runways")
+        assert response.status_code == 422
+
+
+def test_get_airports_bbox(app, heathrow_airport):
+    with TestClient(app) as client:
+        response = client.get("/api/v1.0/airports?bbox=-0.5,51.4,-0.4,51.5")
+        response_json = response.json()
+
+        assert response.status_code == 200
+        assert response_json["airports"] == [heathrow_airport]
+
+        response = client.get("/api/v1.0/airports?bbox=179,-10,-179,10")
+        assert response.json()["airports"] == []
+
+        response = client.get("/api/v1.0/airports?bbox=-0.5,51.5,-0.4")
+        assert response.status_code == 422
+
+
+def test_distance_matrix(app):
+    coordinates = {"latitude_degrees": 51.408314, "longitude_degrees": -0.301567}
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1.0/airports/distances",
+            json={"origins": ["EGLL", coordinates], "destinations": ["egxh"]},
+        )
+        response_json = response.json()
+
+        assert response.status_code == 200
+        assert response_json["origin_count"] == 2
+        assert response_json["destination_count"] == 1
+        assert response_json["distances_km"][0][0] == pytest.approx(128.147, 0.001)
+
+        # Without destinations, the distance between every pair of origins is returned
+        response = client.post(
+            "/api/v1.0/airports/distances?format=binary",
+            json={"origins": ["EGLL", coordinates]},
+        )
+        matrix = np.frombuffer(response.content, dtype="<f8").reshape(2, 2)
+
+        assert response.headers["content-type"] == "application/octet-stream"
+        assert response.headers["x-matrix-shape"] == "2,2"
+        assert matrix[0, 1] == pytest.approx(13.486, 0.01)
+        assert matrix[0, 1] == matrix[1, 0]
+
+
+def test_distance_matrix_errors(mocker, app):
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1.0/airports/distances", json={"origins": ["EGLL", "ZZZZ", "zzzy"]}
+        )
+        assert response.status_code == 404
+        assert response.json()["detail"] == (
+            "Airports with ICAO codes ['ZZZY', 'ZZZZ'] cannot be found"
+        )
+
+        mocker.patch("app.api.v1.airports.settings.distance_matrix_max_elements", 3)
+        response = client.post(
+            "/api/v1.0/airports/distances", json={"origins": ["EGLL", "EGXH"]}
+        )
+        assert response.status_code == 413
+
+
+def test_compute_executor_busy(mocker, app):
+    mocker.patch("app.api.v1.airports.compute_executor.max_pending", 0)
+    coordinates = {"latitude_degrees": 51.408314, "longitude_degrees": -0.301567}
+    with TestClient(app) as client:
+        response = client.post("/api/v1.0/airports/nearest/k", json=coordinates)
+
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
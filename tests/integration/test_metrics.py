@@ -0,0 +1,55 @@
+from fastapi.testclient import TestClient
+from prometheus_client.parser import text_string_to_metric_families
+
+
+def scrape(client: TestClient) -> dict[str, list]:
+    response = client.get("/api/v1.0/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    return {
+        family.name: family.samples
+        for family in text_string_to_metric_families(response.text)
+    }
+
+
+def test_metrics_request_latency_by_route(app):
+    with TestClient(app) as client:
+        client.get("/api/v1.0/airports/1")
+        client.get("/api/v1.0/airports/999999")
+        samples = scrape(client)["nearest_airport_request_duration_seconds"]
+
+        counts = {
+            (sample.labels["route"], sample.labels["status"]): sample.value
+            for sample in samples
+            if sample.name.endswith("_count") and sample.labels["method"] == "GET"
+        }
+        assert counts[("/api/v1.0/airports/{airport_id}", "200")] >= 1
+        assert counts[("/api/v1.0/airports/{airport_id}", "404")] >= 1
+
+
+def phase_counts(families: dict[str, list]) -> dict[str, float]:
+    return {
+        sample.labels["phase"]: sample.value
+        for sample in families["nearest_airport_phase_duration_seconds"]
+        if sample.name.endswith("_count")
+    }
+
+
+def test_metrics_phases_and_pools(mocker, redis_mock, app):
+    mocker.patch("app.api.v1.airports.rd", redis_mock)
+    coordinates = {"latitude_degrees": 51.5, "longitude_degrees": -0.1}
+    with TestClient(app) as client:
+        before = phase_counts(scrape(client))
+        client.get("/api/v1.0/airports")
+        client.post("/api/v1.0/airports/nearest", json=coordinates)
+        families = scrape(client)
+        after = phase_counts(families)
+
+        pools = {
+            (sample.labels["pool"], sample.labels["state"]): sample.value
+            for sample in families["nearest_airport_pool_connections"]
+        }
+        for phase in ["db_fetch", "cache", "distance"]:
+            assert after[phase] > before.get(phase, 0)
+        assert pools[("redis", "max")] > 0
+        assert ("database", "in_use") in pools
@@ -0,0 +1,93 @@
+import pstats
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+
+
+@pytest.fixture
+def profile_dir(mocker, tmp_path):
+    mocker.patch.object(settings, "profile_dir", str(tmp_path))
+    yield tmp_path
+
+
+def test_profiled_request_report(mocker, redis_mock, app, profile_dir):
+    mocker.patch("app.api.v1.airports.rd", redis_mock)
+    coordinates = {"latitude_degrees": 51.5, "longitude_degrees": -0.1}
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1.0/airports/nearest",
+            json=coordinates,
+            headers={settings.profile_header: settings.secret_key},
+        )
+        assert response.status_code == 200
+        profile_id = response.headers["X-Profile-Id"]
+
+        report = client.get(
+            f"/api/v1.0/profiles/{profile_id}",
+            headers={settings.profile_header: settings.secret_key},
+        )
+        assert report.status_code == 200
+        assert report.text.startswith("POST /api/v1.0/airports/nearest -> 200")
+        for phase in ("cache", "distance", "other"):
+            assert f"  {phase} " in report.text
+        assert "cumulative" in report.text
+
+        stats = client.get(
+            f"/api/v1.0/profiles/{profile_id}",
+            params={"format": "pstats"},
+            headers={settings.profile_header: settings.secret_key},
+        )
+        assert stats.status_code == 200
+        assert "X-Profile-Id" not in stats.headers
+
+    pstats.Stats(str(profile_dir / f"{profile_id}.prof"))
+
+
+def test_unprofiled_requests(app, profile_dir):
+    with TestClient(app) as client:
+        for headers, params in [
+            ({}, {}),
+            ({settings.profile_header: "wrong"}, {}),
+            ({}, {"profile": settings.secret_key}),
+        ]:
+            response = client.get(
+                "/api/v1.0/airports/1", headers=headers, params=params
+            )
+            assert response.status_code == 200
+            assert "X-Profile-Id" not in response.headers
+
+        response = client.get(
+            "/api/v1.0/airports/1",
+            headers={settings.profile_header: settings.secret_key},
+        )
+        assert "X-Profile-Id" in response.headers
+
+    assert len(list(profile_dir.glob("*.prof"))) == 1
+
+
+def test_download_profile_requires_secret(app, profile_dir):
+    with TestClient(app) as client:
+        response = client.get(f"/api/v1.0/profiles/{'0' * 32}")
+        assert response.status_code == 403
+
+        for profile_id in ("0" * 32, "..%2F..%2Fetc%2Fpasswd"):
+            response = client.get(
+                f"/api/v1.0/profiles/{profile_id}",
+                headers={settings.profile_header: settings.secret_key},
+            )
+            assert response.status_code == 404
+
+
+def test_profile_reports_pruned(mocker, app, profile_dir):
+    mocker.patch.object(settings, "profile_keep", 2)
+    with TestClient(app) as client:
+        for _ in range(4):
+            client.get(
+                "/api/v1.0/airports/1",
+                headers={settings.profile_header: settings.secret_key},
+            )
+
+    assert len(list(profile_dir.glob("*.prof"))) == 2
+    assert len(list(profile_dir.glob("*.txt"))) == 2
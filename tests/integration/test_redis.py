@@ -1,22 +1,53 @@
 from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
 
+from app.extensions import local_cache
 
-def test_nearest_airport_redis_caching(mocker, redis_mock, capfd, app):
+
+def cache_requests(tier: str, result: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "nearest_airport_cache_requests_total", {"tier": tier, "result": result}
+        )
+        or 0
+    )
+
+
+def test_nearest_airport_redis_caching(mocker, redis_mock, app):
     """
-    Confirm that a repeat identical post request to airports/nearest hits retrieves the
-    result from the redis cache on the second request by checking log messages.
+    Confirm that a repeat identical post request to airports/nearest retrieves the result from the redis
+    cache, once the in-process cache no longer holds it, by checking the cache metrics.
     """
     mocker.patch("app.api.v1.airports.rd", redis_mock)
     coordinates = {"latitude_degrees": 52.327640, "longitude_degrees": 0.851955}
+    redis_hits = cache_requests("redis", "hit")
+    redis_misses = cache_requests("redis", "miss")
     with TestClient(app) as client:
         response_one = client.post("/api/v1.0/airports/nearest", json=coordinates)
         assert response_one.status_code == 200
+        assert cache_requests("redis", "miss") == redis_misses + 1
 
+        local_cache.clear()
         response_two = client.post("/api/v1.0/airports/nearest", json=coordinates)
         assert response_two.status_code == 200
+        assert cache_requests("redis", "hit") == redis_hits + 1
+        assert response_two.json() == response_one.json()
+
+
+def test_nearest_airport_local_cache(mocker, redis_mock, app):
+    """
+    Confirm that a repeat identical post request is served from the in-process cache without a redis
+    lookup, and that the hit is reported by the cache stats endpoint.
+    """
+    mocker.patch("app.api.v1.airports.rd", redis_mock)
+    coordinates = {"latitude_degrees": 52.327640, "longitude_degrees": 0.851955}
+    with TestClient(app) as client:
+        client.post("/api/v1.0/airports/nearest", json=coordinates)
+        redis_get = mocker.spy(redis_mock, "get")
+        response = client.post("/api/v1.0/airports/nearest", json=coordinates)
+        stats = client.get("/api/v1.0/cache").json()
 
-        # Capture output to check logging messages. The first request should log the message
-        #   "Calculating nearest airport!", while the second identical request will print out
-        #   "Cache hit!".
-        out, _ = capfd.readouterr()
-        assert out == "Calculating nearest airport!\nCache hit!\n"
+        assert response.status_code == 200
+        assert redis_get.call_count == 0
+        assert stats["hits"] == 1
+        assert stats["size"] == 1
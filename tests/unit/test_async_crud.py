@@ -0,0 +1,29 @@
+import pytest
+
+from app.core import async_crud
+from app.core.database import database
+
+# ===============================
+#  Async CRUD fixtures
+# ===============================
+
+
+@pytest.fixture
+async def connected_database():
+    await database.connect()
+    yield database
+    await database.disconnect()
+
+
+# ===============================
+#  Async CRUD tests
+# ===============================
+
+
+@pytest.mark.anyio
+async def test_get_all_airports(connected_database):
+    airports = await async_crud.get_all_airports(connected_database)
+
+    assert len(airports) == 59
+    assert airports[0].icao == "EGXH"
+
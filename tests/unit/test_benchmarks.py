@@ -0,0 +1,54 @@
+import pytest
+
+from benchmarks.compare import compare
+from benchmarks.datasets import synthetic_airports
+from benchmarks.timing import measure, result
+
+# ===============================
+#  Benchmark tests
+# ===============================
+
+
+def test_measure():
+    calls = []
+    metrics = measure(calls.append, 10)
+
+    assert calls == list(range(10))
+    assert metrics["count"] == 10
+    assert 0 <= metrics["p50_ms"] <= metrics["p90_ms"] <= metrics["p99_ms"]
+    assert metrics["throughput_per_s"] > 0
+
+
+def test_synthetic_airports_are_reproducible():
+    airports = synthetic_airports(1000)
+
+    assert airports.equals(synthetic_airports(1000))
+    assert airports["icao"].is_unique and airports["name"].is_unique
+    assert airports["latitude"].between(-90, 90).all()
+    assert airports["longitude"].between(-180, 180).all()
+
+
+@pytest.mark.parametrize(
+    "metric, candidate_value, regressed",
+    [
+        ("p50_ms", 1.05, False),
+        ("p50_ms", 1.2, True),
+        ("throughput_per_s", 1.2, False),
+        ("throughput_per_s", 0.8, True),
+    ],
+)
+def test_compare(metric, candidate_value, regressed):
+    params = {"engine": "grid", "size": 100}
+    baseline = {"results": [result("engine.nearest", params, {metric: 1.0})]}
+    candidate = {
+        "results": [
+            result("engine.nearest", params, {metric: candidate_value}),
+            result("engine.nearest", {**params, "size": 1000}, {metric: 5.0}),
+        ]
+    }
+
+    [change] = compare(baseline, candidate, metric, threshold=0.1)
+
+    assert change["benchmark"] == "engine.nearest[engine=grid,size=100]"
+    assert change["change"] == pytest.approx(candidate_value - 1)
+    assert change["regressed"] is regressed
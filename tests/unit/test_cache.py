@@ -0,0 +1,310 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core import schemas
+from app.core.cache import (
+    LocalCache,
+    NearestAirportCache,
+    SingleFlight,
+    decode_airport,
+    encode_airport,
+)
+
+# ===============================
+#  Cache fixtures
+# ===============================
+
+
+@pytest.fixture(scope="function")
+def local_cache() -> LocalCache:
+    return LocalCache(maxsize=2, ttl_seconds=60)
+
+
+@pytest.fixture(scope="function")
+def cache(redis_mock, local_cache) -> NearestAirportCache:
+    return NearestAirportCache(
+        redis_mock,
+        local_cache,
+        ttl_seconds=60,
+        precision=4,
+        version_check_seconds=0,
+    )
+
+
+@pytest.fixture(scope="module")
+def honington_airport() -> schemas.Airport:
+    return schemas.Airport(
+        id=1, name="HONINGTON", icao="EGXH", latitude=52.342611, longitude=0.772939
+    )
+
+
+@pytest.fixture(scope="module")
+def coordinates() -> schemas.Coordinates:
+    return schemas.Coordinates(longitude_degrees=0.851955, latitude_degrees=52.32764)
+
+
+# ===============================
+#  Cache tests
+# ===============================
+
+
+def test_cache_key_is_quantised(cache, coordinates):
+    nearby = schemas.Coordinates(longitude_degrees=0.85196, latitude_degrees=52.327641)
+
+    assert cache.key(coordinates) == "nearest-airport:v2:haversine:d0:0.8520:52.3276"
+    assert cache.key(nearby) == cache.key(coordinates)
+
+
+def test_cache_key_normalises_negative_zero(cache):
+    coordinates = schemas.Coordinates(longitude_degrees=-0.00001, latitude_degrees=0.0)
+
+    assert cache.key(coordinates) == "nearest-airport:v2:haversine:d0:0.0000:0.0000"
+
+
+@pytest.mark.anyio
+async def test_cache_round_trip(cache, redis_mock, coordinates, honington_airport):
+    assert await cache.get(coordinates) is None
+
+    await cache.set(coordinates, honington_airport)
+    airport, distance_km = await cache.get(coordinates)
+
+    assert airport == honington_airport
+    assert distance_km == pytest.approx(5.609, 0.01)
+    assert 0 < await redis_mock.ttl(cache.key(coordinates)) <= 60
+
+
+@pytest.mark.anyio
+async def test_cache_recalculates_distance_for_exact_coordinates(
+    cache, coordinates, honington_airport
+):
+    nearby = schemas.Coordinates(longitude_degrees=0.85196, latitude_degrees=52.327641)
+    await cache.set(coordinates, honington_airport)
+
+    assert (await cache.get(nearby))[1] != (await cache.get(coordinates))[1]
+    assert (await cache.get(nearby))[1] == pytest.approx(5.609, 0.01)
+
+
+@pytest.mark.anyio
+async def test_cache_get_many(cache, coordinates, honington_airport):
+    other = schemas.Coordinates(longitude_degrees=-0.3, latitude_degrees=52)
+    await cache.set_many([(coordinates, honington_airport)])
+
+    results = await cache.get_many([coordinates, other])
+
+    assert results[0][0] == honington_airport
+    assert results[1] is None
+
+
+@pytest.mark.anyio
+async def test_local_cache_is_checked_before_redis(
+    cache, redis_mock, local_cache, coordinates, honington_airport
+):
+    await cache.set(coordinates, honington_airport)
+    await redis_mock.flushall()
+
+    assert (await cache.get(coordinates))[0] == honington_airport
+    assert local_cache.hits == 1
+
+
+@pytest.mark.anyio
+async def test_local_cache_populated_from_redis(
+    cache, local_cache, coordinates, honington_airport
+):
+    await cache.set(coordinates, honington_airport)
+    local_cache.clear()
+
+    assert (await cache.get(coordinates))[0] == honington_airport
+    assert local_cache.misses == 1
+    assert len(local_cache) == 1
+
+
+def test_local_cache_evicts_least_recently_used(honington_airport):
+    local_cache = LocalCache(maxsize=2, ttl_seconds=60)
+    local_cache.set("a", honington_airport)
+    local_cache.set("b", honington_airport)
+    local_cache.get("a")
+    local_cache.set("c", honington_airport)
+
+    assert local_cache.get("b") is None
+    assert local_cache.get("a") == honington_airport
+    assert local_cache.get("c") == honington_airport
+
+
+def test_local_cache_expires_entries(mocker, honington_airport):
+    local_cache = LocalCache(maxsize=2, ttl_seconds=60)
+    local_cache.set("a", honington_airport)
+    mocker.patch("app.core.cache.time.monotonic", return_value=float("inf"))
+
+    assert local_cache.get("a") is None
+    assert local_cache.stats()["misses"] == 1
+
+
+@pytest.mark.anyio
+async def test_invalidate_bumps_dataset_version(
+    cache, redis_mock, local_cache, coordinates, honington_airport
+):
+    await cache.set(coordinates, honington_airport)
+    other_worker = NearestAirportCache(
+        redis_mock,
+        LocalCache(maxsize=2, ttl_seconds=60),
+        ttl_seconds=60,
+        precision=4,
+        version_check_seconds=0,
+    )
+    assert (await other_worker.get(coordinates))[0] == honington_airport
+
+    assert await cache.invalidate() == 1
+    assert len(local_cache) == 0
+    assert await cache.get(coordinates) is None
+    assert await other_worker.get(coordinates) is None
+    assert (
+        other_worker.key(coordinates)
+        == "nearest-airport:v2:haversine:d1:0.8520:52.3276"
+    )
+
+
+@pytest.mark.anyio
+async def test_cache_keys_by_distance_model(
+    cache, redis_mock, local_cache, coordinates, honington_airport
+):
+    ellipsoidal = NearestAirportCache(
+        redis_mock,
+        LocalCache(maxsize=2, ttl_seconds=60),
+        ttl_seconds=60,
+        precision=4,
+        version_check_seconds=0,
+        ellipsoidal=True,
+    )
+    await cache.set(coordinates, honington_airport)
+
+    # A result cached under haversine distances is not served once the model is switched
+    assert (
+        ellipsoidal.key(coordinates)
+        == "nearest-airport:v2:ellipsoidal:d0:0.8520:52.3276"
+    )
+    assert await ellipsoidal.get(coordinates) is None
+    assert (await cache.get(coordinates))[0] == honington_airport
+
+
+def test_decode_airport_ignores_other_versions(honington_airport):
+    entry = decode_airport(encode_airport(honington_airport, 1700000000.5))
+    assert entry == (honington_airport, 1700000000.5)
+    assert decode_airport(b'[1,1,"HONINGTON","EGXH",52.3,0.7]') is None
+    assert decode_airport(b"not json") is None
+
+
+@pytest.mark.anyio
+async def test_single_flight_shares_call():
+    flights = SingleFlight()
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(flights.run("key", call) for _ in range(5)))
+
+    assert results == [1] * 5
+    assert calls == 1
+    assert len(flights) == 0
+    assert await flights.run("key", call) == 2
+
+
+@pytest.mark.anyio
+async def test_get_or_compute_coalesces_misses(
+    cache, redis_mock, coordinates, honington_airport
+):
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        return honington_airport
+
+    results = await asyncio.gather(
+        *(cache.get_or_compute(coordinates, compute) for _ in range(10))
+    )
+
+    assert calls == 1
+    assert all(result[0] == honington_airport for result in results)
+    assert results[0][1] == pytest.approx(5.609, 0.01)
+    assert all(result[2] for result in results)
+    assert (await cache.get_or_compute(coordinates, compute))[2] is False
+    assert calls == 1
+
+
+@pytest.mark.anyio
+async def test_get_or_compute_waits_for_other_worker(
+    cache, redis_mock, coordinates, honington_airport
+):
+    cache.lock_seconds = 1
+    other_worker = NearestAirportCache(
+        redis_mock,
+        LocalCache(maxsize=2, ttl_seconds=60),
+        ttl_seconds=60,
+        precision=4,
+        version_check_seconds=0,
+        lock_seconds=1,
+    )
+    await redis_mock.set(f"{cache.key(coordinates)}:lock", 1)
+
+    async def release_lock():
+        await asyncio.sleep(0.02)
+        await other_worker.set(coordinates, honington_airport)
+        await redis_mock.delete(f"{cache.key(coordinates)}:lock")
+
+    async def compute():
+        raise AssertionError("computed while another worker held the lock")
+
+    result, _ = await asyncio.gather(
+        cache.get_or_compute(coordinates, compute), release_lock()
+    )
+    assert result[0] == honington_airport
+    assert result[2] is False
+
+
+@pytest.mark.anyio
+async def test_get_or_compute_serves_stale_while_refreshing(
+    mocker, cache, redis_mock, local_cache, coordinates, honington_airport
+):
+    cache.stale_seconds = 30
+    await cache.set(coordinates, honington_airport)
+    local_cache.clear()
+    assert 60 < await redis_mock.ttl(cache.key(coordinates)) <= 90
+
+    mocker.patch("app.core.cache.time.time", return_value=time.time() + 70)
+    refreshed = schemas.Airport(**{**honington_airport.dict(), "name": "REFRESHED"})
+    assert await cache.get(coordinates) is None
+
+    async def compute():
+        return refreshed
+
+    airport, _, computed = await cache.get_or_compute(coordinates, compute)
+    assert (airport, computed) == (honington_airport, False)
+    assert len(local_cache) == 0
+
+    await asyncio.sleep(0.01)
+    assert len(cache.flights) == 0
+    assert (await cache.get(coordinates))[0] == refreshed
+
+
+@pytest.mark.anyio
+async def test_dataset_version_change_passed_to_reload(
+    cache, redis_mock, local_cache, coordinates, honington_airport
+):
+    reloads = []
+    cache.reload = reloads.append
+    await redis_mock.set("nearest-airport:dataset-version", 3)
+
+    # The first check adopts the version the engine was built with
+    assert await cache.sync_dataset_version() == 3
+    await cache.set(coordinates, honington_airport)
+
+    await redis_mock.incr("nearest-airport:dataset-version")
+    assert await cache.sync_dataset_version() == 3
+    assert reloads == [4]
+    assert len(local_cache) == 1
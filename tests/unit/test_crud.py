@@ -0,0 +1,137 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from app.core import crud, models
+
+# ===============================
+#  CRUD fixtures
+# ===============================
+
+
+@pytest.fixture(scope="function")
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/airports.db")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    yield db
+    db.close()
+
+
+@pytest.fixture(scope="function")
+def airport_data_file(tmp_path) -> str:
+    filepath = f"{tmp_path}/airports.csv"
+    pd.DataFrame(
+        {
+            "name": ["HONINGTON", "WELSHPOOL", "CRANFIELD"],
+            "icao": ["EGXH", "EGCW", "EGTC"],
+            "latitude": [52.342611, 52.628611, 52.072222],
+            "longitude": [0.772939, -3.153333, -0.616667],
+        }
+    ).to_csv(filepath, index=False)
+    return filepath
+
+
+# ===============================
+#  CRUD tests
+# ===============================
+
+
+def test_insert_airport_data(db):
+    crud.insert_airport_data(db)
+
+    assert len(crud.get_all_airports(db)) == 59
+    assert crud.get_airport_by_id(1, db).icao == "EGXH"
+
+
+def test_upsert_airport_data(db, airport_data_file):
+    report = crud.upsert_airport_data(db, airport_data_file, chunksize=2)
+
+    assert report.rows_read == 3
+    assert report.rows_written == 3
+    assert report.rows_per_second > 0
+    assert crud.get_airport_by_icao("EGCW", db).name == "WELSHPOOL"
+
+
+def test_upsert_airport_data_only_writes_changes(db, airport_data_file):
+    crud.upsert_airport_data(db, airport_data_file)
+    airports = pd.read_csv(airport_data_file)
+    airports.loc[airports.icao == "EGTC", "latitude"] = 52.1
+    airports.loc[len(airports)] = ["KEMBLE", "EGBP", 51.668056, -2.056944]
+    airports.to_csv(airport_data_file, index=False)
+
+    report = crud.upsert_airport_data(db, airport_data_file)
+
+    assert report.rows_read == 4
+    assert report.rows_written == 2
+    assert len(crud.get_all_airports(db)) == 4
+    assert crud.get_airport_by_icao("EGTC", db).latitude == 52.1
+    assert crud.get_airport_by_icao("EGTC", db).id == 3
+
+
+def test_get_airport_store(db, airport_data_file):
+    crud.upsert_airport_data(db, airport_data_file)
+
+    store = crud.get_airport_store(db)
+
+    assert len(store) == 3
+    assert store.icaos == ("EGXH", "EGCW", "EGTC")
+    assert store[0].dict() == {
+        "id": 1,
+        "name": "HONINGTON",
+        "icao": "EGXH",
+        "latitude": 52.342611,
+        "longitude": 0.772939,
+    }
+
+
+def test_get_airport_store_empty(db):
+    assert len(crud.get_airport_store(db)) == 0
+
+
+def test_validate_airport_data_rejects_duplicate_names(db, airport_data_file):
+    airports = pd.read_csv(airport_data_file)
+    airports.loc[len(airports)] = ["HONINGTON", "EGXX", 52.3, 0.7]
+    airports.to_csv(airport_data_file, index=False)
+
+    with pytest.raises(ValueError, match="Duplicate airport name on line 5"):
+        crud.validate_airport_data(airport_data_file, chunksize=2)
+
+
+def test_validate_airport_data_checks_names_against_table(
+    db, airport_data_file, tmp_path
+):
+    crud.upsert_airport_data(db, airport_data_file)
+    filepath = f"{tmp_path}/update.csv"
+    pd.DataFrame(
+        {
+            "name": ["HONINGTON", "WELSHPOOL AIRFIELD", "WELSHPOOL"],
+            "icao": ["EGXX", "EGCW", "EGWP"],
+            "latitude": [52.3, 52.628611, 52.6],
+            "longitude": [0.7, -3.153333, -3.1],
+        }
+    ).to_csv(filepath, index=False)
+
+    # WELSHPOOL is free once EGCW is renamed, but HONINGTON still belongs to EGXH
+    with pytest.raises(ValueError, match="Duplicate airport name on line 2"):
+        crud.validate_airport_data(filepath, db=db)
+    assert crud.validate_airport_data(filepath) == 3
+
+
+def test_upsert_airport_data_rolls_back_on_conflict(db, airport_data_file, tmp_path):
+    crud.upsert_airport_data(db, airport_data_file)
+    filepath = f"{tmp_path}/swap.csv"
+    pd.DataFrame(
+        {
+            "name": ["WELSHPOOL", "HONINGTON"],
+            "icao": ["EGXH", "EGCW"],
+            "latitude": [52.342611, 52.628611],
+            "longitude": [0.772939, -3.153333],
+        }
+    ).to_csv(filepath, index=False)
+
+    with pytest.raises(IntegrityError):
+        crud.upsert_airport_data(db, filepath)
+    assert crud.get_airport_by_icao("EGXH", db).name == "HONINGTON"
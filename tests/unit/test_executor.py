@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core import schemas, services
+from app.core.executor import ComputeBusyError, ComputeExecutor
+
+
+@pytest.fixture(scope="module")
+def engine() -> services.NearestAirportEngine:
+    airports = pd.read_csv("app/core/data/uk_airport_coords.csv").rename(
+        columns=str.lower
+    )
+    airports["id"] = airports.index + 1
+    return services.BruteForceEngine(airports)
+
+
+@pytest.fixture(scope="module")
+def points() -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+    return np.deg2rad(rng.uniform(-8, 2, 250)), np.deg2rad(rng.uniform(50, 59, 250))
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("kind", ["inline", "thread", "process"])
+async def test_run_chunked_matches_engine(engine, points, kind):
+    executor = ComputeExecutor(kind=kind, workers=2, chunk_size=100)
+    try:
+        indices, distances = await executor.run_chunked(engine, "nearest_many", points)
+        matrix = await executor.run_chunked(
+            engine, "distance_matrix", ([0, 1, 2],), [3, 4], chunk_size=2
+        )
+        nearest = await executor.run(
+            engine,
+            "nearest",
+            schemas.Coordinates(longitude_degrees=-0.3, latitude_degrees=51.4),
+        )
+    finally:
+        executor.shutdown()
+
+    expected_indices, expected_distances = engine.nearest_many(*points)
+    assert np.array_equal(indices, expected_indices)
+    assert np.array_equal(distances, expected_distances)
+    assert np.array_equal(matrix, engine.distance_matrix([0, 1, 2], [3, 4]))
+    assert nearest[0].icao == "EGLL"
+    assert executor.pending == 0
+
+
+@pytest.mark.anyio
+async def test_run_off_event_loop(engine):
+    executor = ComputeExecutor(kind="thread", workers=1)
+    loop_thread = threading.get_ident()
+    try:
+        thread = await executor.run(threading, "get_ident")
+    finally:
+        executor.shutdown()
+
+    assert thread != loop_thread
+
+
+@pytest.mark.anyio
+async def test_max_pending(engine, points):
+    executor = ComputeExecutor(kind="thread", workers=1, max_pending=2, chunk_size=100)
+    release = threading.Event()
+    try:
+        blocked = asyncio.ensure_future(executor.run(release, "wait"))
+        await asyncio.sleep(0)
+        assert executor.pending == 1
+
+        # A batch of three chunks would exceed the limit, so is rejected as a whole
+        with pytest.raises(ComputeBusyError):
+            await executor.run_chunked(engine, "nearest_many", points)
+        assert executor.pending == 1
+
+        release.set()
+        assert await blocked is True
+    finally:
+        executor.shutdown()
+    assert executor.pending == 0
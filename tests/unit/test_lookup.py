@@ -0,0 +1,49 @@
+import pytest
+
+from app.core.lookup import AirportLookup, normalise
+from app.core.store import AirportStore
+
+
+@pytest.fixture(scope="module")
+def lookup() -> AirportLookup:
+    return AirportLookup(
+        AirportStore(
+            ids=[9, 38, 56, 2],
+            names=["LONDON HEATHROW", "LONDON CITY", "BARKSTON HEATH", "LEEMING"],
+            icaos=["EGLL", "EGLC", "EGYE", "LNDN"],
+            latitudes=[51.5, 51.5, 53, 54.3],
+            longitudes=[-0.5, 0.1, -0.6, -1.5],
+        )
+    )
+
+
+def test_normalise():
+    assert normalise("  london   heathrow ") == "LONDON HEATHROW"
+
+
+def test_position_of_id_and_icao(lookup):
+    assert lookup.position_of_id(38) == 1
+    assert lookup.position_of_id(1) is None
+    assert lookup.position_of_icao("egye") == 2
+    assert lookup.position_of_icao("EGXX") is None
+
+
+@pytest.mark.parametrize(
+    "prefix, positions",
+    [
+        # ICAO code matches come first, then name matches in key order
+        ("l", [3, 1, 0]),
+        ("lon", [1, 0]),
+        ("london  h", [0]),
+        ("heath", [2, 0]),
+        ("egl", [1, 0]),
+        ("", []),
+        ("x", []),
+    ],
+)
+def test_search(lookup, prefix, positions):
+    assert lookup.search(prefix, limit=10) == positions
+
+
+def test_search_limit(lookup):
+    assert lookup.search("l", limit=2) == [3, 1]
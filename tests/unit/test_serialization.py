@@ -0,0 +1,129 @@
+import json
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from app.core import schemas, serialization
+
+heathrow = schemas.Airport(
+    id=27, name="Heathrow", icao="EGLL", latitude=51.4775, longitude=-0.461389
+)
+honington = schemas.Airport(
+    id=1, name="Honington", icao="EGXH", latitude=52.342611, longitude=0.772939
+)
+coordinates = schemas.Coordinates(longitude_degrees=-0.1, latitude_degrees=51)
+
+
+def assert_same_json(body: bytes, model: schemas.BaseModel):
+    """
+    Check a body decodes to the model's JSON, with members in the same order
+    """
+    expected = json.loads(model.json())
+    assert json.loads(body) == expected
+    assert json.dumps(json.loads(body)) == json.dumps(expected)
+
+
+def test_airport_responses():
+    assert_same_json(
+        serialization.airport_response(serialization.encode_airport(heathrow)).body,
+        schemas.AirportResponse(success=True, airport=heathrow),
+    )
+    assert_same_json(
+        serialization.airports_body([heathrow, honington]),
+        schemas.AirportsResponse(
+            success=True, airports=[heathrow, honington], airport_count=2
+        ),
+    )
+    assert_same_json(
+        serialization.airport_search_response(
+            [serialization.encode_airport(heathrow)]
+        ).body,
+        schemas.AirportsResponse(success=True, airports=[heathrow], airport_count=1),
+    )
+    assert_same_json(
+        serialization.airports_page_response([heathrow], {"id", "icao"}, 28).body,
+        schemas.AirportsPageResponse(
+            success=True,
+            airports=[heathrow.dict(include={"id", "icao"})],
+            airport_count=1,
+            next_cursor=28,
+        ),
+    )
+
+
+def test_nearest_airport_responses():
+    assert_same_json(
+        serialization.nearest_airport_result(
+            serialization.encode_airport(heathrow), 13.486, coordinates
+        ),
+        schemas.NearestAirportResponse(
+            success=True,
+            nearest_airport=heathrow,
+            distance_km=13.486,
+            input_coordinates=coordinates,
+        ),
+    )
+    assert_same_json(
+        serialization.nearby_airports_response(
+            [(heathrow, 13.486), (honington, 140.5)], coordinates
+        ).body,
+        schemas.NearbyAirportsResponse(
+            success=True,
+            airports=[
+                schemas.AirportDistance(airport=heathrow, distance_km=13.486),
+                schemas.AirportDistance(airport=honington, distance_km=140.5),
+            ],
+            airport_count=2,
+            input_coordinates=coordinates,
+        ),
+    )
+
+
+def test_nearest_airport_batch_response():
+    with pytest.raises(ValidationError) as error:
+        schemas.Coordinates(longitude_degrees=200, latitude_degrees=0)
+    errors = error.value.errors()
+
+    assert_same_json(
+        serialization.nearest_airport_batch_response(
+            [
+                serialization.nearest_airport_result(
+                    serialization.encode_airport(heathrow),
+                    13.486,
+                    coordinates,
+                    batch=True,
+                ),
+                serialization.nearest_airport_error(errors, batch=True),
+            ],
+            error_count=1,
+        ).body,
+        schemas.NearestAirportBatchResponse(
+            success=True,
+            results=[
+                schemas.NearestAirportBatchResult(
+                    success=True,
+                    nearest_airport=heathrow,
+                    distance_km=13.486,
+                    input_coordinates=coordinates,
+                ),
+                schemas.NearestAirportBatchResult(success=False, errors=errors),
+            ],
+            result_count=2,
+            error_count=1,
+        ),
+    )
+
+
+def test_distance_matrix_response():
+    matrix = np.array([[0, 128.147], [128.147, 0]])
+
+    assert_same_json(
+        serialization.distance_matrix_response(matrix).body,
+        schemas.DistanceMatrixResponse(
+            success=True,
+            origin_count=2,
+            destination_count=2,
+            distances_km=matrix.tolist(),
+        ),
+    )
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -13,6 +14,15 @@ def airport_dataframe() -> pd.DataFrame:
     return pd.read_csv("tests/data/uk_airport_coords_test_data.csv")
 
 
+@pytest.fixture(scope="module")
+def uk_airport_dataframe() -> pd.DataFrame:
+    airports = pd.read_csv("app/core/data/uk_airport_coords.csv").rename(
+        columns=str.lower
+    )
+    airports["id"] = airports.index + 1
+    return airports
+
+
 @pytest.fixture(scope="module")
 def point_a() -> schemas.Coordinates:
     return schemas.Coordinates(longitude_degrees=-0.116773, latitude_degrees=51.510357)
@@ -53,25 +63,36 @@ def test_find_nearest_airport(airport_dataframe, point_a, expected_nearest_airpo
     assert distance == pytest.approx(110.84, 0.01)
 
 
-def test_convert_degrees_to_radians(airport_dataframe):
-    services._convert_degrees_to_radians(airport_dataframe)
+def test_find_nearest_airport_does_not_modify_dataframe(airport_dataframe, point_a):
+    columns = list(airport_dataframe.columns)
+    services.find_nearest_airport(airport_dataframe, point_a)
 
-    assert airport_dataframe.iloc[0].longitude_radians == pytest.approx(0.01349, 0.0001)
-    assert airport_dataframe.iloc[0].latitude_radians == pytest.approx(0.91355, 0.0001)
-    assert airport_dataframe.iloc[1].longitude_radians == pytest.approx(
-        -0.05504, 0.0001
-    )
-    assert airport_dataframe.iloc[1].latitude_radians == pytest.approx(00.91854, 0.0001)
+    assert list(airport_dataframe.columns) == columns
 
 
-def test_add_haversine_distance(airport_dataframe, point_a):
-    services._convert_degrees_to_radians(airport_dataframe)
-    services._add_haversine_distance(
-        airport_dataframe, point_a.longitude_radians, point_a.latitude_radians
-    )
+def test_brute_force_engine_radians(airport_dataframe):
+    engine = services.BruteForceEngine(airport_dataframe)
 
-    assert airport_dataframe.iloc[0].distance_to_point == pytest.approx(110.84, 0.01)
-    assert airport_dataframe.iloc[1].distance_to_point == pytest.approx(241.92, 0.01)
+    assert engine.longitude_radians[0] == pytest.approx(0.01349, 0.0001)
+    assert engine.latitude_radians[0] == pytest.approx(0.91355, 0.0001)
+    assert engine.longitude_radians[1] == pytest.approx(-0.05504, 0.0001)
+    assert engine.latitude_radians[1] == pytest.approx(00.91854, 0.0001)
+
+
+def test_brute_force_engine_distances(airport_dataframe, point_a):
+    engine = services.BruteForceEngine(airport_dataframe)
+    distances = engine.distances(point_a.longitude_radians, point_a.latitude_radians)
+
+    assert distances[0] == pytest.approx(110.84, 0.01)
+    assert distances[1] == pytest.approx(241.92, 0.01)
+
+
+def test_brute_force_engine_nearest(airport_dataframe, point_a):
+    engine = services.BruteForceEngine(airport_dataframe)
+    nearest_airport, distance = engine.nearest(point_a)
+
+    assert nearest_airport.icao == "EGXH"
+    assert distance == pytest.approx(110.84, 0.01)
 
 
 def test_calculate_haversine_distance(point_a, point_b):
@@ -85,6 +106,250 @@ def test_calculate_haversine_distance(point_a, point_b):
     assert distance_km == pytest.approx(5897.658, 0.001)
 
 
-@pytest.mark.skip(reason="Not yet implemented")
-def test_find_nearest_airport_balltree(airport_dataframe, point_a):
-    services.find_nearest_airport_balltree(airport_dataframe, point_a)
+def test_balltree_engine_nearest(airport_dataframe, point_a):
+    engine = services.BallTreeEngine(airport_dataframe)
+    nearest_airport, distance = engine.nearest(point_a)
+
+    assert nearest_airport.icao == "EGXH"
+    assert distance == pytest.approx(110.84, 0.01)
+
+
+def test_balltree_engine_matches_brute_force(uk_airport_dataframe, point_b):
+    brute_force = services.BruteForceEngine(uk_airport_dataframe)
+    balltree = services.BallTreeEngine(uk_airport_dataframe)
+
+    for coordinates in [
+        point_b,
+        schemas.Coordinates(longitude_degrees=-0.3, latitude_degrees=52),
+        schemas.Coordinates(longitude_degrees=-5.5, latitude_degrees=58.1),
+    ]:
+        expected_airport, expected_distance = brute_force.nearest(coordinates)
+        nearest_airport, distance = balltree.nearest(coordinates)
+
+        assert nearest_airport == expected_airport
+        assert distance == pytest.approx(expected_distance)
+
+
+@pytest.mark.parametrize("resolution_degrees", [1, 0.1])
+def test_grid_engine_matches_brute_force(uk_airport_dataframe, resolution_degrees):
+    brute_force = services.BruteForceEngine(uk_airport_dataframe)
+    grid = services.GridEngine(
+        uk_airport_dataframe, resolution_degrees=resolution_degrees
+    )
+    rng = np.random.default_rng(0)
+    longitudes = np.deg2rad(rng.uniform(-15, 5, 5000))
+    latitudes = np.deg2rad(rng.uniform(45, 65, 5000))
+
+    indices, distances = grid.nearest_many(longitudes, latitudes)
+    expected_indices, expected_distances = brute_force.nearest_many(
+        longitudes, latitudes
+    )
+
+    assert (indices == expected_indices).all()
+    assert distances == pytest.approx(expected_distances)
+    for longitude, latitude in zip(longitudes[:200], latitudes[:200]):
+        coordinates = schemas.Coordinates(
+            longitude_degrees=np.rad2deg(longitude),
+            latitude_degrees=np.rad2deg(latitude),
+        )
+        assert grid.nearest(coordinates) == pytest.approx(
+            brute_force.nearest(coordinates)
+        )
+
+
+def test_grid_engine_outside_grid(uk_airport_dataframe, point_b):
+    grid = services.GridEngine(uk_airport_dataframe)
+
+    assert grid.cells(
+        np.array([point_b.longitude_radians]), np.array([point_b.latitude_radians])
+    ).tolist() == [-1]
+    assert grid.nearest(point_b) == pytest.approx(
+        services.BruteForceEngine(uk_airport_dataframe).nearest(point_b)
+    )
+
+
+def test_grid_engine_stats(uk_airport_dataframe):
+    stats = services.GridEngine(uk_airport_dataframe, resolution_degrees=0.5).stats()
+
+    assert stats["engine"] == "GridEngine"
+    assert stats["airport_count"] == len(uk_airport_dataframe)
+    assert stats["grid"]["cells"] > 0
+    assert stats["grid"]["memory_bytes"] > 0
+    assert 1 <= stats["grid"]["mean_candidates"] <= stats["grid"]["max_candidates"]
+
+
+@pytest.mark.parametrize("engine_name", ["brute_force", "balltree", "grid"])
+def test_nearest_many(airport_dataframe, point_a, point_b, engine_name):
+    engine = services.build_engine(airport_dataframe, engine_name)
+    indices, distances = engine.nearest_many(
+        [point_a.longitude_radians, point_b.longitude_radians],
+        [point_a.latitude_radians, point_b.latitude_radians],
+    )
+
+    for index, distance, coordinates in zip(indices, distances, [point_a, point_b]):
+        nearest_airport, expected_distance = engine.nearest(coordinates)
+        assert engine.airports[index] == nearest_airport
+        assert distance == pytest.approx(expected_distance)
+
+
+@pytest.mark.parametrize("engine_name", ["brute_force", "balltree"])
+def test_k_nearest(uk_airport_dataframe, point_a, engine_name):
+    engine = services.build_engine(uk_airport_dataframe, engine_name)
+    airports = engine.k_nearest(point_a, 5)
+    distances = [distance for _, distance in airports]
+
+    assert len(airports) == 5
+    assert distances == sorted(distances)
+    assert airports[0] == engine.nearest(point_a)
+    assert len(engine.k_nearest(point_a, 1000)) == len(engine)
+
+
+@pytest.mark.parametrize("engine_name", ["brute_force", "balltree"])
+def test_within_radius(uk_airport_dataframe, point_a, engine_name):
+    engine = services.build_engine(uk_airport_dataframe, engine_name)
+    airports = engine.within_radius(point_a, 50)
+    distances = [distance for _, distance in airports]
+
+    assert len(airports) > 1
+    assert distances == sorted(distances)
+    assert all(distance <= 50 for distance in distances)
+    assert engine.within_radius(point_a, 50, limit=1) == airports[:1]
+    assert engine.within_radius(point_a, 0) == []
+
+
+def test_k_nearest_and_within_radius_match_brute_force(uk_airport_dataframe, point_a):
+    engine = services.BruteForceEngine(uk_airport_dataframe)
+    distances = engine.distances(point_a.longitude_radians, point_a.latitude_radians)
+    expected_distances = sorted(distances)
+
+    assert [distance for _, distance in engine.k_nearest(point_a, 10)] == (
+        pytest.approx(expected_distances[:10])
+    )
+    assert [distance for _, distance in engine.within_radius(point_a, 100)] == (
+        pytest.approx([distance for distance in expected_distances if distance <= 100])
+    )
+
+
+def test_engine_must_implement_queries(airport_dataframe):
+    class PartialEngine(services.NearestAirportEngine):
+        def nearest(self, coordinates):
+            return self.airports[0], 0.0
+
+        def k_nearest(self, coordinates, k):
+            return []
+
+    with pytest.raises(TypeError):
+        PartialEngine(airport_dataframe)
+
+
+def test_build_engine(airport_dataframe):
+    assert isinstance(
+        services.build_engine(airport_dataframe, "balltree"), services.BallTreeEngine
+    )
+    with pytest.raises(ValueError):
+        services.build_engine(airport_dataframe, "quadtree")
+
+
+def test_page_bbox_crossing_antimeridian(uk_airport_dataframe):
+    engine = services.BruteForceEngine(uk_airport_dataframe)
+    east_of_greenwich, _ = engine.page(None, 100, (0, 49, 180, 61))
+    west_of_greenwich, _ = engine.page(None, 100, (-180, 49, 0, 61))
+    crossing, _ = engine.page(None, 100, (0, 49, -0.0001, 61))
+
+    assert len(crossing) == len(engine)
+    assert len(east_of_greenwich) + len(west_of_greenwich) == len(engine)
+
+
+def test_distance_matrix(uk_airport_dataframe, point_a, point_b):
+    engine = services.BruteForceEngine(uk_airport_dataframe)
+    heathrow = engine.icao_index("egll")
+    points = [heathrow, point_a, point_b]
+
+    matrix = engine.distance_matrix(points, points[:2])
+
+    assert matrix.shape == (3, 2)
+    assert np.diag(matrix) == pytest.approx([0, 0])
+    assert matrix[2, 1] == pytest.approx(5897.658, 0.001)
+    assert matrix[0, 1] == pytest.approx(matrix[1, 0])
+    assert engine.icao_index("ZZZZ") is None
+
+
+def test_calculate_vincenty_distance():
+    # Flinders Peak to Buninyong, the worked example in Vincenty (1975)
+    flinders_peak = np.radians(
+        [144 + 25 / 60 + 29.52440 / 3600, -(37 + 57 / 60 + 3.72030 / 3600)]
+    )
+    buninyong = np.radians(
+        [143 + 55 / 60 + 35.38390 / 3600, -(37 + 39 / 60 + 10.15610 / 3600)]
+    )
+    distance_km = services._calculate_vincenty_distance(*flinders_peak, *buninyong)
+
+    assert distance_km * 1000 == pytest.approx(54972.271, abs=0.001)
+
+    # A quarter of the equator, a meridian from pole to pole, and coincident points
+    assert services._calculate_vincenty_distance(
+        [0, 0, 1], [0, np.pi / 2, 0.5], [np.pi / 2, 0, 1], [0, -np.pi / 2, 0.5]
+    ) == pytest.approx([10018.754171, 20003.931459, 0], abs=1e-6)
+    # Vincenty's formulae do not converge for nearly antipodal points
+    assert np.isnan(services._calculate_vincenty_distance(0, 0, np.pi * 0.999, 0))
+
+
+def test_ellipsoidal_ratio_bounds():
+    rng = np.random.default_rng(0)
+    lon1, lon2 = rng.uniform(-np.pi, np.pi, (2, 10_000))
+    lat1, lat2 = rng.uniform(-np.pi / 2, np.pi / 2, (2, 10_000))
+    ratios = services._calculate_vincenty_distance(
+        lon1, lat1, lon2, lat2
+    ) / services._calculate_haversine_distance(lon1, lat1, lon2, lat2)
+
+    low, high = services.ELLIPSOIDAL_RATIO_BOUNDS
+    ratios = ratios[~np.isnan(ratios)]
+    assert ((ratios >= low) & (ratios <= high)).all()
+
+
+def test_ellipsoidal_nearest_differs_from_haversine():
+    # The airport due north is further on a sphere, but nearer on the ellipsoid, which is flattened at the
+    #   poles
+    airports = pd.DataFrame(
+        {
+            "id": [1, 2],
+            "name": ["NORTH", "EAST"],
+            "icao": ["NNNN", "EEEE"],
+            "latitude": [1.0, 0.0],
+            "longitude": [0.0, 0.995],
+        }
+    )
+    point = schemas.Coordinates(longitude_degrees=0, latitude_degrees=0)
+
+    assert services.BruteForceEngine(airports).nearest_airport(point)[0].icao == "EEEE"
+    airport, distance_km = services.BruteForceEngine(
+        airports, ellipsoidal=True
+    ).nearest_airport(point)
+    assert airport.icao == "NNNN"
+    assert distance_km == pytest.approx(110.574, abs=0.001)
+
+
+@pytest.mark.parametrize("engine_name", ["brute_force", "balltree", "grid"])
+def test_ellipsoidal_nearest_matches_exhaustive_search(
+    uk_airport_dataframe, engine_name
+):
+    engine = services.build_engine(uk_airport_dataframe, engine_name, ellipsoidal=True)
+    rng = np.random.default_rng(1)
+    longitudes = np.radians(
+        np.concatenate([rng.uniform(-8, 2, 500), rng.uniform(-180, 180, 50)])
+    )
+    latitudes = np.radians(
+        np.concatenate([rng.uniform(50, 59, 500), rng.uniform(-90, 90, 50)])
+    )
+
+    indices, distances = engine.nearest_airports(longitudes, latitudes)
+
+    all_distances = services._calculate_vincenty_distance(
+        longitudes[:, np.newaxis],
+        latitudes[:, np.newaxis],
+        engine.longitude_radians,
+        engine.latitude_radians,
+    )
+    assert np.array_equal(indices, np.nanargmin(all_distances, axis=1))
+    assert distances == pytest.approx(np.nanmin(all_distances, axis=1))
+    assert engine.stats()["distance_model"] == "ellipsoidal"
@@ -0,0 +1,84 @@
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core import schemas, services, snapshot
+
+# ===============================
+#  Snapshot fixtures
+# ===============================
+
+
+@pytest.fixture(scope="module")
+def uk_airport_dataframe() -> pd.DataFrame:
+    airports = pd.read_csv("app/core/data/uk_airport_coords.csv").rename(
+        columns=str.lower
+    )
+    airports["id"] = airports.index + 1
+    return airports
+
+
+@pytest.fixture
+def snapshot_dir(uk_airport_dataframe, tmp_path) -> str:
+    directory = str(tmp_path / "snapshots")
+    snapshot.write_snapshot(services.BruteForceEngine(uk_airport_dataframe), directory)
+    return directory
+
+
+# ===============================
+#  Snapshot tests
+# ===============================
+
+
+@pytest.mark.parametrize("engine_name", ["brute_force", "balltree"])
+def test_load_engine_matches_built_engine(
+    uk_airport_dataframe, snapshot_dir, engine_name
+):
+    built = services.build_engine(uk_airport_dataframe, engine_name)
+    loaded = snapshot.load_engine(snapshot_dir, engine_name)
+    coordinates = schemas.Coordinates(longitude_degrees=-1.5, latitude_degrees=53.2)
+
+    assert isinstance(loaded, services.ENGINES[engine_name])
+    assert list(loaded.airports) == list(built.airports)
+    assert loaded.nearest(coordinates) == built.nearest(coordinates)
+    assert loaded.k_nearest(coordinates, 5) == built.k_nearest(coordinates, 5)
+
+
+def test_load_engine_memory_maps_arrays(snapshot_dir):
+    engine = snapshot.load_engine(snapshot_dir, "brute_force")
+
+    assert isinstance(engine.latitude_radians, np.memmap)
+    assert isinstance(engine.sorted_ids, np.memmap)
+    assert isinstance(engine.tree.get_arrays()[0], np.memmap)
+    assert not engine.latitude_radians.flags.writeable
+
+
+def test_write_snapshot_publishes_new_version(uk_airport_dataframe, snapshot_dir):
+    engine = services.BruteForceEngine(uk_airport_dataframe.iloc[:10])
+    mapped = snapshot.load_engine(snapshot_dir, "brute_force")
+
+    assert snapshot.write_snapshot(engine, snapshot_dir, keep=1) == 2
+    assert snapshot.snapshot_versions(snapshot_dir) == [2]
+    assert snapshot.current_version(snapshot_dir) == 2
+    assert len(snapshot.load_engine(snapshot_dir, "brute_force")) == 10
+    assert mapped.snapshot_version == 1
+    assert len(mapped.ids) == len(uk_airport_dataframe)
+
+
+def test_services_import_does_not_load_heavy_dependencies():
+    modules = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, app.core.services, app.core.snapshot; print(' '.join(sys.modules))",
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout.split()
+
+    assert "sklearn" not in modules
+    assert "pandas" not in modules
@@ -0,0 +1,66 @@
+import sys
+
+import numpy as np
+import pytest
+
+from app.core import schemas
+from app.core.store import AirportRecord, AirportStore
+
+HEATHROW = {
+    "id": 9,
+    "name": "LONDON HEATHROW",
+    "icao": "EGLL",
+    "latitude": 51.4775,
+    "longitude": -0.461389,
+}
+
+
+@pytest.fixture(params=[False, True], ids=["float64", "float32"])
+def store(request) -> AirportStore:
+    return AirportStore(
+        ids=[38, 9],
+        names=["LONDON CITY", "LONDON HEATHROW"],
+        icaos=["EGLC", "EGLL"],
+        latitudes=[51.505278, 51.4775],
+        longitudes=[0.055278, -0.461389],
+        float32=request.param,
+    )
+
+
+def test_store_records(store):
+    record = store[1]
+
+    assert len(store) == 2
+    assert isinstance(record, AirportRecord)
+    assert record.dict() == HEATHROW
+    assert record == schemas.Airport(**HEATHROW)
+    assert schemas.Airport(**HEATHROW) == record
+    assert record != schemas.Airport(**{**HEATHROW, "icao": "EGXX"})
+    assert [airport.icao for airport in store.records([1, 0])] == ["EGLL", "EGLC"]
+
+
+def test_store_coordinate_types(store):
+    coordinate_type = np.float32 if store.float32 else np.float64
+
+    assert store.ids.dtype == np.int64
+    assert store.latitudes.dtype == store.longitudes.dtype == coordinate_type
+    assert store.nbytes > store.ids.nbytes + store.latitudes.nbytes * 2
+
+
+def test_store_is_read_only(store):
+    with pytest.raises(ValueError):
+        store.latitudes[0] = 0.0
+    with pytest.raises(AttributeError):
+        store[0].elevation = 0
+
+
+def test_store_interns_strings():
+    icao = "".join(["EG", "LL"])
+    store = AirportStore([9], ["LONDON HEATHROW"], [icao], [51.4775], [-0.461389])
+
+    assert store.icaos[0] is sys.intern("EGLL")
+
+
+def test_store_columns_must_match():
+    with pytest.raises(ValueError, match="same length"):
+        AirportStore([9, 38], ["LONDON HEATHROW"], ["EGLL"], [51.4775], [-0.461389])